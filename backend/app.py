@@ -4,25 +4,42 @@ AMEGA-AI FastAPI Application
 This module sets up the main FastAPI application instance with configuration
 loading from environment variables, CORS middleware, and basic health check endpoint.
 """
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, status, Depends, Request
+from contextlib import AsyncExitStack, asynccontextmanager, nullcontext
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import ValidationError
 import uvicorn
-from typing import List
+from typing import AsyncContextManager, AsyncIterator, List, Optional
+import asyncio
+import json
 import logging
 from datetime import datetime, timedelta
 
 from .llm_manager import LLMManager, ChatMessage
+from .generation_control import CancellationToken, GenerationCancelled, GenerationOptions, aclosing
+from .llm_backends import create_backend
+from .model_loader import ModelLoader
+from .model_registry import ModelLoadError, ModelNotAllowed, ModelRegistry
+from .distributed_semaphore import ConcurrencyLimitExceeded, DistributedSemaphore
+from .fair_scheduler import FairScheduler
+from .inference_pool import InferencePool, InferenceQueueFull
+from .response_cache import ResponseCache
+from .user_store import CachedUserRepository, SQLUserRepository
+from .worker_pool import ModelWorkerPool
 from .auth import (
     User, Token, authenticate_user, create_access_token,
-    get_current_active_user, get_password_hash, fake_users_db,
+    get_current_user, get_current_active_user, hash_password, shutdown_password_hashing,
+    UserInDB, create_user, get_users, get_user_repository, set_user_repository,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from .rate_limit import RateLimiter, rate_limit_dependency, RateLimitConfig
+from .rate_limit import (
+    HybridRateLimiter, RateLimiter, rate_limit_dependency, RateLimitConfig, TokenQuota, TokenReservation
+)
 from .security import (
     SecurityMiddleware, RBACMiddleware, RequestValidationMiddleware,
-    requires_admin, requires_user
+    requires_admin, requires_user, check_role_access
 )
 from .config import settings
 
@@ -37,29 +54,158 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Lifespan events for FastAPI application."""
     # Startup
-    app.state.llm_manager = LLMManager(model_name=settings.MODEL_NAME)
+    app.state.inference_pool = InferencePool(
+        max_workers=settings.INFERENCE_WORKERS,
+        max_queue_size=settings.INFERENCE_MAX_QUEUE,
+        retry_after_seconds=settings.INFERENCE_RETRY_AFTER_SECONDS
+    )
+    # Generation requests of every model queue fairly for the same workers
+    app.state.scheduler = FairScheduler(
+        max_concurrent=settings.SCHEDULER_MAX_CONCURRENT or settings.INFERENCE_WORKERS * settings.BATCH_MAX_SIZE,
+        max_in_flight_per_user=settings.SCHEDULER_MAX_IN_FLIGHT_PER_USER,
+        role_weights=settings.SCHEDULER_ROLE_WEIGHTS,
+        max_waiting=settings.INFERENCE_MAX_QUEUE,
+        retry_after_seconds=settings.INFERENCE_RETRY_AFTER_SECONDS
+    )
+    app.state.response_cache = None
+    if settings.RESPONSE_CACHE_ENABLED:
+        app.state.response_cache = ResponseCache(
+            redis_url=str(settings.REDIS_URL) if settings.REDIS_URL else None,
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+            cache_sampled=settings.RESPONSE_CACHE_SAMPLED
+        )
+    # Generation is delegated to a remote API, to local model worker
+    # processes, or run in this process
+    backend = None
+    if settings.ACTIVE_LLM_BACKEND != "huggingface":
+        backend = create_backend(
+            settings.ACTIVE_LLM_BACKEND,
+            settings.get_active_backend_config(),
+            generation=settings.LLM_CONFIG
+        )
+    elif settings.MODEL_WORKERS > 0:
+        backend = ModelWorkerPool(
+            settings.HUGGINGFACE_CONFIG.model_name,
+            config=settings.LLM_CONFIG,
+            num_workers=settings.MODEL_WORKERS,
+            threads_per_worker=settings.MODEL_WORKER_THREADS,
+            precision=settings.HUGGINGFACE_CONFIG.precision,
+            warm_up=settings.MODEL_WARM_UP,
+            max_in_flight_per_worker=settings.INFERENCE_MAX_QUEUE,
+            health_interval=settings.MODEL_WORKER_HEALTH_INTERVAL_SECONDS,
+            retry_after_seconds=settings.INFERENCE_RETRY_AFTER_SECONDS
+        )
+    app.state.llm_manager = LLMManager(
+        model_name=settings.HUGGINGFACE_CONFIG.model_name,
+        config=settings.LLM_CONFIG,
+        pool=app.state.inference_pool,
+        scheduler=app.state.scheduler,
+        response_cache=app.state.response_cache,
+        load=False,
+        backend=backend
+    )
+
+    # Load the model in the background so the server starts accepting
+    # connections (and answering /health) immediately
+    app.state.model_loader = ModelLoader(
+        app.state.llm_manager,
+        warm_up=settings.MODEL_WARM_UP,
+        budget_seconds=settings.MODEL_LOAD_BUDGET_SECONDS
+    )
+    app.state.model_loader.start()
+
+    # Further models are loaded on demand when a request selects them; they
+    # share the inference pool, response cache and conversation histories
+    default_manager = app.state.llm_manager
+    app.state.model_registry = ModelRegistry(
+        factory=lambda model_name: LLMManager(
+            model_name=model_name,
+            config=settings.LLM_CONFIG,
+            pool=app.state.inference_pool,
+            scheduler=app.state.scheduler,
+            response_cache=app.state.response_cache,
+            sessions=default_manager.sessions,
+            load=False,
+            backend=backend.with_model(model_name) if backend else None
+        ),
+        max_bytes=settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+        allowed_models=settings.ALLOWED_MODELS,
+        warm_up=settings.MODEL_WARM_UP
+    )
+    app.state.model_registry.register(default_manager, pinned=True)
+
+    # Users are kept in the database when one is configured
+    if settings.DATABASE_URL:
+        set_user_repository(CachedUserRepository(
+            SQLUserRepository(str(settings.DATABASE_URL), pool_size=settings.DATABASE_POOL_SIZE),
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            max_entries=settings.USER_CACHE_MAX_ENTRIES
+        ))
 
     # Initialize rate limiter
-    app.state.rate_limiter = RateLimiter(
-        redis_url=str(settings.REDIS_URL),
-        default_limits={
-            "default": RateLimitConfig(
-                requests=settings.RATE_LIMIT_DEFAULT_RPM,
-                window_seconds=60
-            ),
-            "authenticated": RateLimitConfig(
-                requests=settings.RATE_LIMIT_AUTH_RPM,
-                window_seconds=60
-            ),
-            "chat": RateLimitConfig(
-                requests=settings.RATE_LIMIT_CHAT_RPM,
-                window_seconds=60
-            ),
-        }
+    rate_limits = {
+        "default": RateLimitConfig(
+            requests=settings.RATE_LIMIT_DEFAULT_RPM,
+            window_seconds=60,
+            algorithm=settings.RATE_LIMIT_ALGORITHM
+        ),
+        "authenticated": RateLimitConfig(
+            requests=settings.RATE_LIMIT_AUTH_RPM,
+            window_seconds=60,
+            algorithm=settings.RATE_LIMIT_ALGORITHM
+        ),
+        # Chat requests reach the model: let short bursts through, then
+        # space them out evenly
+        "chat": RateLimitConfig(
+            requests=settings.RATE_LIMIT_CHAT_RPM,
+            window_seconds=60,
+            algorithm=settings.RATE_LIMIT_CHAT_ALGORITHM,
+            burst=settings.RATE_LIMIT_CHAT_BURST
+        ),
+    }
+    if settings.RATE_LIMIT_MODE == "hybrid":
+        # Count requests in this process and sync the counts with Redis in
+        # the background
+        app.state.rate_limiter = HybridRateLimiter(
+            redis_url=str(settings.REDIS_URL),
+            default_limits=rate_limits,
+            max_connections=settings.RATE_LIMIT_REDIS_MAX_CONNECTIONS,
+            sync_interval_seconds=settings.RATE_LIMIT_SYNC_INTERVAL_SECONDS,
+            sync_tolerance=settings.RATE_LIMIT_SYNC_TOLERANCE
+        )
+    else:
+        app.state.rate_limiter = RateLimiter(
+            redis_url=str(settings.REDIS_URL),
+            default_limits=rate_limits,
+            max_connections=settings.RATE_LIMIT_REDIS_MAX_CONNECTIONS
+        )
+    # Token budgets share the rate limiter's Redis connections
+    app.state.token_quota = TokenQuota(
+        app.state.rate_limiter.redis,
+        tokens_per_minute=settings.TOKEN_QUOTA_PER_MINUTE,
+        tokens_per_day=settings.TOKEN_QUOTA_PER_DAY
+    )
+    # Chat generations running at once are capped across all replicas
+    app.state.chat_semaphore = DistributedSemaphore(
+        app.state.rate_limiter.redis,
+        name="chat",
+        max_holders=settings.CHAT_CONCURRENCY_LIMIT,
+        max_per_user=settings.CHAT_CONCURRENCY_PER_USER,
+        lease_seconds=settings.CHAT_CONCURRENCY_LEASE_SECONDS,
+        max_wait_seconds=settings.CHAT_CONCURRENCY_MAX_WAIT_SECONDS,
+        max_waiting=settings.INFERENCE_MAX_QUEUE,
+        retry_after_seconds=settings.INFERENCE_RETRY_AFTER_SECONDS
     )
     yield
     # Shutdown
-    # Add cleanup code here if needed
+    await app.state.model_registry.close()
+    app.state.inference_pool.shutdown(wait=False)
+    if app.state.response_cache is not None:
+        await app.state.response_cache.close()
+    await app.state.rate_limiter.close()
+    shutdown_password_hashing()
+    await get_user_repository().close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -92,6 +238,155 @@ async def add_rate_limit_headers(request: Request, call_next):
             response.headers[key] = value
     return response
 
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFull):
+    """Fail fast with 503 when the model cannot take more work."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Model is busy, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(ConcurrencyLimitExceeded)
+async def concurrency_limit_handler(request: Request, exc: ConcurrencyLimitExceeded):
+    """Reject chat requests with no free cluster-wide slot: 429 for the user's own limit, else 503."""
+    if exc.per_user:
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Too many concurrent requests"},
+            headers={"Retry-After": str(exc.retry_after)}
+        )
+    return await inference_queue_full_handler(request, exc)
+
+@app.exception_handler(ModelNotAllowed)
+async def model_not_allowed_handler(request: Request, exc: ModelNotAllowed):
+    """Reject requests for models that are not configured."""
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": str(exc)}
+    )
+
+@app.exception_handler(ModelLoadError)
+async def model_load_error_handler(request: Request, exc: ModelLoadError):
+    """Report models that failed to load."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)}
+    )
+
+@app.exception_handler(GenerationCancelled)
+async def generation_cancelled_handler(request: Request, exc: GenerationCancelled):
+    """Report requests that ran past their deadline or were abandoned."""
+    if exc.reason == "deadline exceeded":
+        return JSONResponse(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            content={"detail": "Generation deadline exceeded"}
+        )
+    # 499: the client closed the request; nobody is left to read this
+    return JSONResponse(status_code=499, content={"detail": "Request cancelled"})
+
+def generation_slot(user: User, options: GenerationOptions) -> AsyncContextManager[None]:
+    """Hold one of the cluster-wide chat generation slots for ``user``."""
+    semaphore = getattr(app.state, "chat_semaphore", None)
+    if semaphore is None:
+        return nullcontext()
+    return semaphore.slot(user.username, options.cancel)
+
+def generation_options(message: ChatMessage, user: User) -> GenerationOptions:
+    """Per-request generation limits with a fresh deadline, scheduled for ``user``."""
+    return GenerationOptions(
+        max_new_tokens=message.max_new_tokens,
+        stop=tuple(message.stop or ()),
+        cancel=CancellationToken(timeout=settings.GENERATION_TIMEOUT_SECONDS),
+        user_id=user.username,
+        role=user.role
+    )
+
+async def reserve_tokens(
+    request: Request,
+    user: User,
+    manager: LLMManager,
+    message: ChatMessage,
+    options: GenerationOptions
+) -> Optional[TokenReservation]:
+    """
+    Reserve a chat request's worst-case token cost from the user's quota.
+
+    Returns:
+        The reservation, or None if no token quota is configured
+
+    Raises:
+        HTTPException: 429 if the user's token quota cannot cover the request
+    """
+    quota = getattr(request.app.state, "token_quota", None)
+    if quota is None:
+        return None
+    reservation = await quota.reserve(
+        f"user:{user.username}",
+        manager.count_tokens(message.content) + options.token_budget(manager.config.max_length)
+    )
+    request.state.rate_limit_headers = {
+        **getattr(request.state, "rate_limit_headers", {}),
+        **quota.headers(reservation)
+    }
+    if not reservation.granted:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Token quota exceeded",
+            headers=request.state.rate_limit_headers
+        )
+    return reservation
+
+async def settle_tokens(
+    request: Request,
+    reservation: Optional[TokenReservation],
+    manager: LLMManager,
+    message: ChatMessage,
+    reply: str
+) -> None:
+    """Debit the prompt and reply tokens a request used in place of its reservation."""
+    if reservation is None:
+        return
+    quota = request.app.state.token_quota
+    await quota.settle(reservation, manager.count_tokens(message.content) + manager.count_tokens(reply))
+    request.state.rate_limit_headers.update(quota.headers(reservation))
+
+@asynccontextmanager
+async def cancel_on_disconnect(request: Request, token: CancellationToken) -> AsyncIterator[None]:
+    """Cancel ``token`` if the client disconnects while the block runs."""
+    async def watch() -> None:
+        while not token.cancelled:
+            if await request.is_disconnected():
+                token.cancel("client disconnected")
+                return
+            await asyncio.sleep(0.25)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+@asynccontextmanager
+async def use_model(model_name: Optional[str] = None) -> AsyncIterator[LLMManager]:
+    """Select the manager for a request's model, loading it on demand."""
+    registry = getattr(app.state, "model_registry", None)
+    if registry is None:
+        yield app.state.llm_manager
+        return
+    async with registry.acquire(model_name) as manager:
+        yield manager
+
+async def require_model_ready(request: Request) -> None:
+    """Reject model requests with 503 until the model has finished loading."""
+    loader = getattr(request.app.state, "model_loader", None)
+    if loader is not None and not loader.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model is still loading",
+            headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)}
+        )
+
 # Authentication endpoints
 @app.post("/api/v1/auth/register", response_model=User)
 async def register_user(
@@ -99,19 +394,19 @@ async def register_user(
     rate_limit: dict = Depends(rate_limit_dependency())
 ):
     """Register a new user."""
-    if user.username in fake_users_db:
+    # Create a new user with hashed password
+    hashed_password = await hash_password("default-password")  # In production, get password from request
+    user_in_db = UserInDB(
+        **user.model_dump(exclude={"role"}),
+        role="user",  # Default role for new users
+        hashed_password=hashed_password
+    )
+    if not await create_user(user_in_db):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
 
-    # Create a new user with hashed password
-    hashed_password = get_password_hash("default-password")  # In production, get password from request
-    user_dict = user.model_dump()
-    user_dict["hashed_password"] = hashed_password
-    user_dict["role"] = "user"  # Default role for new users
-    fake_users_db[user.username] = user_dict
-
     return user
 
 @app.post("/api/v1/auth/token", response_model=Token)
@@ -120,7 +415,7 @@ async def login_for_access_token(
     rate_limit: dict = Depends(rate_limit_dependency())
 ):
     """Login endpoint to get access token."""
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -130,7 +425,7 @@ async def login_for_access_token(
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
@@ -146,26 +441,262 @@ async def read_users_me(
 
 @app.get("/api/v1/users", response_model=List[User])
 async def list_users(
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=200),
+    after: Optional[str] = Query(default=None, description="Username the page starts after"),
     current_user: User = Depends(requires_admin),
     rate_limit: dict = Depends(rate_limit_dependency("authenticated"))
 ):
-    """List all users (admin only)."""
-    return list(fake_users_db.values())
+    """
+    List users ordered by username, one page at a time (admin only).
+
+    A full page carries an ``X-Next-Cursor`` header; pass it as ``after`` to
+    get the next page.
+    """
+    users = await get_users(after=after, limit=limit)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = users[-1].username
+    return users
 
 @app.post("/api/v1/chat", response_model=ChatMessage)
 async def chat(
     message: ChatMessage,
+    request: Request,
     current_user: User = Depends(requires_user),
-    rate_limit: dict = Depends(rate_limit_dependency("chat"))
+    rate_limit: dict = Depends(rate_limit_dependency("chat")),
+    model_ready: None = Depends(require_model_ready)
 ):
     """Chat with the AI model."""
-    response = await app.state.llm_manager.generate_response(message.content)
-    return ChatMessage(
-        content=response,
-        timestamp=datetime.utcnow(),
-        user_id=current_user.username
+    options = generation_options(message, current_user)
+    async with use_model(message.model) as manager, cancel_on_disconnect(request, options.cancel):
+        reservation = await reserve_tokens(request, current_user, manager, message, options)
+        reply = None
+        try:
+            async with generation_slot(current_user, options):
+                if message.conversation_id:
+                    # Continue the user's conversation, keeping its history
+                    reply = await manager.chat(message, user_id=current_user.username, options=options)
+                else:
+                    reply = await manager.generate_response(message.content, options=options)
+            return reply
+        finally:
+            await settle_tokens(request, reservation, manager, message, reply.content if reply else "")
+
+@app.get("/api/v1/inference/stats")
+async def inference_stats(
+    current_user: User = Depends(requires_admin),
+    rate_limit: dict = Depends(rate_limit_dependency("authenticated"))
+):
+    """Inference queue depth, wait times and resident models (admin only)."""
+    stats = app.state.llm_manager.inference_stats()
+    registry = getattr(app.state, "model_registry", None)
+    if registry is not None:
+        stats["models"] = registry.stats()
+    semaphore = getattr(app.state, "chat_semaphore", None)
+    if semaphore is not None:
+        stats["cluster_slots"] = {**semaphore.stats(), "holders": await semaphore.holders()}
+    return stats
+
+@app.get("/api/v1/chat/history", response_model=List[ChatMessage])
+async def chat_history(
+    conversation_id: str = "default",
+    current_user: User = Depends(requires_user),
+    rate_limit: dict = Depends(rate_limit_dependency("authenticated"))
+):
+    """Get the current user's history for a conversation."""
+    return app.state.llm_manager.get_conversation_history(
+        user_id=current_user.username,
+        conversation_id=conversation_id
+    )
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream(
+    message: ChatMessage,
+    request: Request,
+    current_user: User = Depends(requires_user),
+    rate_limit: dict = Depends(rate_limit_dependency("chat")),
+    model_ready: None = Depends(require_model_ready)
+):
+    """Chat with the AI model, streaming the reply as Server-Sent Events."""
+    # The model stays in use until the response body has been streamed, and
+    # generation stops if the client goes away first
+    options = generation_options(message, current_user)
+    model_scope = AsyncExitStack()
+    try:
+        manager = await model_scope.enter_async_context(use_model(message.model))
+        await model_scope.enter_async_context(cancel_on_disconnect(request, options.cancel))
+        reservation = await reserve_tokens(request, current_user, manager, message, options)
+        streamed: List[str] = []
+        # Registered first so it runs last, once the stream has been closed
+        model_scope.push_async_callback(
+            lambda: settle_tokens(request, reservation, manager, message, "".join(streamed))
+        )
+        await model_scope.enter_async_context(generation_slot(current_user, options))
+        stream = manager.stream_response(message.content, options)
+        model_scope.push_async_callback(stream.aclose)
+
+        # Wait for the first chunk so overload and early failures still get a
+        # proper status code instead of a broken stream
+        try:
+            first_chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+    except BaseException:
+        await model_scope.aclose()
+        raise
+
+    async def event_stream() -> AsyncIterator[str]:
+        async with model_scope:
+            try:
+                if first_chunk is not None:
+                    streamed.append(first_chunk)
+                    yield _sse_event({"content": first_chunk})
+                async for chunk in stream:
+                    streamed.append(chunk)
+                    yield _sse_event({"content": chunk})
+            except GenerationCancelled as e:
+                detail = "Generation deadline exceeded" if e.reason == "deadline exceeded" else "Request cancelled"
+                yield _sse_event({"detail": detail}, event="error")
+                return
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                yield _sse_event({"detail": "Error generating response"}, event="error")
+                return
+            yield _sse_event({"finish_reason": "stop"}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+async def _authenticate_websocket(websocket: WebSocket) -> Optional[User]:
+    """
+    Authenticate a WebSocket connection once, when it is opened.
+
+    The token is taken from the Authorization header or, for browser clients
+    that cannot set headers, from a first ``{"type": "auth", "token": ...}``
+    message.
+    """
+    auth_header = websocket.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    else:
+        try:
+            auth_message = await websocket.receive_json()
+        except (WebSocketDisconnect, ValueError):
+            return None
+        token = auth_message.get("token") if isinstance(auth_message, dict) else None
+
+    try:
+        user = await get_current_user(token or "")
+    except HTTPException:
+        user = None
+    if user is None or user.disabled or not check_role_access(user.role, "user"):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+        return None
+    return user
+
+@app.websocket("/api/v1/chat/stream/ws")
+async def chat_stream_ws(websocket: WebSocket):
+    """
+    Chat with the AI model over a WebSocket.
+
+    Each ``{"role": "user", "content": ...}`` message is answered with a series of
+    ``{"type": "token"}`` messages followed by ``{"type": "done"}``.
+    """
+    await websocket.accept()
+    user = await _authenticate_websocket(websocket)
+    if user is None:
+        return
+    loader = getattr(app.state, "model_loader", None)
+    if loader is not None and not loader.ready:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Model is still loading")
+        return
+    await websocket.send_json({"type": "ready", "user": user.username})
+
+    while True:
+        try:
+            data = await websocket.receive_json()
+        except WebSocketDisconnect:
+            return
+
+        try:
+            message = ChatMessage(**data)
+        except (ValidationError, TypeError):
+            await websocket.send_json({"type": "error", "detail": "Invalid chat message"})
+            continue
+
+        is_limited, limit_info = await app.state.rate_limiter.is_rate_limited(
+            f"user:{user.username}", "chat"
+        )
+        if is_limited:
+            await websocket.send_json({
+                "type": "error",
+                "detail": "Rate limit exceeded",
+                "reset": limit_info["reset"]
+            })
+            continue
+
+        try:
+            options = generation_options(message, user)
+            async with use_model(message.model) as manager:
+                reservation = None
+                quota = getattr(app.state, "token_quota", None)
+                if quota is not None:
+                    reservation = await quota.reserve(
+                        f"user:{user.username}",
+                        manager.count_tokens(message.content) + options.token_budget(manager.config.max_length)
+                    )
+                    if not reservation.granted:
+                        await websocket.send_json({
+                            "type": "error",
+                            "detail": "Token quota exceeded",
+                            "quota": reservation.windows
+                        })
+                        continue
+                streamed: List[str] = []
+                try:
+                    # Closing the stream on disconnect cancels the generation
+                    async with generation_slot(user, options), \
+                            aclosing(manager.stream_response(message.content, options)) as stream:
+                        async for chunk in stream:
+                            streamed.append(chunk)
+                            await websocket.send_json({"type": "token", "content": chunk})
+                finally:
+                    if reservation is not None:
+                        await quota.settle(
+                            reservation,
+                            manager.count_tokens(message.content) + manager.count_tokens("".join(streamed))
+                        )
+        except WebSocketDisconnect:
+            return
+        except GenerationCancelled as e:
+            detail = "Generation deadline exceeded" if e.reason == "deadline exceeded" else "Request cancelled"
+            await websocket.send_json({"type": "error", "detail": detail})
+            continue
+        except (ModelNotAllowed, ModelLoadError) as e:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            continue
+        except InferenceQueueFull as e:
+            per_user = isinstance(e, ConcurrencyLimitExceeded) and e.per_user
+            await websocket.send_json({
+                "type": "error",
+                "detail": "Too many concurrent requests" if per_user else "Model is busy, please retry later",
+                "retry_after": e.retry_after
+            })
+            continue
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            await websocket.send_json({"type": "error", "detail": "Error generating response"})
+            continue
+        await websocket.send_json({"type": "done"})
+
 # Health check endpoint (public)
 @app.get("/health")
 async def health_check():
@@ -176,6 +707,20 @@ async def health_check():
         "version": settings.APP_VERSION
     }
 
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """Readiness probe reporting model load progress."""
+    loader = getattr(request.app.state, "model_loader", None)
+    if loader is None:
+        return {"ready": True}
+    load_status = loader.status()
+    if not load_status["ready"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=load_status
+        )
+    return load_status
+
 @app.get("/")
 async def root(rate_limit: dict = Depends(rate_limit_dependency())):
     """Root endpoint with API information."""
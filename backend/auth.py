@@ -3,21 +3,32 @@ Authentication module for AMEGA-AI
 
 This module handles JWT-based authentication, password hashing, and user management.
 """
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Literal
-from fastapi import Depends, HTTPException, status
+from typing import Any, Optional, Dict, List, Literal, Tuple
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
 
 from .config import settings
+from .user_store import InMemoryUserRepository, UserRepository
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes of another cost count as outdated
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so hashing on a few threads keeps the event loop free
+_hash_executor: Optional[ThreadPoolExecutor] = None
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
+# Same scheme for dependencies that may already have a verified user
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token", auto_error=False)
 
 # JWT configuration
 SECRET_KEY = settings.SECRET_KEY
@@ -46,6 +57,9 @@ class UserInDB(User):
     """User model with hashed password."""
     hashed_password: str
 
+# Users of recently verified tokens, by token digest, with when the entry expires
+_verified_tokens: "OrderedDict[str, Tuple[UserInDB, float]]" = OrderedDict()
+
 # Simulated database (replace with actual database in production)
 fake_users_db = {
     "admin": {
@@ -74,6 +88,9 @@ fake_users_db = {
     }
 }
 
+# Where users are stored: fake_users_db unless the app is configured with a database
+_user_repository: UserRepository = InMemoryUserRepository(fake_users_db)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -82,41 +99,143 @@ def get_password_hash(password: str) -> str:
     """Get password hash."""
     return pwd_context.hash(password)
 
-def get_user(username: str) -> Optional[UserInDB]:
+def _password_executor() -> ThreadPoolExecutor:
+    """Return the thread pool passwords are hashed on, creating it on first use."""
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+    return _hash_executor
+
+async def hash_password(password: str) -> str:
+    """Hash a password without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor(), pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password without blocking the event loop.
+
+    Returns:
+        Whether the password matches, and a new hash to store if the old one
+        uses an outdated cost
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor(), pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+def shutdown_password_hashing() -> None:
+    """Stop the password hashing threads."""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+
+def set_user_repository(repository: UserRepository) -> None:
+    """Store users in ``repository`` from now on."""
+    global _user_repository
+    _user_repository = repository
+    clear_token_cache()
+
+def get_user_repository() -> UserRepository:
+    """Return the repository users are stored in."""
+    return _user_repository
+
+async def get_user(username: str) -> Optional[UserInDB]:
     """Get user from database."""
-    if username in fake_users_db:
-        user_dict = fake_users_db[username]
+    user_dict = await _user_repository.get(username)
+    if user_dict is not None:
         return UserInDB(**user_dict)
     return None
 
-def authenticate_user(username: str, password: str) -> Optional[User]:
-    """Authenticate a user."""
-    user = get_user(username)
+async def create_user(user: UserInDB) -> bool:
+    """Store a new user; returns False if the username is taken."""
+    return await _user_repository.add(user.model_dump())
+
+async def get_users(after: Optional[str] = None, limit: int = 50) -> List[UserInDB]:
+    """Return up to ``limit`` users ordered by username, starting after the username ``after``."""
+    return [UserInDB(**user_dict) for user_dict in await _user_repository.list(after, limit)]
+
+async def update_user(username: str, **changes: Any) -> bool:
+    """
+    Change a user's stored fields; returns False if there is no such user.
+
+    Tokens already verified for the user are forgotten, so a disabled user or
+    changed role takes effect on their next request.
+    """
+    try:
+        return await _user_repository.update(username, **changes)
+    finally:
+        invalidate_user_tokens(username)
+
+def invalidate_user_tokens(username: str) -> None:
+    """Forget the verified tokens of a user."""
+    for digest in [digest for digest, (user, _) in _verified_tokens.items() if user.username == username]:
+        del _verified_tokens[digest]
+
+def clear_token_cache() -> None:
+    """Forget all verified tokens."""
+    _verified_tokens.clear()
+
+def _get_verified_token(digest: str) -> Optional[UserInDB]:
+    entry = _verified_tokens.get(digest)
+    if entry is None:
+        return None
+    user, expires_at = entry
+    if expires_at <= time.time():
+        del _verified_tokens[digest]
+        return None
+    _verified_tokens.move_to_end(digest)
+    return user
+
+def _set_verified_token(digest: str, user: UserInDB, expires_at: float) -> None:
+    if settings.TOKEN_CACHE_MAX_ENTRIES <= 0:
+        return
+    _verified_tokens[digest] = (user, expires_at)
+    _verified_tokens.move_to_end(digest)
+    while len(_verified_tokens) > settings.TOKEN_CACHE_MAX_ENTRIES:
+        _verified_tokens.popitem(last=False)
+
+async def authenticate_user(username: str, password: str) -> Optional[User]:
+    """Authenticate a user, upgrading their password hash if its cost has changed."""
+    user = await get_user(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash is not None:
+        await _user_repository.update(username, hashed_password=new_hash)
+        user.hashed_password = new_hash
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create access token."""
+    """
+    Create access token.
+
+    ``data`` carries the user's name as ``sub`` and their role as ``role``;
+    tokens whose role no longer matches the stored user are rejected.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
 
-    # Get user role
-    user = get_user(data.get("sub"))
-    if user:
-        to_encode["role"] = user.role
-
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    """Get current user from JWT token."""
+    """Get current user from JWT token, reusing the result for a token verified before."""
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    user = _get_verified_token(digest)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -128,7 +247,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         if username is None:
             raise credentials_exception
 
-        user = get_user(username=username)
+        user = await get_user(username=username)
         if user is None:
             raise credentials_exception
 
@@ -137,11 +256,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         if role != user.role:
             raise credentials_exception
 
+        if payload.get("exp") is not None:
+            # Re-read the user at least as often as the user cache does, so a
+            # change made on another replica reaches long-lived tokens
+            expires_at = min(payload["exp"], time.time() + settings.USER_CACHE_TTL_SECONDS)
+            _set_verified_token(digest, user, expires_at)
         return user
     except JWTError:
         raise credentials_exception
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_request_user(request: Request, token: Optional[str] = Depends(optional_oauth2_scheme)) -> User:
+    """Get the user the RBAC middleware already authenticated, verifying the token only without one."""
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_user(token)
+
+async def get_current_active_user(current_user: User = Depends(get_request_user)) -> User:
     """Get current active user."""
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -0,0 +1,179 @@
+"""
+Dynamic request batching for AMEGA-AI
+
+This module collects generation requests that arrive concurrently and runs them
+as a single batched forward pass, handing each caller its own decoded output.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .inference_pool import InferencePool, InferenceQueueFull, WaitTimeStats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingRequest:
+    """A prompt waiting to be placed in a batch."""
+    prompt: str
+    future: asyncio.Future
+    options: Any = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BatchScheduler:
+    """
+    Collects concurrent prompts into batches.
+
+    A batch is closed as soon as it holds ``max_batch_size`` prompts or the first
+    prompt in it has waited ``max_wait_ms`` milliseconds, whichever comes first.
+    Closed batches are handed to ``process_batch`` in a worker thread so the event
+    loop keeps serving other requests while the model runs. Requests whose
+    caller gave up while they were queued are dropped before a batch is formed. When ``max_pending``
+    prompts are already waiting, new submissions are rejected with
+    ``InferenceQueueFull``.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[str], List[Any]], List[str]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_concurrent_batches: int = 1,
+        pool: Optional[InferencePool] = None,
+        max_pending: Optional[int] = None
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            process_batch: Blocking callable mapping a list of prompts and their
+                per-request options to a list of outputs of the same length and order.
+            max_batch_size: Maximum number of prompts in a single batch.
+            max_wait_ms: Maximum time the oldest prompt waits for the batch to fill.
+            max_concurrent_batches: Number of batches allowed to run at once.
+            pool: Worker pool that runs the batches. The event loop's default
+                executor is used when omitted.
+            max_pending: Maximum number of prompts waiting for a batch.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches
+        self.pool = pool
+        self.max_pending = max_pending
+
+        self._wait_stats = WaitTimeStats()
+        self._rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+    def _ensure_started(self) -> None:
+        """Start the collector task on the running event loop if needed."""
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+
+    async def submit(self, prompt: str, options: Any = None) -> str:
+        """Queue a prompt for the next batch and wait for its output."""
+        self._ensure_started()
+        if self.max_pending is not None and self._queue.qsize() >= self.max_pending:
+            self._rejected += 1
+            raise InferenceQueueFull(self.pool.retry_after_seconds if self.pool else 5)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingRequest(prompt=prompt, future=future, options=options))
+        return await future
+
+    @property
+    def pending(self) -> int:
+        """Number of prompts waiting to be placed in a batch."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching queue depth and wait-time statistics."""
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self._rejected,
+            "batch_wait": self._wait_stats.as_dict()
+        }
+
+    async def _next_live_request(self, timeout: Optional[float] = None) -> _PendingRequest:
+        """Return the next queued request whose caller is still waiting."""
+        while True:
+            if timeout is None:
+                request = await self._queue.get()
+            else:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            if not request.future.done():
+                return request
+
+    async def _collect(self) -> None:
+        """Form batches from the queue until cancelled."""
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = [await self._next_live_request()]
+                deadline = batch[0].enqueued_at + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await self._next_live_request(remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[_PendingRequest]) -> None:
+        """Run one batch off the event loop and resolve its futures."""
+        try:
+            prompts = [request.prompt for request in batch]
+            options = [request.options for request in batch]
+            started = time.monotonic()
+            for request in batch:
+                self._wait_stats.record(started - request.enqueued_at)
+            logger.debug("Running generation batch of size %d", len(prompts))
+            try:
+                if self.pool is not None:
+                    outputs = await self.pool.run(self.process_batch, prompts, options)
+                else:
+                    loop = asyncio.get_running_loop()
+                    outputs = await loop.run_in_executor(None, self.process_batch, prompts, options)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                return
+
+            for request, output in zip(batch, outputs):
+                if not request.future.done():
+                    request.future.set_result(output)
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        """Stop collecting and wait for running batches to finish."""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
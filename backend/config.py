@@ -51,6 +51,15 @@ class LLMConfig(BaseModel):
         le=2.0,
         description="Penalty for new tokens based on their frequency in the text so far."
     )
+    draft_model_name: Optional[str] = Field(
+        default=None,
+        description="Small model sharing the tokenizer that drafts tokens for speculative decoding; disabled if unset."
+    )
+    num_assistant_tokens: int = Field(
+        default=5,
+        gt=0,
+        description="Number of tokens the draft model proposes before the main model verifies them."
+    )
 
 class BackendConfig(BaseModel):
     """Configuration for different LLM backends."""
@@ -74,6 +83,23 @@ class BackendConfig(BaseModel):
         gt=0,
         description="Timeout for API requests in seconds"
     )
+    max_concurrency: int = Field(
+        default=8,
+        gt=0,
+        description="Maximum number of concurrent requests to the backend"
+    )
+    precision: Literal["fp32", "bf16", "int8"] = Field(
+        default="fp32",
+        description="Inference precision for locally loaded models: fp32, bf16 or dynamic int8"
+    )
+    runtime: Literal["torch", "onnxruntime"] = Field(
+        default="torch",
+        description="Runtime for locally loaded models: PyTorch, or ONNX Runtime on CPU"
+    )
+    onnx_cache_dir: str = Field(
+        default=".cache/onnx",
+        description="Directory where models exported for ONNX Runtime are cached"
+    )
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -89,6 +115,21 @@ class Settings(BaseSettings):
 
     # Database settings
     DATABASE_URL: Optional[PostgresDsn] = None
+    DATABASE_POOL_SIZE: int = Field(
+        default=5,
+        gt=0,
+        description="Connections each replica keeps open to the database"
+    )
+    USER_CACHE_TTL_SECONDS: float = Field(
+        default=30.0,
+        gt=0,
+        description="How long a user read from the database is served from memory"
+    )
+    USER_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        gt=0,
+        description="Users each replica keeps in memory"
+    )
 
     # Redis settings
     REDIS_URL: Optional[RedisDsn] = Field(
@@ -138,12 +179,179 @@ class Settings(BaseSettings):
         description="LLM generation parameters"
     )
 
+    # Inference settings
+    INFERENCE_WORKERS: int = Field(
+        default=1,
+        gt=0,
+        description="Number of worker threads running model inference"
+    )
+    INFERENCE_MAX_QUEUE: int = Field(
+        default=64,
+        gt=0,
+        description="Maximum number of requests waiting for inference before new ones are rejected"
+    )
+    INFERENCE_RETRY_AFTER_SECONDS: int = Field(
+        default=5,
+        gt=0,
+        description="Retry-After value sent with 503 responses when the inference queue is full"
+    )
+    MODEL_WORKERS: int = Field(
+        default=0,
+        ge=0,
+        description="Number of model worker processes for the local model; 0 runs the model in the API process"
+    )
+    MODEL_WORKER_THREADS: int = Field(
+        default=0,
+        ge=0,
+        description="CPU cores and torch threads per model worker; 0 divides the available cores evenly"
+    )
+    MODEL_WORKER_HEALTH_INTERVAL_SECONDS: float = Field(
+        default=5.0,
+        gt=0,
+        description="Seconds between model worker health checks; silent workers are restarted"
+    )
+    GENERATION_TIMEOUT_SECONDS: float = Field(
+        default=120.0,
+        gt=0,
+        description="Deadline for generating one reply; slower requests are cancelled with a 504"
+    )
+    SCHEDULER_MAX_CONCURRENT: int = Field(
+        default=0,
+        ge=0,
+        description="Requests generating at the same time; 0 allows one full batch per inference worker"
+    )
+    SCHEDULER_MAX_IN_FLIGHT_PER_USER: int = Field(
+        default=4,
+        ge=0,
+        description="Requests one user may have generating at the same time; 0 for no limit"
+    )
+    SCHEDULER_ROLE_WEIGHTS: Dict[str, float] = Field(
+        default_factory=lambda: {"admin": 4.0, "moderator": 2.0, "user": 1.0},
+        description="Relative share of the model given to each role's users when requests queue"
+    )
+    CHAT_CONCURRENCY_LIMIT: int = Field(
+        default=64,
+        ge=0,
+        description="Chat generations allowed at the same time across all replicas; 0 for no limit"
+    )
+    CHAT_CONCURRENCY_PER_USER: int = Field(
+        default=2,
+        ge=0,
+        description="Chat generations one user may run at the same time across all replicas; 0 for no limit"
+    )
+    CHAT_CONCURRENCY_LEASE_SECONDS: float = Field(
+        default=30.0,
+        gt=0,
+        description="How long a replica's generation slot survives without being renewed"
+    )
+    CHAT_CONCURRENCY_MAX_WAIT_SECONDS: float = Field(
+        default=2.0,
+        ge=0,
+        description="How long a chat request waits for a cluster-wide slot before it is rejected"
+    )
+    BATCH_MAX_SIZE: int = Field(
+        default=8,
+        gt=0,
+        description="Maximum number of chat requests generated together in one batch"
+    )
+    BATCH_MAX_WAIT_MS: float = Field(
+        default=10.0,
+        ge=0.0,
+        description="Maximum time in milliseconds a request waits for its batch to fill"
+    )
+    KV_CACHE_MAX_MB: int = Field(
+        default=512,
+        ge=0,
+        description="Memory budget in MB for per-conversation key/value caches"
+    )
+    PREFIX_CACHE_MAX_MB: int = Field(
+        default=256,
+        ge=0,
+        description="Memory budget in MB for the key/value state of registered prompt prefixes"
+    )
+    PROMPT_PREFIXES: List[str] = Field(
+        default_factory=list,
+        description="Prompt prefixes (e.g. system prompts) whose key/value state is kept for reuse"
+    )
+    RESPONSE_CACHE_ENABLED: bool = Field(
+        default=True,
+        description="Cache generated responses for repeated prompts"
+    )
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(
+        default=1024,
+        gt=0,
+        description="Maximum number of responses kept in the in-process cache"
+    )
+    RESPONSE_CACHE_TTL_SECONDS: int = Field(
+        default=300,
+        gt=0,
+        description="Time to live of cached responses in seconds"
+    )
+    RESPONSE_CACHE_SAMPLED: bool = Field(
+        default=False,
+        description="Also cache responses generated with sampling (temperature > 0)"
+    )
+    SESSION_STORE_SHARDS: int = Field(
+        default=16,
+        gt=0,
+        description="Number of independently locked shards in the conversation session store"
+    )
+    SESSION_MAX_TOKENS: int = Field(
+        default=1024,
+        gt=0,
+        description="Token budget of each conversation's sliding history window"
+    )
+    SESSION_TTL_SECONDS: int = Field(
+        default=1800,
+        gt=0,
+        description="Idle time in seconds after which a conversation session is evicted"
+    )
+    SESSION_MAX_TOTAL_MESSAGES: int = Field(
+        default=100_000,
+        gt=0,
+        description="Hard cap on messages resident across all conversation sessions"
+    )
+    MODEL_WARM_UP: bool = Field(
+        default=True,
+        description="Run a short warm-up generation after the model loads"
+    )
+    MODEL_LOAD_BUDGET_SECONDS: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Cold-start budget for loading the model; exceeding it logs a warning"
+    )
+    ALLOWED_MODELS: List[str] = Field(
+        default_factory=list,
+        description="Models a request may select besides the default model of the active backend"
+    )
+    MODEL_MEMORY_BUDGET_MB: int = Field(
+        default=8192,
+        gt=0,
+        description="Memory budget in MB for resident model weights; least recently used models are evicted"
+    )
+
     # JWT settings
     SECRET_KEY: str = Field(
         default="your-secret-key-please-change-in-production"
     )
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        ge=0,
+        description="Verified access tokens remembered until they expire; 0 to verify every request"
+    )
+    BCRYPT_ROUNDS: int = Field(
+        default=12,
+        ge=4,
+        le=31,
+        description="bcrypt cost factor; stored hashes with another cost are rehashed on login"
+    )
+    PASSWORD_HASH_WORKERS: int = Field(
+        default=2,
+        gt=0,
+        description="Threads hashing and verifying passwords off the event loop"
+    )
 
     # Rate limiting settings
     RATE_LIMIT_DEFAULT_RPM: int = Field(
@@ -158,6 +366,49 @@ class Settings(BaseSettings):
         default=50,
         description="Chat requests per minute"
     )
+    RATE_LIMIT_ALGORITHM: Literal["fixed_window", "sliding_window", "gcra"] = Field(
+        default="sliding_window",
+        description="Rate limiting algorithm of the default and authenticated tiers"
+    )
+    RATE_LIMIT_CHAT_ALGORITHM: Literal["fixed_window", "sliding_window", "gcra"] = Field(
+        default="gcra",
+        description="Rate limiting algorithm of the chat tier"
+    )
+    RATE_LIMIT_CHAT_BURST: int = Field(
+        default=5,
+        gt=0,
+        description="Chat requests a client may send at once with the gcra algorithm"
+    )
+    TOKEN_QUOTA_PER_MINUTE: int = Field(
+        default=20000,
+        ge=0,
+        description="Prompt and generated tokens each user may use per minute; 0 for no limit"
+    )
+    TOKEN_QUOTA_PER_DAY: int = Field(
+        default=500000,
+        ge=0,
+        description="Prompt and generated tokens each user may use per day; 0 for no limit"
+    )
+    RATE_LIMIT_MODE: Literal["redis", "hybrid"] = Field(
+        default="redis",
+        description="Check every request in Redis, or count locally and sync with Redis in batches"
+    )
+    RATE_LIMIT_SYNC_INTERVAL_SECONDS: float = Field(
+        default=1.0,
+        gt=0,
+        description="Longest time the hybrid rate limiter keeps counts unsynced"
+    )
+    RATE_LIMIT_SYNC_TOLERANCE: float = Field(
+        default=0.1,
+        gt=0,
+        le=1,
+        description="Fraction of a limit each process may count per client before the hybrid limiter syncs early"
+    )
+    RATE_LIMIT_REDIS_MAX_CONNECTIONS: int = Field(
+        default=50,
+        gt=0,
+        description="Size of the rate limiter's Redis connection pool"
+    )
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -255,6 +506,11 @@ class Settings(BaseSettings):
             if "generation" in llm_data:
                 config_data["LLM_CONFIG"] = llm_data["generation"]
 
+            if "allowed_models" in llm_data:
+                config_data["ALLOWED_MODELS"] = llm_data["allowed_models"]
+            if "memory_budget_mb" in llm_data:
+                config_data["MODEL_MEMORY_BUDGET_MB"] = llm_data["memory_budget_mb"]
+
         # Create settings instance with YAML data
         return cls(**config_data)
 
@@ -0,0 +1,267 @@
+"""
+Cluster-wide concurrency limiting for AMEGA-AI
+
+This module caps how many generations run at the same time across all API
+replicas. Each running generation holds a lease in Redis sorted sets, one for
+the whole cluster and one per user, scored by when the lease expires. Holders
+renew their leases while they run, so the slots of a replica that dies are
+freed once its leases expire instead of being lost for good.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from redis.exceptions import RedisError
+
+from .generation_control import CancellationToken, await_cancellable
+from .inference_pool import InferenceQueueFull, WaitTimeStats
+
+logger = logging.getLogger(__name__)
+
+# KEYS: global holders, user holders
+# ARGV: holder, lease ms, global limit, user limit (0 = no limit)
+# Returns {acquired, global holders, user holders}; acquired is 1, or 0 when
+# the cluster is full and -1 when the user is at their limit
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local lease = tonumber(ARGV[2])
+local global_limit = tonumber(ARGV[3])
+local user_limit = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local holders = redis.call('ZCARD', KEYS[1])
+local user_holders = redis.call('ZCARD', KEYS[2])
+if global_limit > 0 and holders >= global_limit then
+    return {0, holders, user_holders}
+end
+if user_limit > 0 and user_holders >= user_limit then
+    return {-1, holders, user_holders}
+end
+redis.call('ZADD', KEYS[1], now + lease, ARGV[1])
+redis.call('ZADD', KEYS[2], now + lease, ARGV[1])
+redis.call('PEXPIRE', KEYS[1], lease)
+redis.call('PEXPIRE', KEYS[2], lease)
+return {1, holders + 1, user_holders + 1}
+"""
+
+# KEYS: global holders, user holders; ARGV: holder, lease ms
+# Returns 1 if the lease was extended, 0 if it had already expired
+RENEW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local expires = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not expires or tonumber(expires) <= now then
+    return 0
+end
+local lease = tonumber(ARGV[2])
+redis.call('ZADD', KEYS[1], now + lease, ARGV[1])
+redis.call('ZADD', KEYS[2], now + lease, ARGV[1])
+redis.call('PEXPIRE', KEYS[1], lease)
+redis.call('PEXPIRE', KEYS[2], lease)
+return 1
+"""
+
+
+class ConcurrencyLimitExceeded(InferenceQueueFull):
+    """Raised when no cluster-wide generation slot frees up in time."""
+
+    def __init__(self, retry_after: int = 5, per_user: bool = False):
+        super().__init__(retry_after)
+        self.per_user = per_user
+
+
+class DistributedSemaphore:
+    """Cap in-flight work across processes with leases held in Redis."""
+
+    def __init__(
+        self,
+        redis,
+        name: str = "chat",
+        max_holders: int = 64,
+        max_per_user: int = 4,
+        lease_seconds: float = 30.0,
+        max_wait_seconds: float = 2.0,
+        max_waiting: int = 64,
+        retry_after_seconds: int = 5,
+        poll_interval_seconds: float = 0.05
+    ):
+        """
+        Initialize the semaphore.
+
+        Args:
+            redis: Async Redis client holding the leases
+            name: Name of the limited resource, used in the Redis keys
+            max_holders: Holders allowed across the cluster; 0 for no limit
+            max_per_user: Holders allowed per user; 0 for no limit
+            lease_seconds: How long a lease lasts without being renewed
+            max_wait_seconds: How long an acquire waits for a free slot
+            max_waiting: Acquires this process lets wait at once; further
+                ones are rejected immediately
+            retry_after_seconds: Value suggested to clients that were rejected
+            poll_interval_seconds: First delay between attempts while waiting
+        """
+        self.redis = redis
+        self.name = name
+        self.max_holders = max_holders
+        self.max_per_user = max_per_user
+        self.lease_seconds = lease_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_waiting = max_waiting
+        self.retry_after_seconds = retry_after_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        self._renew = redis.register_script(RENEW_SCRIPT)
+
+        self._held = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._rejected = 0
+        self._leases_lost = 0
+        self._errors = 0
+        self._wait = WaitTimeStats()
+
+    def _keys(self, user: str):
+        return f"semaphore:{self.name}:holders", f"semaphore:{self.name}:user:{user}"
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: Optional[str] = None,
+        token: Optional[CancellationToken] = None
+    ) -> AsyncIterator[None]:
+        """
+        Hold a cluster-wide slot while the block runs.
+
+        If Redis cannot be reached the block runs without a slot, leaving each
+        replica's own scheduler to bound its load.
+
+        Args:
+            user_id: User the slot is held for
+            token: Cancels the wait when it fires
+
+        Raises:
+            ConcurrencyLimitExceeded: If no slot frees up within ``max_wait_seconds``
+            GenerationCancelled: If ``token`` fires while waiting
+        """
+        user = user_id or ""
+        keys = self._keys(user)
+        holder = f"{user}:{uuid.uuid4().hex}"
+        try:
+            acquired = await self._wait_for_slot(keys, holder, token)
+        except RedisError as e:
+            self._errors += 1
+            logger.warning(f"Concurrency limit unavailable, running without a slot: {str(e)}")
+            acquired = False
+        if not acquired:
+            yield
+            return
+
+        self._held += 1
+        renewer = asyncio.create_task(self._keep_alive(keys, holder))
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            self._held -= 1
+            try:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.zrem(keys[0], holder)
+                    pipe.zrem(keys[1], holder)
+                    await pipe.execute()
+            except RedisError as e:
+                # The lease expires on its own
+                self._errors += 1
+                logger.warning(f"Failed to release concurrency slot: {str(e)}")
+
+    async def _try_acquire(self, keys, holder: str) -> int:
+        acquired, _, _ = await self._acquire(
+            keys=list(keys),
+            args=[holder, int(self.lease_seconds * 1000), self.max_holders, self.max_per_user],
+            client=self.redis
+        )
+        return acquired
+
+    async def _wait_for_slot(self, keys, holder: str, token: Optional[CancellationToken]) -> bool:
+        """Acquire a slot, retrying with backoff until it is free or the wait times out."""
+        acquired = await self._try_acquire(keys, holder)
+        if acquired == 1:
+            self._acquired += 1
+            self._wait.record(0.0)
+            return True
+        if self._waiting >= self.max_waiting or not self.max_wait_seconds:
+            self._rejected += 1
+            raise ConcurrencyLimitExceeded(self.retry_after_seconds, per_user=acquired == -1)
+
+        started = time.monotonic()
+        deadline = started + self.max_wait_seconds
+        delay = self.poll_interval_seconds
+        self._waiting += 1
+        try:
+            while True:
+                # Holders release without notifying waiters, so poll
+                sleep = min(delay, deadline - time.monotonic())
+                if sleep <= 0:
+                    self._rejected += 1
+                    raise ConcurrencyLimitExceeded(self.retry_after_seconds, per_user=acquired == -1)
+                await await_cancellable(asyncio.sleep(sleep), token)
+                delay = min(delay * 2, 0.5)
+                acquired = await self._try_acquire(keys, holder)
+                if acquired == 1:
+                    self._acquired += 1
+                    self._wait.record(time.monotonic() - started)
+                    return True
+        finally:
+            self._waiting -= 1
+
+    async def _keep_alive(self, keys, holder: str) -> None:
+        """Renew a lease until cancelled, well before it would expire."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self._renew(
+                    keys=list(keys),
+                    args=[holder, int(self.lease_seconds * 1000)],
+                    client=self.redis
+                )
+            except RedisError as e:
+                self._errors += 1
+                logger.warning(f"Failed to renew concurrency slot: {str(e)}")
+                continue
+            if not renewed:
+                # Another request may already have been given the slot
+                self._leases_lost += 1
+                logger.warning(f"Concurrency slot {holder} expired while still in use")
+                return
+
+    async def holders(self) -> Optional[Dict[str, Any]]:
+        """Return the slots currently held across the cluster, in total and per user, or None without Redis."""
+        try:
+            seconds, microseconds = await self.redis.time()
+            members = await self.redis.zrangebyscore(
+                self._keys("")[0], seconds * 1000 + microseconds // 1000, "+inf"
+            )
+        except RedisError as e:
+            self._errors += 1
+            logger.warning(f"Failed to read concurrency slot holders: {str(e)}")
+            return None
+        per_user = Counter(member.decode().rsplit(":", 1)[0] for member in members)
+        return {"total": len(members), "users": dict(per_user)}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's slot usage and wait statistics."""
+        return {
+            "max_holders": self.max_holders,
+            "max_per_user": self.max_per_user,
+            "held": self._held,
+            "waiting": self._waiting,
+            "acquired": self._acquired,
+            "rejected": self._rejected,
+            "leases_lost": self._leases_lost,
+            "errors": self._errors,
+            "wait": self._wait.as_dict()
+        }
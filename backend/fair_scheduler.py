@@ -0,0 +1,241 @@
+"""
+Fair scheduling of generation work for AMEGA-AI
+
+This module decides which waiting request gets to generate next. Requests are
+admitted up to a fixed number of concurrent generations; beyond that they wait
+and are admitted by weighted fair queuing across users, so one user submitting
+many (or long) requests cannot starve everyone else. Each role is a priority
+class whose weight sets its users' share, and each user has an in-flight cap.
+"""
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from .generation_control import CancellationToken, await_cancellable
+from .inference_pool import InferenceQueueFull, WaitTimeStats
+
+DEFAULT_ROLE_WEIGHTS = {"admin": 4.0, "moderator": 2.0, "user": 1.0}
+
+
+@dataclass
+class _Request:
+    """A request waiting for a generation slot."""
+    user: str
+    role: str
+    start_tag: float
+    sequence: int
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class _UserQueue:
+    """Waiting requests and fair-queuing state of one user."""
+    waiting: Deque[_Request] = field(default_factory=deque)
+    in_flight: int = 0
+    # Virtual time at which the user's last queued request finishes
+    finish_tag: float = 0.0
+
+
+@dataclass
+class _ClassStats:
+    """Admission statistics of one priority class."""
+    admitted: int = 0
+    in_flight: int = 0
+    queue_wait: WaitTimeStats = field(default_factory=WaitTimeStats)
+
+
+class FairScheduler:
+    """Admit generation requests by weighted fair queuing across users."""
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_in_flight_per_user: int = 4,
+        role_weights: Optional[Dict[str, float]] = None,
+        max_waiting: int = 64,
+        retry_after_seconds: int = 5
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrent: Number of requests generating at the same time
+            max_in_flight_per_user: Requests one user may have generating at
+                once; 0 for no limit. Requests without a user are not capped
+            role_weights: Share of the model each role's users get, relative
+                to each other; unknown roles get the smallest weight
+            max_waiting: Maximum number of requests waiting for a slot
+            retry_after_seconds: Value suggested to clients when too many are waiting
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.max_in_flight_per_user = max_in_flight_per_user
+        self.role_weights = dict(role_weights or DEFAULT_ROLE_WEIGHTS)
+        self.max_waiting = max_waiting
+        self.retry_after_seconds = retry_after_seconds
+
+        self._users: Dict[str, _UserQueue] = {}
+        self._classes: Dict[str, _ClassStats] = {}
+        self._active = 0
+        self._waiting = 0
+        self._rejected = 0
+        # Start tag of the most recently admitted request
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    def weight(self, role: str) -> float:
+        """Return the fair-queuing weight of ``role``."""
+        return self.role_weights.get(role, min(self.role_weights.values(), default=1.0))
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: Optional[str] = None,
+        role: str = "user",
+        cost: float = 1.0,
+        token: Optional[CancellationToken] = None
+    ) -> AsyncIterator[None]:
+        """
+        Hold a generation slot while the block runs.
+
+        Args:
+            user_id: Requesting user; requests without one share a queue
+            role: Requesting user's role, which selects the priority class
+            cost: Expected work of the request, e.g. its token budget
+            token: Cancels the wait when it fires
+
+        Raises:
+            InferenceQueueFull: If too many requests are already waiting
+            GenerationCancelled: If ``token`` fires while waiting
+        """
+        user = user_id or ""
+        await self._acquire(user, role, cost, token)
+        try:
+            yield
+        finally:
+            self._release(user, role)
+
+    async def _acquire(self, user: str, role: str, cost: float, token: Optional[CancellationToken]) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._users.setdefault(user, _UserQueue())
+        stats = self._classes.setdefault(role, _ClassStats())
+        if not queue.waiting and self._can_start(user, queue) and self._active < self.max_concurrent:
+            self._start(user, role, queue, stats, 0.0)
+            return
+        if self._waiting >= self.max_waiting:
+            self._rejected += 1
+            self._forget_if_idle(user, queue)
+            raise InferenceQueueFull(self.retry_after_seconds)
+
+        # Start-time fair queuing: a request starts where the user's previous
+        # one finishes in virtual time, but never in the past
+        start_tag = max(self._virtual_time, queue.finish_tag)
+        queue.finish_tag = start_tag + cost / self.weight(role)
+        request = _Request(
+            user=user,
+            role=role,
+            start_tag=start_tag,
+            sequence=next(self._sequence),
+            future=loop.create_future(),
+            enqueued_at=loop.time()
+        )
+        queue.waiting.append(request)
+        self._waiting += 1
+        try:
+            await await_cancellable(request.future, token)
+        except BaseException:
+            if request.future.done() and not request.future.cancelled():
+                # Admitted just as the wait was given up
+                self._release(user, role)
+            elif request in queue.waiting:
+                queue.waiting.remove(request)
+                self._waiting -= 1
+                self._forget_if_idle(user, queue)
+            raise
+
+    def _can_start(self, user: str, queue: _UserQueue) -> bool:
+        if not user or not self.max_in_flight_per_user:
+            return True
+        return queue.in_flight < self.max_in_flight_per_user
+
+    def _start(self, user: str, role: str, queue: _UserQueue, stats: _ClassStats, waited: float) -> None:
+        self._active += 1
+        queue.in_flight += 1
+        stats.admitted += 1
+        stats.in_flight += 1
+        stats.queue_wait.record(waited)
+
+    def _release(self, user: str, role: str) -> None:
+        queue = self._users[user]
+        self._active -= 1
+        queue.in_flight -= 1
+        self._classes[role].in_flight -= 1
+        self._forget_if_idle(user, queue)
+        self._dispatch()
+
+    def _forget_if_idle(self, user: str, queue: _UserQueue) -> None:
+        # A user returning after being idle starts again from the current
+        # virtual time
+        if not queue.waiting and not queue.in_flight:
+            self._users.pop(user, None)
+
+    def _dispatch(self) -> None:
+        """Admit waiting requests, smallest start tag first, while slots are free."""
+        while self._active < self.max_concurrent:
+            self._drop_abandoned()
+            best: Optional[_Request] = None
+            for user, queue in self._users.items():
+                if not queue.waiting or not self._can_start(user, queue):
+                    continue
+                head = queue.waiting[0]
+                if best is None or (head.start_tag, head.sequence) < (best.start_tag, best.sequence):
+                    best = head
+            if best is None:
+                return
+
+            queue = self._users[best.user]
+            queue.waiting.popleft()
+            self._waiting -= 1
+            self._virtual_time = max(self._virtual_time, best.start_tag)
+            loop = best.future.get_loop()
+            best.future.set_result(None)
+            self._start(best.user, best.role, queue, self._classes[best.role], loop.time() - best.enqueued_at)
+
+    def _drop_abandoned(self) -> None:
+        # A waiter whose wait was cancelled may not have run its cleanup yet;
+        # it finds its request gone and leaves the counts alone
+        for user, queue in list(self._users.items()):
+            if not queue.waiting or not queue.waiting[0].future.done():
+                continue
+            while queue.waiting and queue.waiting[0].future.done():
+                queue.waiting.popleft()
+                self._waiting -= 1
+            self._forget_if_idle(user, queue)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return slot usage and per-class admission and queue-wait statistics."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_in_flight_per_user": self.max_in_flight_per_user,
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+            "users": len(self._users),
+            "classes": {
+                role: {
+                    "weight": self.weight(role),
+                    "admitted": stats.admitted,
+                    "in_flight": stats.in_flight,
+                    "waiting": sum(
+                        1 for queue in self._users.values() for request in queue.waiting if request.role == role
+                    ),
+                    "queue_wait": stats.queue_wait.as_dict()
+                }
+                for role, stats in self._classes.items()
+            }
+        }
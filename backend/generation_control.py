@@ -0,0 +1,245 @@
+"""
+Generation control for AMEGA-AI
+
+This module carries per-request generation limits: a cancellation token that
+fires when the client disconnects or the request's deadline passes, a token
+budget, and stop sequences. A stopping criterion checks them after every
+generated token, so abandoned requests stop using the model within one step.
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import torch
+from transformers import StoppingCriteria
+
+
+class GenerationCancelled(Exception):
+    """Raised when a generation was stopped by its cancellation token."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Generation cancelled: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation flag with an optional deadline.
+
+    The token is checked from inference worker threads and cancelled from the
+    event loop (on disconnect) or by the passage of time (deadline).
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Initialize the token.
+
+        Args:
+            timeout: Seconds from now after which the token counts as cancelled
+        """
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the token was cancelled or its deadline has passed."""
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+            return True
+        return False
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None without one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Cancel the token and run its callbacks once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` when the token is cancelled (immediately if it already is)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self) -> None:
+        """Raise GenerationCancelled if the token has fired."""
+        if self.cancelled:
+            raise GenerationCancelled(self.reason or "cancelled")
+
+
+@dataclass
+class GenerationOptions:
+    """Per-request generation limits, and who the request is scheduled for."""
+    max_new_tokens: Optional[int] = None
+    stop: Sequence[str] = field(default_factory=tuple)
+    cancel: Optional[CancellationToken] = None
+    user_id: Optional[str] = None
+    role: str = "user"
+
+    def token_budget(self, default: int) -> int:
+        """Number of new tokens allowed, never more than ``default``."""
+        if self.max_new_tokens is None:
+            return default
+        return min(self.max_new_tokens, default)
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancel is not None:
+            self.cancel.raise_if_cancelled()
+
+
+def truncate_at_stop(text: str, stop: Sequence[str]) -> Tuple[str, bool]:
+    """Cut ``text`` before the earliest stop sequence; report whether one was found."""
+    positions = [text.find(sequence) for sequence in stop if sequence]
+    positions = [position for position in positions if position >= 0]
+    if not positions:
+        return text, False
+    return text[:min(positions)], True
+
+
+class RequestStoppingCriteria(StoppingCriteria):
+    """
+    Stop each sequence of a batch on its own request's limits.
+
+    A row is finished once its request is cancelled, it has produced its token
+    budget, or its generated text contains one of its stop sequences.
+    Finished rows are padded by ``generate`` while the others continue.
+    """
+
+    def __init__(
+        self,
+        options: Sequence[GenerationOptions],
+        prompt_length: int,
+        tokenizer: Any,
+        default_max_new_tokens: int
+    ):
+        self.options = list(options)
+        self.prompt_length = prompt_length
+        self.tokenizer = tokenizer
+        self.budgets = [option.token_budget(default_max_new_tokens) for option in self.options]
+        # Enough trailing tokens to contain the longest stop sequence, even if
+        # every character took several byte-level tokens
+        self.stop_windows = [
+            4 * max((len(sequence) for sequence in option.stop), default=0) + 2
+            for option in self.options
+        ]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: Any = None, **kwargs) -> torch.BoolTensor:
+        generated = input_ids.shape[1] - self.prompt_length
+        done = []
+        for row, option in enumerate(self.options):
+            if option.cancel is not None and option.cancel.cancelled:
+                done.append(True)
+            elif generated >= self.budgets[row]:
+                done.append(True)
+            elif option.stop and generated > 0:
+                window = min(generated, self.stop_windows[row])
+                tail = self.tokenizer.decode(input_ids[row, -window:], skip_special_tokens=True)
+                done.append(any(sequence in tail for sequence in option.stop))
+            else:
+                done.append(False)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class StopSequenceFilter:
+    """
+    Hold back streamed text that could be the start of a stop sequence.
+
+    ``push`` returns the text that is safe to emit; once a stop sequence is
+    complete, ``stopped`` is set and nothing more is returned.
+    """
+
+    def __init__(self, stop: Sequence[str]):
+        self.stop = [sequence for sequence in stop if sequence]
+        self.stopped = False
+        self._pending = ""
+
+    def push(self, text: str) -> str:
+        if self.stopped:
+            return ""
+        if not self.stop:
+            return text
+        self._pending += text
+        kept, found = truncate_at_stop(self._pending, self.stop)
+        if found:
+            self.stopped = True
+            self._pending = ""
+            return kept
+        # Keep the longest suffix that is a prefix of some stop sequence
+        hold = 0
+        for sequence in self.stop:
+            for length in range(min(len(sequence) - 1, len(self._pending)), 0, -1):
+                if self._pending.endswith(sequence[:length]):
+                    hold = max(hold, length)
+                    break
+        emit = self._pending[:len(self._pending) - hold]
+        self._pending = self._pending[len(emit):]
+        return emit
+
+    def flush(self) -> str:
+        pending, self._pending = ("" if self.stopped else self._pending), ""
+        return pending
+
+
+async def await_cancellable(awaitable: Awaitable[Any], token: Optional[CancellationToken]) -> Any:
+    """
+    Await ``awaitable`` but give up as soon as ``token`` fires.
+
+    If the caller itself is cancelled, the token is cancelled too so the work
+    behind ``awaitable`` stops.
+
+    Raises:
+        GenerationCancelled: If the token was cancelled or its deadline passed
+    """
+    if token is None:
+        return await awaitable
+    if token.cancelled:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise GenerationCancelled(token.reason or "cancelled")
+
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(awaitable)
+    token.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await asyncio.wait_for(task, token.remaining())
+    except asyncio.TimeoutError:
+        token.cancel("deadline exceeded")
+        raise GenerationCancelled(token.reason) from None
+    except asyncio.CancelledError:
+        if token.cancelled:
+            raise GenerationCancelled(token.reason or "cancelled") from None
+        token.cancel("caller went away")
+        raise
+
+
+@asynccontextmanager
+async def aclosing(stream: AsyncGenerator[Any, None]) -> AsyncIterator[AsyncGenerator[Any, None]]:
+    """
+    Close ``stream`` when the block exits, stopping the work behind it.
+
+    The same as ``contextlib.aclosing``, which needs Python 3.10.
+    """
+    try:
+        yield stream
+    finally:
+        await stream.aclose()
@@ -0,0 +1,182 @@
+"""
+Inference worker pool for AMEGA-AI
+
+This module runs blocking model work (tokenization, generation, decoding) on a
+dedicated set of worker threads so the asyncio event loop stays responsive. The
+queue in front of the workers is bounded: once it is full, new work is rejected
+immediately instead of piling up behind a busy model.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue cannot accept more work."""
+
+    def __init__(self, retry_after: int = 5):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+@dataclass
+class WaitTimeStats:
+    """Running statistics for time spent waiting in a queue."""
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Record one observed wait."""
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return the statistics in milliseconds."""
+        average = self.total_seconds / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(average * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3)
+        }
+
+
+@dataclass
+class _Job:
+    """A unit of blocking work waiting for a worker thread."""
+    fn: Callable[..., Any]
+    args: tuple
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class InferencePool:
+    """Bounded pool of worker threads for blocking model calls."""
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_queue_size: int = 64,
+        retry_after_seconds: int = 5
+    ):
+        """
+        Initialize the pool and start its worker threads.
+
+        Args:
+            max_workers: Number of worker threads running model calls
+            max_queue_size: Maximum number of jobs waiting for a worker
+            retry_after_seconds: Value suggested to clients when the queue is full
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.retry_after_seconds = retry_after_seconds
+
+        self._pending: Deque[_Job] = deque()
+        self._condition = threading.Condition()
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_stats = WaitTimeStats()
+        self._shutdown = False
+
+        self._threads: List[threading.Thread] = []
+        for index in range(max_workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"inference-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return len(self._pending)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run ``fn(*args)`` on a worker thread and wait for its result.
+
+        Raises:
+            InferenceQueueFull: If the queue is already at capacity
+        """
+        loop = asyncio.get_running_loop()
+        job = _Job(fn=fn, args=args, future=loop.create_future(), loop=loop)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Inference pool has been shut down")
+            if len(self._pending) >= self.max_queue_size:
+                self._rejected += 1
+                raise InferenceQueueFull(self.retry_after_seconds)
+            self._pending.append(job)
+            self._condition.notify()
+        return await job.future
+
+    def _worker(self) -> None:
+        """Worker thread loop: take jobs off the queue and run them."""
+        while True:
+            with self._condition:
+                while not self._pending and not self._shutdown:
+                    self._condition.wait()
+                if self._shutdown and not self._pending:
+                    return
+                job = self._pending.popleft()
+                # The caller went away while the job was queued
+                if job.future.cancelled():
+                    continue
+                self._active += 1
+                self._wait_stats.record(time.monotonic() - job.enqueued_at)
+
+            try:
+                result = job.fn(*job.args)
+            except BaseException as e:
+                job.loop.call_soon_threadsafe(self._set_exception, job.future, e)
+            else:
+                job.loop.call_soon_threadsafe(self._set_result, job.future, result)
+            finally:
+                with self._condition:
+                    self._active -= 1
+                    self._completed += 1
+
+    @staticmethod
+    def _set_result(future: asyncio.Future, result: Any) -> None:
+        if not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, exc: BaseException) -> None:
+        if not future.done():
+            future.set_exception(exc)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, utilisation and wait-time statistics."""
+        with self._condition:
+            return {
+                "workers": self.max_workers,
+                "active": self._active,
+                "queue_depth": len(self._pending),
+                "max_queue_size": self.max_queue_size,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "queue_wait": self._wait_stats.as_dict()
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work and let workers drain the queue."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
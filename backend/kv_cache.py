@@ -0,0 +1,284 @@
+"""
+Key/value cache management for AMEGA-AI
+
+This module keeps the attention key/value state of recent conversations so a new
+turn only has to prefill the tokens of the new message instead of the whole
+history. Resident caches are bounded by a memory budget and evicted in least
+recently used order. Registered prompt prefixes, such as a shared system prompt,
+keep their key/value state too, so requests starting with one only prefill the
+rest of their prompt.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_tensors(past_key_values: Any) -> Iterable[torch.Tensor]:
+    """Yield every tensor held by a transformers cache object or legacy tuple."""
+    if hasattr(past_key_values, "layers"):
+        for layer in past_key_values.layers:
+            yield getattr(layer, "keys", None)
+            yield getattr(layer, "values", None)
+    elif hasattr(past_key_values, "key_cache"):
+        yield from past_key_values.key_cache
+        yield from past_key_values.value_cache
+    else:
+        for layer in past_key_values:
+            yield from layer
+
+
+def cache_nbytes(past_key_values: Any) -> int:
+    """Return the number of bytes used by a key/value cache."""
+    return sum(
+        tensor.element_size() * tensor.nelement()
+        for tensor in _cache_tensors(past_key_values)
+        if isinstance(tensor, torch.Tensor)
+    )
+
+
+@dataclass
+class CachedConversation:
+    """Token ids of a conversation and the key/value state computed for them."""
+    token_ids: torch.Tensor
+    past_key_values: Any
+    nbytes: int
+
+
+@dataclass
+class _ConversationLock:
+    """Lock serializing the turns of one conversation, and how many hold or wait for it."""
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    users: int = 0
+
+
+class ConversationKVCache:
+    """
+    LRU store of per-conversation key/value caches under a memory budget.
+
+    Entries are taken out with ``pop`` while a turn is being generated (the
+    model extends the cache in place) and put back afterwards, so two requests
+    can never mutate the same cache concurrently. A turn holds ``lock`` for its
+    conversation from ``pop`` to ``put``, so a concurrent turn of the same
+    conversation waits for the updated cache instead of missing it.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the store.
+
+        Args:
+            max_bytes: Total size of resident caches before LRU eviction starts
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedConversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conversation_locks: Dict[str, _ConversationLock] = {}
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._prefill_tokens_saved = 0
+
+    @contextmanager
+    def lock(self, conversation_id: str) -> Iterator[None]:
+        """Hold a conversation exclusively while one of its turns is generated."""
+        with self._lock:
+            held = self._conversation_locks.setdefault(conversation_id, _ConversationLock())
+            held.users += 1
+        try:
+            with held.lock:
+                yield
+        finally:
+            with self._lock:
+                held.users -= 1
+                if not held.users:
+                    del self._conversation_locks[conversation_id]
+
+    def pop(self, conversation_id: str) -> Optional[CachedConversation]:
+        """Remove and return the cache for a conversation, if resident."""
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._total_bytes -= entry.nbytes
+            return entry
+
+    def record_reuse(self, num_tokens: int) -> None:
+        """Count ``num_tokens`` cached tokens a turn did not have to prefill."""
+        with self._lock:
+            self._prefill_tokens_saved += num_tokens
+
+    def put(self, conversation_id: str, token_ids: torch.Tensor, past_key_values: Any) -> None:
+        """Store a conversation's cache, evicting old entries to stay in budget."""
+        nbytes = cache_nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            logger.debug(
+                f"KV cache for {conversation_id} ({nbytes} bytes) exceeds the budget; not stored"
+            )
+            return
+
+        with self._lock:
+            previous = self._entries.pop(conversation_id, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+            while self._entries and self._total_bytes + nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                self._evictions += 1
+            self._entries[conversation_id] = CachedConversation(
+                token_ids=token_ids.detach().cpu(),
+                past_key_values=past_key_values,
+                nbytes=nbytes
+            )
+            self._total_bytes += nbytes
+
+    def discard(self, conversation_id: str) -> None:
+        """Drop the cache for a conversation."""
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self._total_bytes -= entry.nbytes
+
+    def clear(self) -> None:
+        """Drop every resident cache."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Return occupancy and hit-rate counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "prefill_tokens_saved": self._prefill_tokens_saved
+            }
+
+
+@dataclass
+class CachedPrefix:
+    """Token ids of a registered prompt prefix and its key/value state."""
+    text: str
+    token_ids: torch.Tensor
+    past_key_values: Any
+    nbytes: int
+
+
+class PrefixKVCache:
+    """
+    Key/value state of prompt prefixes shared by many requests.
+
+    Prefixes are registered as text and prefilled once the model is available.
+    A prompt whose tokens start with a prefix's tokens can then start from a
+    copy of the prefix's state. Prefixes stay resident until cleared; ones that
+    do not fit in the memory budget are not kept.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Memory budget for the key/value state of all prefixes
+        """
+        self.max_bytes = max_bytes
+        self._pending: List[str] = []
+        self._entries: Dict[str, CachedPrefix] = {}
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._prefill_tokens_saved = 0
+
+    def register(self, text: str) -> None:
+        """Queue a prefix to be prefilled."""
+        with self._lock:
+            if text and text not in self._entries and text not in self._pending:
+                self._pending.append(text)
+
+    def take_pending(self) -> List[str]:
+        """Return the prefixes still to be prefilled and forget them."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            return pending
+
+    def add(self, text: str, token_ids: torch.Tensor, past_key_values: Any) -> None:
+        """Store a prefilled prefix if it fits in the budget."""
+        nbytes = cache_nbytes(past_key_values)
+        with self._lock:
+            if self._total_bytes + nbytes > self.max_bytes:
+                logger.warning(
+                    f"Prompt prefix of {token_ids.shape[-1]} tokens exceeds the prefix cache budget; not kept"
+                )
+                return
+            self._entries[text] = CachedPrefix(
+                text=text,
+                token_ids=token_ids.detach().reshape(-1).cpu(),
+                past_key_values=past_key_values,
+                nbytes=nbytes
+            )
+            self._total_bytes += nbytes
+
+    def match(self, token_ids: torch.Tensor) -> Optional[CachedPrefix]:
+        """
+        Return the longest prefix that ``token_ids`` starts with.
+
+        At least one token must follow the prefix, since generation needs the
+        logits of the prompt's last token.
+        """
+        token_ids = token_ids.reshape(-1).cpu()
+        with self._lock:
+            best = None
+            for entry in self._entries.values():
+                length = entry.token_ids.shape[0]
+                if length < token_ids.shape[0] and torch.equal(token_ids[:length], entry.token_ids):
+                    if best is None or length > best.token_ids.shape[0]:
+                        best = entry
+            if best is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._prefill_tokens_saved += best.token_ids.shape[0]
+            return best
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Drop every prefilled prefix."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return occupancy, hit rate and prefill tokens saved."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "prefixes": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "prefill_tokens_saved": self._prefill_tokens_saved
+            }
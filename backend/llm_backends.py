@@ -0,0 +1,361 @@
+"""
+Remote LLM backends for AMEGA-AI
+
+This module implements the OpenAI, Anthropic and Ollama chat APIs behind a common
+async interface, so generation can be offloaded to a hosted service or a local
+Ollama server instead of running transformers in the API process. Each backend
+keeps one long-lived, pooled HTTP client and bounds its number of in-flight
+requests.
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import httpx
+
+from .config import BackendConfig, LLMConfig
+from .inference_pool import InferenceQueueFull
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+class BackendError(Exception):
+    """Raised when a remote backend request fails."""
+
+
+class LLMBackend(ABC):
+    """Base class of remote chat backends."""
+
+    name = "backend"
+    default_api_base = ""
+
+    def __init__(
+        self,
+        config: BackendConfig,
+        generation: Optional[LLMConfig] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Initialize the backend.
+
+        Args:
+            config: Model name, credentials, endpoint, timeout and concurrency limit
+            generation: Generation parameters sent with every request
+            transport: HTTP transport override, e.g. to talk to a fake server in tests
+        """
+        self.config = config
+        self.generation = generation or LLMConfig()
+        self.client = httpx.AsyncClient(
+            base_url=config.api_base or self.default_api_base,
+            headers=self._headers(),
+            timeout=httpx.Timeout(config.timeout),
+            limits=httpx.Limits(
+                max_connections=config.max_concurrency,
+                max_keepalive_connections=config.max_concurrency
+            ),
+            transport=transport
+        )
+        self._owns_client = True
+        self._slots = asyncio.Semaphore(config.max_concurrency)
+        self._in_flight = 0
+        self._requests = 0
+        self._errors = 0
+
+    @property
+    def model_name(self) -> str:
+        return self.config.model_name
+
+    def with_model(self, model_name: str) -> "LLMBackend":
+        """Return a backend for another model sharing this one's client and limit."""
+        backend = self.__class__.__new__(self.__class__)
+        backend.__dict__.update(self.__dict__)
+        backend.config = self.config.model_copy(update={"model_name": model_name})
+        backend._owns_client = False
+        return backend
+
+    def _headers(self) -> Dict[str, str]:
+        return {}
+
+    def wait_ready(self) -> None:
+        """Block until the backend can serve requests; remote APIs always can."""
+
+    def memory_footprint(self) -> int:
+        """Return the bytes of model weights held locally; remote models hold none."""
+        return 0
+
+    @abstractmethod
+    def _request(
+        self,
+        messages: Messages,
+        stream: bool,
+        max_tokens: int,
+        stop: Sequence[str]
+    ) -> Dict[str, Any]:
+        """Build the request body."""
+
+    def _max_tokens(self, max_tokens: Optional[int]) -> int:
+        """Per-request token budget, capped by the configured maximum."""
+        if max_tokens is None:
+            return self.generation.max_length
+        return min(max_tokens, self.generation.max_length)
+
+    @abstractmethod
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        """Extract the reply text from a complete response."""
+
+    @abstractmethod
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        """Extract the text delta from one line of a streamed response."""
+
+    @property
+    @abstractmethod
+    def path(self) -> str:
+        """Request path of the chat endpoint."""
+
+    def _check_status(self, response: httpx.Response) -> None:
+        """Turn upstream overload into backpressure and other failures into BackendError."""
+        if response.status_code in (429, 503):
+            try:
+                retry_after = int(response.headers.get("Retry-After", "5"))
+            except ValueError:
+                retry_after = 5
+            raise InferenceQueueFull(retry_after)
+        if response.is_error:
+            raise BackendError(f"{self.name} request failed with status {response.status_code}")
+
+    async def generate(
+        self,
+        messages: Messages,
+        max_tokens: Optional[int] = None,
+        stop: Sequence[str] = ()
+    ) -> str:
+        """Return the reply to a list of ``{"role", "content"}`` messages."""
+        body = self._request(messages, False, self._max_tokens(max_tokens), stop)
+        async with self._slots:
+            self._in_flight += 1
+            self._requests += 1
+            try:
+                response = await self.client.post(self.path, json=body)
+                self._check_status(response)
+                return self._parse_response(response.json())
+            except httpx.HTTPError as e:
+                self._errors += 1
+                raise BackendError(f"{self.name} request failed: {str(e)}") from e
+            except BackendError:
+                self._errors += 1
+                raise
+            finally:
+                self._in_flight -= 1
+
+    async def stream(
+        self,
+        messages: Messages,
+        max_tokens: Optional[int] = None,
+        stop: Sequence[str] = ()
+    ) -> AsyncIterator[str]:
+        """Yield the reply to ``messages`` as text deltas."""
+        body = self._request(messages, True, self._max_tokens(max_tokens), stop)
+        async with self._slots:
+            self._in_flight += 1
+            self._requests += 1
+            try:
+                async with self.client.stream("POST", self.path, json=body) as response:
+                    self._check_status(response)
+                    async for line in response.aiter_lines():
+                        text = self._parse_stream_line(line)
+                        if text:
+                            yield text
+            except httpx.HTTPError as e:
+                self._errors += 1
+                raise BackendError(f"{self.name} request failed: {str(e)}") from e
+            except BackendError:
+                self._errors += 1
+                raise
+            finally:
+                self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request counters and concurrency usage."""
+        return {
+            "backend": self.name,
+            "model": self.model_name,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.config.max_concurrency,
+            "requests": self._requests,
+            "errors": self._errors
+        }
+
+    async def close(self) -> None:
+        """Close the HTTP client if this backend owns it."""
+        if self._owns_client:
+            await self.client.aclose()
+
+
+def _sse_data(line: str) -> Optional[Dict[str, Any]]:
+    """Return the JSON payload of a Server-Sent Events ``data:`` line."""
+    if not line.startswith("data:"):
+        return None
+    payload = line[len("data:"):].strip()
+    if not payload or payload == "[DONE]":
+        return None
+    return json.loads(payload)
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI chat completions API."""
+
+    name = "openai"
+    default_api_base = "https://api.openai.com/v1"
+    path = "/chat/completions"
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.config.api_key:
+            headers["Authorization"] = f"Bearer {self.config.api_key}"
+        if self.config.organization_id:
+            headers["OpenAI-Organization"] = self.config.organization_id
+        return headers
+
+    def _request(
+        self,
+        messages: Messages,
+        stream: bool,
+        max_tokens: int,
+        stop: Sequence[str]
+    ) -> Dict[str, Any]:
+        body = {
+            "model": self.model_name,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": self.generation.temperature,
+            "top_p": self.generation.top_p,
+            "presence_penalty": self.generation.presence_penalty,
+            "frequency_penalty": self.generation.frequency_penalty,
+            "stream": stream
+        }
+        if stop:
+            body["stop"] = list(stop)
+        return body
+
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        return data["choices"][0]["message"]["content"] or ""
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        data = _sse_data(line)
+        if not data or not data.get("choices"):
+            return None
+        return data["choices"][0].get("delta", {}).get("content")
+
+
+class AnthropicBackend(LLMBackend):
+    """Anthropic messages API."""
+
+    name = "anthropic"
+    default_api_base = "https://api.anthropic.com"
+    path = "/v1/messages"
+    api_version = "2023-06-01"
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"anthropic-version": self.api_version}
+        if self.config.api_key:
+            headers["x-api-key"] = self.config.api_key
+        return headers
+
+    def _request(
+        self,
+        messages: Messages,
+        stream: bool,
+        max_tokens: int,
+        stop: Sequence[str]
+    ) -> Dict[str, Any]:
+        body = {
+            "model": self.model_name,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": self.generation.temperature,
+            "top_p": self.generation.top_p,
+            "stream": stream
+        }
+        if self.generation.top_k > 0:
+            body["top_k"] = self.generation.top_k
+        if stop:
+            body["stop_sequences"] = list(stop)
+        return body
+
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        return "".join(
+            block.get("text", "") for block in data.get("content", []) if block.get("type") == "text"
+        )
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        data = _sse_data(line)
+        if not data or data.get("type") != "content_block_delta":
+            return None
+        return data.get("delta", {}).get("text")
+
+
+class OllamaBackend(LLMBackend):
+    """Ollama chat API."""
+
+    name = "ollama"
+    default_api_base = "http://localhost:11434"
+    path = "/api/chat"
+
+    def _request(
+        self,
+        messages: Messages,
+        stream: bool,
+        max_tokens: int,
+        stop: Sequence[str]
+    ) -> Dict[str, Any]:
+        body = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": stream,
+            "options": {
+                "num_predict": max_tokens,
+                "temperature": self.generation.temperature,
+                "top_p": self.generation.top_p,
+                "top_k": self.generation.top_k,
+                "repeat_penalty": self.generation.repetition_penalty,
+                "presence_penalty": self.generation.presence_penalty,
+                "frequency_penalty": self.generation.frequency_penalty
+            }
+        }
+        if stop:
+            body["options"]["stop"] = list(stop)
+        return body
+
+    def _parse_response(self, data: Dict[str, Any]) -> str:
+        return data.get("message", {}).get("content", "")
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        # Ollama streams newline-delimited JSON objects
+        if not line.strip():
+            return None
+        return json.loads(line).get("message", {}).get("content")
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "anthropic": AnthropicBackend,
+    "ollama": OllamaBackend
+}
+
+
+def create_backend(
+    name: str,
+    config: BackendConfig,
+    generation: Optional[LLMConfig] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None
+) -> LLMBackend:
+    """Create the remote backend called ``name``."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend: {name}") from None
+    return backend_class(config, generation=generation, transport=transport)
@@ -1,125 +1,858 @@
 """
 LLM Manager for AMEGA-AI
 
-This module handles the integration with language models using transformers and langchain.
+This module handles the integration with language models using transformers.
 It provides a unified interface for text generation and chat completion.
 """
-from typing import Dict, List, Optional, Literal
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Literal
 from datetime import datetime
+import asyncio
+import copy
+import dataclasses
+import logging
+import time
 
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from langchain_community.llms import HuggingFacePipeline
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteriaList
 from pydantic import BaseModel, Field
 
+from .batching import BatchScheduler
+from .config import LLMConfig, settings
+from .fair_scheduler import FairScheduler
+from .generation_control import (
+    CancellationToken, GenerationCancelled, GenerationOptions, RequestStoppingCriteria, StopSequenceFilter,
+    await_cancellable, truncate_at_stop
+)
+from .inference_pool import InferencePool, InferenceQueueFull
+from .kv_cache import ConversationKVCache, PrefixKVCache
+from .llm_backends import LLMBackend
+from .quantization import Precision, apply_precision, load_dtype
+from .response_cache import ResponseCache, is_deterministic, make_cache_key
+from .session_store import SessionStore, approximate_token_count
+from .singleflight import SingleFlight
+from .streaming import AsyncTokenStreamer, IncrementalDecoder
+
+logger = logging.getLogger(__name__)
+
 class ChatMessage(BaseModel):
     """Model for chat messages."""
     role: Literal["user", "assistant"] = Field(..., description="The role of the message sender")
     content: str = Field(..., min_length=1, description="The content of the message")
     timestamp: datetime = Field(default_factory=datetime.utcnow, description="Message timestamp")
+    conversation_id: Optional[str] = Field(
+        default=None,
+        max_length=128,
+        description="Identifier of the conversation this message belongs to"
+    )
+    model: Optional[str] = Field(
+        default=None,
+        max_length=256,
+        description="Model to answer with; the default model if omitted"
+    )
+    max_new_tokens: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Maximum number of tokens in the reply, capped by the server's limit"
+    )
+    stop: Optional[List[str]] = Field(
+        default=None,
+        max_length=4,
+        description="Sequences that end the reply when generated; not included in it"
+    )
 
 class LLMManager:
-    def __init__(self, model_name: str = "microsoft/DialoGPT-medium"):
-        """Initialize the LLM Manager with specified model."""
+    def __init__(
+        self,
+        model_name: str = "microsoft/DialoGPT-medium",
+        config: Optional[LLMConfig] = None,
+        pool: Optional[InferencePool] = None,
+        response_cache: Optional[ResponseCache] = None,
+        load: bool = True,
+        precision: Optional[Precision] = None,
+        sessions: Optional[SessionStore] = None,
+        backend: Optional[LLMBackend] = None,
+        runtime: Optional[Literal["torch", "onnxruntime"]] = None,
+        onnx_cache_dir: Optional[str] = None,
+        scheduler: Optional[FairScheduler] = None
+    ):
+        """
+        Initialize the LLM Manager with specified model.
+
+        With ``load=False`` the tokenizer and model are not loaded until
+        ``load()`` is called, so the caller can do it in the background.
+        Managers of different models can share one inference ``pool``, one
+        ``scheduler`` and one session store, so a conversation keeps its
+        history across models.
+        With a remote ``backend``, generation is delegated to it and no local
+        model is loaded. With the ``onnxruntime`` runtime the model is exported
+        to ``onnx_cache_dir`` on first use and runs in ONNX Runtime on CPU.
+        """
+        self.backend = backend
+        if backend is not None:
+            model_name = backend.model_name
         self.model_name = model_name
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.config = config or settings.LLM_CONFIG
+        self.precision = precision or settings.HUGGINGFACE_CONFIG.precision
+        self.response_cache = response_cache
+        self._owns_pool = pool is None
+        self.pool = pool or InferencePool(
+            max_workers=settings.INFERENCE_WORKERS,
+            max_queue_size=settings.INFERENCE_MAX_QUEUE,
+            retry_after_seconds=settings.INFERENCE_RETRY_AFTER_SECONDS
+        )
+        self.runtime = runtime or settings.HUGGINGFACE_CONFIG.runtime
+        self.onnx_cache_dir = onnx_cache_dir or settings.HUGGINGFACE_CONFIG.onnx_cache_dir
+        # ONNX Runtime is only used with its CPU execution provider
+        use_cuda = torch.cuda.is_available() and self.runtime == "torch"
+        self.device = "cuda" if use_cuda else "cpu"
+        self.tokenizer = None
+        self.model = None
+        # Small model drafting tokens for speculative decoding, if configured
+        self.draft_model = None
+        self.load_timings: Dict[str, float] = {}
+
+        # Attention state of recent conversations, reused across turns
+        self.kv_cache = ConversationKVCache(max_bytes=settings.KV_CACHE_MAX_MB * 1024 * 1024)
+        # Attention state of prompt prefixes shared by many requests
+        self.prefix_cache = PrefixKVCache(max_bytes=settings.PREFIX_CACHE_MAX_MB * 1024 * 1024)
+        for prefix in settings.PROMPT_PREFIXES:
+            self.register_prefix(prefix)
+
+        # Batch concurrent requests into a single generate call and run the
+        # batches on the inference pool, one batch per worker
+        self.batcher = BatchScheduler(
+            self.generate_batch,
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+            max_concurrent_batches=self.pool.max_workers,
+            pool=self.pool,
+            max_pending=self.pool.max_queue_size
+        )
+
+        # Requests waiting to generate are admitted fairly across users
+        self.scheduler = scheduler or FairScheduler(
+            max_concurrent=settings.SCHEDULER_MAX_CONCURRENT or self.pool.max_workers * settings.BATCH_MAX_SIZE,
+            max_in_flight_per_user=settings.SCHEDULER_MAX_IN_FLIGHT_PER_USER,
+            role_weights=settings.SCHEDULER_ROLE_WEIGHTS,
+            max_waiting=self.pool.max_queue_size,
+            retry_after_seconds=self.pool.retry_after_seconds
+        )
 
-        # Initialize tokenizer and model
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_name,
-            device_map="auto" if self.device == "cuda" else None
+        # Identical greedy requests in flight at the same time share one generation
+        self.inflight = SingleFlight()
+
+        # Per-(user, conversation) message histories
+        self.sessions = sessions or SessionStore(
+            num_shards=settings.SESSION_STORE_SHARDS,
+            max_tokens_per_session=settings.SESSION_MAX_TOKENS,
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            max_total_messages=settings.SESSION_MAX_TOTAL_MESSAGES,
+            token_counter=self.count_tokens
         )
 
+        if load:
+            self.load()
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the tokenizer and model are ready for inference."""
+        if self.backend is not None:
+            return True
+        return self.model is not None and self.tokenizer is not None
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a message, including its end-of-turn token."""
+        if self.tokenizer is None:
+            return approximate_token_count(text)
+        return len(self.tokenizer.encode(text)) + 1
+
+    def memory_footprint(self) -> int:
+        """Return the number of bytes held by the loaded model's weights."""
+        if self.backend is not None:
+            # Worker processes each hold a copy of the weights
+            return self.backend.memory_footprint()
+        if self.model is None:
+            return 0
+        footprint = self.model.get_memory_footprint()
+        if self.draft_model is not None:
+            footprint += self.draft_model.get_memory_footprint()
+        return footprint
+
+    def _load_model(self, model_name: Optional[str] = None):
+        """Load model weights, preferring memory-mapped safetensors."""
+        model_name = model_name or self.model_name
+        if self.runtime == "onnxruntime" and model_name == self.model_name:
+            # Imported here so the torch runtime does not need ONNX installed
+            from .onnx_runtime import load_onnx_model
+            return load_onnx_model(model_name, self.onnx_cache_dir, precision=self.precision)
+        kwargs = {
+            "device_map": "auto" if self.device == "cuda" else None,
+            # Stream weights into place instead of materialising a random
+            # initialisation first
+            "low_cpu_mem_usage": True,
+            "torch_dtype": load_dtype(self.precision)
+        }
+        try:
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name, use_safetensors=True, **kwargs
+            )
+        except OSError:
+            logger.info(f"No safetensors weights for {model_name}; loading PyTorch weights")
+            model = AutoModelForCausalLM.from_pretrained(model_name, **kwargs)
+
         # Move model to appropriate device
         if self.device == "cpu":
-            self.model = self.model.to(self.device)
+            model = model.to(self.device)
+        model.eval()
+        return apply_precision(model, self.precision, self.device)
+
+    def _load_draft_model(self, model):
+        """Load the configured draft model if it can assist ``model``."""
+        draft_model = self._load_model(self.config.draft_model_name)
+        # Draft tokens are verified id by id, so both models must share a vocabulary
+        if draft_model.config.vocab_size != model.config.vocab_size:
+            logger.warning(
+                f"Draft model {self.config.draft_model_name} does not share the vocabulary of "
+                f"{self.model_name}; speculative decoding disabled"
+            )
+            return None
+        draft_model.generation_config.num_assistant_tokens = self.config.num_assistant_tokens
+        return draft_model
+
+    def load(self, progress: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Load the tokenizer and model.
+
+        This call blocks. Per-stage durations are recorded in ``load_timings``.
+
+        Args:
+            progress: Called with the name of each stage as it starts
+        """
+        if self.backend is not None:
+            # Remote backends have nothing to load; model worker processes
+            # load their own copies
+            self.backend.wait_ready()
+            return
+
+        def stage(name: str) -> float:
+            if progress is not None:
+                progress(name)
+            return time.perf_counter()
 
-        # Initialize conversation memory
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
+        started = stage("loading_tokenizer")
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Decoder-only models must be left-padded so every prompt in a batch
+        # ends right where generation starts
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        self.load_timings["tokenizer_seconds"] = time.perf_counter() - started
+
+        started = stage("loading_model")
+        model = self._load_model()
+        self.load_timings["model_seconds"] = time.perf_counter() - started
+
+        draft_model = None
+        if self.config.draft_model_name:
+            started = time.perf_counter()
+            draft_model = self._load_draft_model(model)
+            self.load_timings["draft_model_seconds"] = time.perf_counter() - started
+
+        self.tokenizer = tokenizer
+        self.model = model
+        self.draft_model = draft_model
+
+    def warm_up(self, prompt: str = "Hello") -> None:
+        """Run one short generation so the first real request does not pay for it."""
+        if self.backend is not None:
+            return
+        started = time.perf_counter()
+        warm_up_config = self.config.model_copy(update={"max_length": 4})
+        inputs = self.tokenizer([prompt + self.tokenizer.eos_token], return_tensors="pt")
+        with torch.inference_mode():
+            self.model.generate(
+                **inputs.to(self.device),
+                **self._generation_kwargs(warm_up_config)
+            )
+        self.load_timings["warm_up_seconds"] = time.perf_counter() - started
+
+    def _generation_kwargs(
+        self,
+        config: Optional[LLMConfig] = None,
+        batch_size: int = 1
+    ) -> Dict[str, Any]:
+        """Translate an LLMConfig into keyword arguments for ``model.generate``."""
+        config = config or self.config
+        kwargs: Dict[str, Any] = {
+            # LLMConfig.max_length counts generated tokens only, so padding a
+            # short prompt in a batch does not shorten its reply
+            "max_new_tokens": config.max_length,
+            "num_return_sequences": 1,
+            "pad_token_id": self.tokenizer.pad_token_id,
+            "repetition_penalty": config.repetition_penalty,
+        }
+        # A temperature of zero means greedy decoding
+        if config.temperature > 0:
+            kwargs.update(
+                do_sample=True,
+                temperature=config.temperature,
+                top_p=config.top_p,
+                top_k=config.top_k
+            )
+        else:
+            kwargs["do_sample"] = False
+        # Assisted generation verifies draft tokens without changing the output
+        # distribution, but only supports one sequence at a time; batches are
+        # already amortised over their prompts
+        if self.draft_model is not None and batch_size == 1:
+            kwargs["assistant_model"] = self.draft_model
+        return kwargs
+
+    def _request_kwargs(
+        self,
+        options: List[GenerationOptions],
+        prompt_length: int,
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        """Generation kwargs that also enforce each request's own limits."""
+        generation_kwargs = self._generation_kwargs(batch_size=len(options), **kwargs)
+        generation_kwargs["max_new_tokens"] = max(
+            option.token_budget(self.config.max_length) for option in options
         )
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([
+            RequestStoppingCriteria(options, prompt_length, self.tokenizer, self.config.max_length)
+        ])
+        return generation_kwargs
+
+    def register_prefix(self, prefix: str) -> None:
+        """
+        Keep the key/value state of a prompt prefix shared by many requests.
+
+        Prompts whose tokens start with the prefix's tokens then only prefill
+        the part after it. The prefix is prefilled once, on first use after the
+        model has loaded. Remote backends ignore registered prefixes.
+
+        Args:
+            prefix: Text every matching prompt starts with, e.g. a system prompt
+        """
+        self.prefix_cache.register(prefix)
 
-        # Setup conversation chain
-        self.conversation = ConversationChain(
-            llm=self._create_pipeline(),
-            memory=self.memory,
-            verbose=True
+    def _prefix_state(self, input_ids: torch.Tensor) -> Optional[Any]:
+        """Return a copy of the key/value state of the longest prefix of a prompt."""
+        for text in self.prefix_cache.take_pending():
+            token_ids = self.tokenizer.encode(text, return_tensors="pt").to(self.device)
+            outputs = self.model(token_ids, use_cache=True)
+            self.prefix_cache.add(text, token_ids, outputs.past_key_values)
+        if not len(self.prefix_cache):
+            return None
+        prefix = self.prefix_cache.match(input_ids)
+        if prefix is None:
+            return None
+        # generate extends the cache in place, so every request gets its own copy
+        return copy.deepcopy(prefix.past_key_values)
+
+    def _reuse_prefix(self, input_ids: torch.Tensor, generation_kwargs: Dict[str, Any]) -> None:
+        """Start a single sequence from its prompt prefix's cached state, if any."""
+        past_key_values = self._prefix_state(input_ids)
+        if past_key_values is not None:
+            generation_kwargs["past_key_values"] = past_key_values
+            # As with a reused conversation cache, the draft model cannot
+            # start from a partially filled cache
+            generation_kwargs.pop("assistant_model", None)
+
+    def _finish_text(self, token_ids: torch.Tensor, options: GenerationOptions) -> str:
+        """Decode one generated row and cut it at its request's limits."""
+        if options.max_new_tokens is not None:
+            token_ids = token_ids[:options.max_new_tokens]
+        text = self.tokenizer.decode(token_ids, skip_special_tokens=True)
+        return truncate_at_stop(text, options.stop)[0]
+
+    @torch.inference_mode()
+    def generate_batch(
+        self,
+        messages: List[str],
+        options: Optional[List[Optional[GenerationOptions]]] = None
+    ) -> List[str]:
+        """
+        Generate responses for several messages in one batched forward pass.
+
+        This call blocks; it is meant to be run from the batch scheduler's
+        worker thread rather than on the event loop. Each sequence stops on its
+        own token budget, stop sequences and cancellation.
+
+        Args:
+            messages: User messages to respond to
+            options: Per-message generation limits, in the same order
+
+        Returns:
+            Decoded responses in the same order as ``messages``
+        """
+        options = [option or GenerationOptions() for option in options or [None] * len(messages)]
+        prompts = [message + self.tokenizer.eos_token for message in messages]
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+
+        # Only decode the generated continuation, not the (padded) prompt
+        prompt_length = inputs["input_ids"].shape[1]
+        generation_kwargs = self._request_kwargs(options, prompt_length)
+        if len(messages) == 1:
+            # Left padding shifts a prefix's positions, so cached prefixes
+            # only apply to unpadded single sequences
+            self._reuse_prefix(inputs["input_ids"][0], generation_kwargs)
+        outputs = self.model.generate(
+            input_ids=inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            **generation_kwargs
         )
+        return [
+            self._finish_text(row[prompt_length:], option)
+            for row, option in zip(outputs, options)
+        ]
+
+    def _context_limit(self) -> int:
+        """Maximum number of prompt tokens that still leaves room for a reply."""
+        max_positions = getattr(self.model.config, "max_position_embeddings", None) or 1024
+        return max(1, max_positions - self.config.max_length)
+
+    @torch.inference_mode()
+    def generate_with_history(
+        self,
+        conversation_id: str,
+        message: str,
+        history: Optional[List[str]] = None,
+        options: Optional[GenerationOptions] = None
+    ) -> str:
+        """
+        Generate the next turn of a conversation, reusing its key/value cache.
+
+        The conversation's previous tokens and their attention state are kept in
+        ``kv_cache``, so only the tokens of the new message are prefilled. If the
+        cache was evicted, ``history`` is used to rebuild the context. Concurrent
+        turns of the same conversation wait for each other. This call blocks and
+        is meant to run on the inference pool.
+
+        Args:
+            conversation_id: Identifier of the conversation
+            message: The new user message
+            history: Earlier message texts of the conversation, oldest first
+            options: Token budget, stop sequences and cancellation of the request
 
-    def _create_pipeline(self) -> HuggingFacePipeline:
-        """Create a HuggingFace pipeline for text generation."""
-        pipeline = HuggingFacePipeline(
-            pipeline=self.model,
-            tokenizer=self.tokenizer,
-            model_kwargs={
-                "temperature": 0.7,
-                "max_length": 1000,
-                "top_p": 0.9,
-                "repetition_penalty": 1.2
-            }
+        Returns:
+            The decoded reply
+
+        Raises:
+            GenerationCancelled: If the request was cancelled during generation
+        """
+        # Each turn continues from the cache the previous one stored, so a
+        # concurrent turn must not find the cache missing while it is in use
+        with self.kv_cache.lock(conversation_id):
+            return self._generate_turn(conversation_id, message, history, options or GenerationOptions())
+
+    def _generate_turn(
+        self,
+        conversation_id: str,
+        message: str,
+        history: Optional[List[str]],
+        options: GenerationOptions
+    ) -> str:
+        """Generate one turn of a conversation while holding its lock."""
+        eos_id = self.tokenizer.eos_token_id
+        new_ids = self.tokenizer.encode(message + self.tokenizer.eos_token, return_tensors="pt")
+
+        cached = self.kv_cache.pop(conversation_id)
+        past_key_values = None
+        if cached is None and history:
+            context = "".join(text + self.tokenizer.eos_token for text in history)
+            input_ids = torch.cat(
+                [self.tokenizer.encode(context, return_tensors="pt"), new_ids], dim=-1
+            )
+        elif cached is None:
+            input_ids = new_ids
+        else:
+            history = cached.token_ids
+            # A reply cut off by the token limit has no closing EOS
+            if history[0, -1].item() != eos_id:
+                history = torch.cat([history, torch.tensor([[eos_id]])], dim=-1)
+            input_ids = torch.cat([history, new_ids], dim=-1)
+            past_key_values = cached.past_key_values
+
+        # Out of context window: keep the most recent tokens and prefill again
+        limit = self._context_limit()
+        if input_ids.shape[-1] > limit:
+            input_ids = input_ids[:, -limit:]
+            past_key_values = None
+        if past_key_values is not None:
+            self.kv_cache.record_reuse(cached.token_ids.shape[-1])
+
+        generation_kwargs = self._request_kwargs([options], input_ids.shape[-1])
+        if past_key_values is not None:
+            # Assisted generation does not reproduce the main model's logits
+            # when it starts from a partially filled cache, so a reused cache
+            # takes precedence over speculation
+            generation_kwargs.pop("assistant_model", None)
+            generation_kwargs["past_key_values"] = past_key_values
+        else:
+            # A new (or rebuilt) conversation can still start from a shared prefix
+            self._reuse_prefix(input_ids[0], generation_kwargs)
+
+        input_ids = input_ids.to(self.device)
+        outputs = self.model.generate(
+            input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            return_dict_in_generate=True,
+            **generation_kwargs
         )
-        return pipeline
 
-    async def generate_response(self, message: str) -> ChatMessage:
-        """Generate a response to the given message."""
+        # A cancelled turn is not part of the conversation
+        options.raise_if_cancelled()
+
+        sequences = outputs.sequences
+        reply = self.tokenizer.decode(sequences[0, input_ids.shape[-1]:], skip_special_tokens=True)
+        text, stopped = truncate_at_stop(reply, options.stop)
+        # The cached tokens must match the reply the conversation keeps
+        if not stopped:
+            self.kv_cache.put(conversation_id, sequences, outputs.past_key_values)
+        return text
+
+    @torch.inference_mode()
+    def _generate_streaming(
+        self,
+        message: str,
+        streamer: AsyncTokenStreamer,
+        options: GenerationOptions
+    ) -> None:
+        """Generate a single response, pushing each new token to ``streamer``."""
         try:
-            # Tokenize input
             inputs = self.tokenizer.encode(message + self.tokenizer.eos_token, return_tensors="pt")
-            inputs = inputs.to(self.device)
+            generation_kwargs = self._request_kwargs([options], inputs.shape[-1])
+            self._reuse_prefix(inputs[0], generation_kwargs)
+            self.model.generate(
+                inputs.to(self.device),
+                attention_mask=torch.ones_like(inputs).to(self.device),
+                streamer=streamer,
+                **generation_kwargs
+            )
+        finally:
+            streamer.end()
 
-            # Generate response
-            outputs = self.model.generate(
-                inputs,
-                max_length=1000,
-                num_return_sequences=1,
-                pad_token_id=self.tokenizer.eos_token_id,
-                do_sample=True,
-                temperature=0.7,
-                top_p=0.9,
-                repetition_penalty=1.2
+    async def _stream_text(self, message: str, options: GenerationOptions) -> AsyncIterator[str]:
+        """Yield raw text deltas from the remote backend or the local model."""
+        if self.backend is not None:
+            stream = self.backend.stream(
+                [{"role": "user", "content": message}],
+                max_tokens=options.max_new_tokens,
+                stop=options.stop
             )
+            async for text in stream:
+                options.raise_if_cancelled()
+                yield text
+            return
 
-            # Decode response
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        streamer = AsyncTokenStreamer(asyncio.get_running_loop())
+        generation = asyncio.ensure_future(
+            self.pool.run(self._generate_streaming, message, streamer, options)
+        )
+        # Make sure the stream terminates even if the job never starts
+        generation.add_done_callback(lambda _: streamer.close())
+
+        decoder = IncrementalDecoder(self.tokenizer)
+        try:
+            async for token_ids in streamer:
+                text = decoder.push(token_ids)
+                if text:
+                    yield text
+            tail = decoder.flush()
+            if tail:
+                yield tail
+        finally:
+            # A stream closed early has cancelled its token, so the job ends
+            # within one token; wait for it rather than leaving it running
+            await asyncio.wait([generation])
+
+        # Surface generation errors (including a full queue) to the caller
+        await generation
+
+    async def _scheduled_stream(self, message: str, options: GenerationOptions) -> AsyncIterator[str]:
+        """Yield raw text deltas once the scheduler admits the request."""
+        async with self._slot(options):
+            stream = self._stream_text(message, options)
+            try:
+                async for text in stream:
+                    yield text
+            finally:
+                await stream.aclose()
+
+    def _slot(self, options: GenerationOptions):
+        """Return the scheduler slot a request holds while it generates."""
+        return self.scheduler.slot(
+            options.user_id,
+            options.role,
+            cost=options.token_budget(self.config.max_length),
+            token=options.cancel
+        )
+
+    async def stream_response(
+        self,
+        message: str,
+        options: Optional[GenerationOptions] = None
+    ) -> AsyncIterator[str]:
+        """
+        Generate a response to the given message, yielding text as it is produced.
+
+        Generation runs on the inference pool; each yielded chunk is the text
+        completed by the newest tokens. Closing the stream early cancels the
+        generation.
+
+        Raises:
+            GenerationCancelled: If the request's deadline passed mid-stream
+        """
+        options = options or GenerationOptions()
+        if options.cancel is None:
+            options = dataclasses.replace(options, cancel=CancellationToken())
+        stop_filter = StopSequenceFilter(options.stop)
+        stream = self._scheduled_stream(message, options)
+        try:
+            async for text in stream:
+                text = stop_filter.push(text)
+                if text:
+                    yield text
+                if stop_filter.stopped:
+                    return
+            tail = stop_filter.flush()
+            if tail:
+                yield tail
+            options.raise_if_cancelled()
+        finally:
+            # Stop generating once nobody is reading the stream
+            options.cancel.cancel("stream closed")
+            await stream.aclose()
 
+    async def _generate_text(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        history: Optional[List[ChatMessage]] = None,
+        cache_sampled: Optional[bool] = None,
+        options: Optional[GenerationOptions] = None
+    ) -> str:
+        """Generate reply text, raising on failure."""
+        options = options or GenerationOptions()
+        cache_key = None
+        if (
+            conversation_id is None
+            and self.response_cache is not None
+            and self.response_cache.should_cache(self.config, cache_sampled)
+        ):
+            config = self.config.model_copy(
+                update={"max_length": options.token_budget(self.config.max_length)}
+            )
+            cache_key = make_cache_key(message, self.model_name, config, stop=options.stop)
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if conversation_id is None and is_deterministic(self.config):
+            # Concurrent identical requests would generate the same text; the
+            # shared generation only stops once all of them have gone away
+            flight_key = (message, options.token_budget(self.config.max_length), tuple(options.stop))
+            return await self.inflight.do(
+                flight_key,
+                lambda token: self._generate_uncached(
+                    message, None, history, dataclasses.replace(options, cancel=token), cache_key
+                ),
+                options.cancel
+            )
+        return await self._generate_uncached(message, conversation_id, history, options, cache_key)
+
+    async def _generate_uncached(
+        self,
+        message: str,
+        conversation_id: Optional[str],
+        history: Optional[List[ChatMessage]],
+        options: GenerationOptions,
+        cache_key: Optional[str]
+    ) -> str:
+        """Run one generation and cache its result under ``cache_key``."""
+        async with self._slot(options):
+            # Waiting stops as soon as the request is cancelled; the stopping
+            # criteria then end the model's work within one token
+            if self.backend is not None:
+                messages = [
+                    {"role": previous.role, "content": previous.content}
+                    for previous in history or []
+                ]
+                messages.append({"role": "user", "content": message})
+                generation = self.backend.generate(
+                    messages, max_tokens=options.max_new_tokens, stop=options.stop
+                )
+            elif conversation_id is not None:
+                generation = self.pool.run(
+                    self.generate_with_history,
+                    conversation_id,
+                    message,
+                    [previous.content for previous in history or []],
+                    options
+                )
+            else:
+                generation = self.batcher.submit(message, options)
+            response = await await_cancellable(generation, options.cancel)
+
+        if cache_key is not None and response:
+            await self.response_cache.set(cache_key, response)
+        return response
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        options: Optional[GenerationOptions] = None
+    ) -> str:
+        """
+        Generate the reply to a list of ``{"role", "content"}`` messages.
+
+        Unlike ``chat``, no conversation state is kept: earlier messages are
+        prefilled as context on every call.
+
+        Raises:
+            GenerationCancelled: If the request was cancelled or its deadline passed
+        """
+        *history, last = messages
+        if not history:
+            return await self._generate_text(last["content"], options=options)
+
+        conversation_id = f"complete:{id(messages)}:{time.monotonic_ns()}"
+        try:
+            return await self._generate_text(
+                last["content"],
+                conversation_id=conversation_id,
+                history=[ChatMessage(role=message["role"], content=message["content"]) for message in history],
+                options=options
+            )
+        finally:
+            # The context is sent again with the next call
+            self.kv_cache.discard(conversation_id)
+
+    async def generate_response(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        cache_sampled: Optional[bool] = None,
+        options: Optional[GenerationOptions] = None
+    ) -> ChatMessage:
+        """
+        Generate a response to the given message.
+
+        Messages that belong to a conversation continue from that conversation's
+        cached state; standalone messages are served from the response cache when
+        possible and otherwise batched with concurrent requests.
+
+        Args:
+            message: The user message
+            conversation_id: Conversation to continue, if any
+            cache_sampled: Allow caching even though sampling is enabled;
+                defaults to the response cache's setting
+            options: Token budget, stop sequences and cancellation of the request
+        """
+        try:
+            response = await self._generate_text(
+                message,
+                conversation_id=conversation_id,
+                cache_sampled=cache_sampled,
+                options=options
+            )
             return ChatMessage(
                 role="assistant",
                 content=response
             )
 
+        except (InferenceQueueFull, GenerationCancelled):
+            # Let the API layer turn overload into a 503 and deadlines into a 504
+            raise
         except Exception as e:
             # Log the error and return a graceful error message
-            print(f"Error generating response: {str(e)}")
+            logger.error(f"Error generating response: {str(e)}")
             return ChatMessage(
                 role="assistant",
                 content="I apologize, but I encountered an error processing your request. Please try again."
             )
 
-    async def chat(self, message: ChatMessage) -> ChatMessage:
-        """Process a chat message and return a response."""
+    def inference_stats(self) -> Dict[str, Any]:
+        """Return queue depth and wait-time statistics for sizing workers."""
+        return {
+            "pool": self.pool.stats(),
+            "batching": self.batcher.stats(),
+            "kv_cache": self.kv_cache.stats(),
+            "scheduler": self.scheduler.stats(),
+            "singleflight": self.inflight.stats(),
+            "prefix_cache": self.prefix_cache.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "sessions": self.sessions.stats(),
+            "backend": self.backend.stats() if self.backend else None
+        }
+
+    async def close(self) -> None:
+        """Stop batching and release the model and the inference workers it owns."""
+        await self.batcher.close()
+        if self.backend is not None:
+            await self.backend.close()
+        self.kv_cache.clear()
+        self.prefix_cache.clear()
+        self.model = None
+        self.draft_model = None
+        if self._owns_pool:
+            self.pool.shutdown(wait=False)
+
+    async def chat(
+        self,
+        message: ChatMessage,
+        user_id: str = "anonymous",
+        conversation_id: Optional[str] = None,
+        options: Optional[GenerationOptions] = None
+    ) -> ChatMessage:
+        """
+        Process a chat message within a user's conversation and return a response.
+
+        Args:
+            message: The user's message
+            user_id: Owner of the conversation
+            conversation_id: Conversation to continue; falls back to the message's
+                own conversation_id and then to ``"default"``
+            options: Token budget, stop sequences and cancellation of the request
+        """
+        conversation_id = conversation_id or message.conversation_id or "default"
         try:
-            # Add message to conversation history
-            self.memory.chat_memory.add_message(message)
+            history = self.sessions.get_history(user_id, conversation_id)
 
             # Generate response
-            response = await self.generate_response(message.content)
+            content = await self._generate_text(
+                message.content,
+                conversation_id=f"{user_id}:{conversation_id}",
+                history=history,
+                options=options
+            )
+            response = ChatMessage(
+                role="assistant",
+                content=content,
+                conversation_id=conversation_id
+            )
 
-            # Add response to conversation history
-            self.memory.chat_memory.add_message(response)
+            # Add the exchange to the conversation history
+            self.sessions.append(user_id, conversation_id, message)
+            self.sessions.append(user_id, conversation_id, response)
 
             return response
 
+        except (InferenceQueueFull, GenerationCancelled):
+            raise
         except Exception as e:
-            print(f"Error in chat: {str(e)}")
+            logger.error(f"Error in chat: {str(e)}")
             return ChatMessage(
                 role="assistant",
                 content="I apologize, but I encountered an error in our conversation. Please try again."
             )
 
-    def get_conversation_history(self) -> List[ChatMessage]:
+    def get_conversation_history(
+        self,
+        user_id: str = "anonymous",
+        conversation_id: str = "default"
+    ) -> List[ChatMessage]:
         """Return the conversation history."""
-        return self.memory.chat_memory.messages
+        return self.sessions.get_history(user_id, conversation_id)
@@ -0,0 +1,119 @@
+"""
+Background model loading for AMEGA-AI
+
+This module loads and warms up the language model after the server has started
+accepting connections, and reports load progress for readiness probes.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from .llm_manager import LLMManager
+
+logger = logging.getLogger(__name__)
+
+# Load stages in the order they happen
+LOAD_STAGES = ["pending", "loading_tokenizer", "loading_model", "warming_up", "ready"]
+
+
+class ModelLoader:
+    """Loads an LLMManager's model in the background and tracks its progress."""
+
+    def __init__(
+        self,
+        manager: LLMManager,
+        warm_up: bool = True,
+        budget_seconds: Optional[float] = None
+    ):
+        """
+        Initialize the loader.
+
+        Args:
+            manager: Manager created with ``load=False``
+            warm_up: Run a short generation once the model is loaded
+            budget_seconds: Cold-start budget; exceeding it is logged as a warning
+        """
+        self.manager = manager
+        self.warm_up = warm_up
+        self.budget_seconds = budget_seconds
+        self.stage = "pending"
+        self.error: Optional[str] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the model is loaded and warmed up."""
+        return self.stage == "ready"
+
+    def _enter_stage(self, stage: str) -> None:
+        logger.info(f"Model {self.manager.model_name}: {stage}")
+        self.stage = stage
+
+    def _load(self) -> None:
+        """Blocking load sequence, run in a worker thread."""
+        self.manager.load(progress=self._enter_stage)
+        if self.warm_up:
+            self._enter_stage("warming_up")
+            self.manager.warm_up()
+
+    async def _run(self) -> None:
+        self._started_at = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._load)
+        except Exception as e:
+            self.stage = "failed"
+            self.error = str(e)
+            logger.error(f"Failed to load model {self.manager.model_name}: {str(e)}")
+            return
+        finally:
+            self._finished_at = time.perf_counter()
+
+        self._enter_stage("ready")
+        elapsed = self._finished_at - self._started_at
+        logger.info(f"Model {self.manager.model_name} ready in {elapsed:.2f}s")
+        if self.budget_seconds is not None and elapsed > self.budget_seconds:
+            logger.warning(
+                f"Model cold start took {elapsed:.2f}s, over the {self.budget_seconds:.2f}s budget"
+            )
+
+    def start(self) -> asyncio.Task:
+        """Start loading in the background and return the loading task."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def wait(self) -> None:
+        """Wait until loading has finished (successfully or not)."""
+        if self._task is not None:
+            await self._task
+
+    def status(self) -> Dict[str, Any]:
+        """Return the current load stage, progress and timings."""
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._finished_at or time.perf_counter()) - self._started_at
+
+        if self.stage in LOAD_STAGES:
+            progress = LOAD_STAGES.index(self.stage) / (len(LOAD_STAGES) - 1)
+        else:
+            progress = 0.0
+
+        status = {
+            "ready": self.ready,
+            "model": self.manager.model_name,
+            "stage": self.stage,
+            "progress": round(progress, 2),
+            "elapsed_seconds": round(elapsed, 3),
+            "timings": {name: round(value, 3) for name, value in self.manager.load_timings.items()},
+            "budget_seconds": self.budget_seconds,
+            "within_budget": (
+                None if self.budget_seconds is None else elapsed <= self.budget_seconds
+            )
+        }
+        if self.error:
+            status["error"] = self.error
+        return status
@@ -0,0 +1,220 @@
+"""
+Model registry for AMEGA-AI
+
+This module loads language models on demand by name and keeps several of them
+resident. Resident models are bounded by a memory budget and evicted in least
+recently used order, and concurrent requests for a model that is still loading
+share a single load.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+from .llm_manager import LLMManager
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotAllowed(Exception):
+    """Raised when a request selects a model that is not configured."""
+
+    def __init__(self, model_name: str):
+        super().__init__(f"Model '{model_name}' is not available")
+        self.model_name = model_name
+
+
+class ModelLoadError(Exception):
+    """Raised when a model could not be loaded."""
+
+    def __init__(self, model_name: str, reason: str):
+        super().__init__(f"Failed to load model '{model_name}': {reason}")
+        self.model_name = model_name
+
+
+@dataclass
+class _ResidentModel:
+    """A loaded model and its bookkeeping."""
+    manager: LLMManager
+    pinned: bool = False
+    users: int = 0
+    evicted: bool = False
+
+    @property
+    def nbytes(self) -> int:
+        return self.manager.memory_footprint()
+
+
+class ModelRegistry:
+    """
+    On-demand, LRU-evicted set of resident models.
+
+    Models are created with ``factory`` and loaded in a worker thread the first
+    time they are requested. When the resident models exceed ``max_bytes``, the
+    least recently used unpinned ones are evicted. A model that is evicted while
+    requests are still using it is closed once the last of them finishes.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], LLMManager],
+        max_bytes: int,
+        allowed_models: Optional[Iterable[str]] = None,
+        warm_up: bool = False
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            factory: Creates an unloaded manager (``load=False``) for a model name
+            max_bytes: Memory budget for the weights of all resident models
+            allowed_models: Model names requests may select besides the default
+            warm_up: Run a short generation after loading each model
+        """
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.allowed_models = set(allowed_models or [])
+        self.warm_up = warm_up
+        self.default_model: Optional[str] = None
+
+        self._models: "OrderedDict[str, _ResidentModel]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        # Footprint of models seen before, used to make room ahead of a reload
+        self._known_sizes: Dict[str, int] = {}
+        self._hits = 0
+        self._loads = 0
+        self._evictions = 0
+
+    def register(self, manager: LLMManager, pinned: bool = True) -> None:
+        """
+        Add an existing manager, e.g. the default model loaded at startup.
+
+        The first registered model becomes the default. Pinned models are never
+        evicted.
+        """
+        self._models[manager.model_name] = _ResidentModel(manager=manager, pinned=pinned)
+        if self.default_model is None:
+            self.default_model = manager.model_name
+
+    def is_allowed(self, model_name: str) -> bool:
+        """Whether requests may select ``model_name``."""
+        return (
+            model_name == self.default_model
+            or model_name in self.allowed_models
+            or model_name in self._models
+        )
+
+    def _resident_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._models.values())
+
+    async def _make_room(self, nbytes: int, keep: str) -> None:
+        """Evict least recently used models until ``nbytes`` more fit the budget."""
+        for name in list(self._models):
+            if self._resident_bytes() + nbytes <= self.max_bytes:
+                return
+            entry = self._models[name]
+            if entry.pinned or name == keep:
+                continue
+            await self._evict(name)
+        if self._resident_bytes() + nbytes > self.max_bytes:
+            logger.warning(
+                f"Resident models exceed the {self.max_bytes} byte budget "
+                f"after making room for {keep}"
+            )
+
+    async def _evict(self, model_name: str) -> None:
+        entry = self._models.pop(model_name)
+        entry.evicted = True
+        self._evictions += 1
+        logger.info(f"Evicting model {model_name}")
+        if entry.users == 0:
+            await entry.manager.close()
+
+    async def _load(self, model_name: str) -> _ResidentModel:
+        """Create, load and admit a model."""
+        # Free memory before loading when the model's size is already known,
+        # so old and new weights are not resident at the same time
+        await self._make_room(self._known_sizes.get(model_name, 0), keep=model_name)
+
+        manager = self.factory(model_name)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, manager.load)
+            if self.warm_up:
+                await loop.run_in_executor(None, manager.warm_up)
+        except Exception as e:
+            await manager.close()
+            logger.error(f"Failed to load model {model_name}: {str(e)}")
+            raise ModelLoadError(model_name, str(e)) from e
+
+        entry = _ResidentModel(manager=manager)
+        self._known_sizes[model_name] = entry.nbytes
+        await self._make_room(entry.nbytes, keep=model_name)
+        self._models[model_name] = entry
+        self._loads += 1
+        return entry
+
+    async def _get_entry(self, model_name: Optional[str]) -> _ResidentModel:
+        model_name = model_name or self.default_model
+        if model_name is None or not self.is_allowed(model_name):
+            raise ModelNotAllowed(model_name or "")
+
+        entry = self._models.get(model_name)
+        if entry is not None:
+            self._models.move_to_end(model_name)
+            self._hits += 1
+            return entry
+
+        task = self._loading.get(model_name)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(model_name))
+            self._loading[model_name] = task
+            task.add_done_callback(lambda _: self._loading.pop(model_name, None))
+        # Shield the shared load from the cancellation of any single caller
+        return await asyncio.shield(task)
+
+    async def get(self, model_name: Optional[str] = None) -> LLMManager:
+        """Return the manager for a model, loading it if needed."""
+        return (await self._get_entry(model_name)).manager
+
+    @asynccontextmanager
+    async def acquire(self, model_name: Optional[str] = None) -> AsyncIterator[LLMManager]:
+        """
+        Use a model for the duration of a request.
+
+        A model evicted while in use stays open until the block exits.
+        """
+        entry = await self._get_entry(model_name)
+        entry.users += 1
+        try:
+            yield entry.manager
+        finally:
+            entry.users -= 1
+            if entry.evicted and entry.users == 0:
+                await entry.manager.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return resident models, memory use and load/eviction counters."""
+        return {
+            "default_model": self.default_model,
+            "resident": {
+                name: {"bytes": entry.nbytes, "pinned": entry.pinned, "in_use": entry.users}
+                for name, entry in self._models.items()
+            },
+            "loading": sorted(self._loading),
+            "bytes": self._resident_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "loads": self._loads,
+            "evictions": self._evictions
+        }
+
+    async def close(self) -> None:
+        """Close every resident model."""
+        for task in list(self._loading.values()):
+            task.cancel()
+        while self._models:
+            _, entry = self._models.popitem(last=False)
+            await entry.manager.close()
@@ -0,0 +1,299 @@
+"""
+ONNX Runtime inference for AMEGA-AI
+
+This module runs the HuggingFace causal LM through ONNX Runtime on CPU. The
+model is exported once, with its past key/value state as graph inputs and
+outputs so decoding stays incremental, and the exported graph is cached on disk
+keyed by model name and version. ``OnnxCausalLM`` wraps the ORT session as a
+transformers model, so ``generate`` and everything built on it (batching,
+streaming, conversation and prefix caches) work unchanged.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from torch import nn
+import transformers
+from transformers import AutoConfig, AutoModelForCausalLM, DynamicCache, GenerationConfig, GenerationMixin, PreTrainedModel
+from transformers.modeling_outputs import CausalLMOutputWithPast
+
+from .quantization import Precision
+
+try:
+    import onnxruntime as ort
+except ImportError:  # pragma: no cover - optional dependency
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the exported graph's inputs or outputs change, so stale graphs
+# are exported again
+EXPORT_FORMAT_VERSION = 1
+MODEL_FILE = "model.onnx"
+
+
+def require_onnxruntime() -> None:
+    """
+    Raises:
+        RuntimeError: If onnxruntime is not installed
+    """
+    if ort is None:
+        raise RuntimeError("The onnxruntime runtime requires the onnxruntime, onnx and onnxscript packages")
+
+
+def _weights_signature(model_name: str) -> List[Tuple[str, int, int]]:
+    """Return name, size and modification time of a local model's weight files."""
+    if not os.path.isdir(model_name):
+        return []
+    return sorted(
+        (path.name, path.stat().st_size, path.stat().st_mtime_ns)
+        for path in Path(model_name).iterdir()
+        if path.suffix in (".safetensors", ".bin")
+    )
+
+
+def export_cache_path(cache_dir: str, model_name: str, config, precision: Precision = "fp32") -> Path:
+    """
+    Return where the exported graph for a model version is cached.
+
+    The version covers the hub revision (or the weight files of a local
+    model), the model config, the precision and the library versions the
+    graph was exported with.
+    """
+    version = json.dumps({
+        "format": EXPORT_FORMAT_VERSION,
+        "revision": getattr(config, "_commit_hash", None),
+        "weights": _weights_signature(model_name),
+        "config": config.to_diff_dict(),
+        "precision": precision,
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+    }, sort_keys=True, default=str)
+    digest = hashlib.sha256(version.encode()).hexdigest()[:16]
+    safe_name = re.sub(r"[^A-Za-z0-9._-]+", "--", model_name.strip("/"))
+    return Path(cache_dir) / safe_name / digest / MODEL_FILE
+
+
+class _DecoderWithPast(nn.Module):
+    """Flattens the past key/value cache into plain tensors for export."""
+
+    def __init__(self, model: PreTrainedModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, position_ids, *past):
+        cache = DynamicCache(
+            ddp_cache_data=[(past[i], past[i + 1]) for i in range(0, len(past), 2)],
+            config=self.model.config
+        )
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=cache,
+            use_cache=True
+        )
+        presents = []
+        for layer in outputs.past_key_values.layers:
+            presents += [layer.keys, layer.values]
+        return (outputs.logits, *presents)
+
+
+def _cache_names(num_layers: int, prefix: str) -> List[str]:
+    return [f"{prefix}.{layer}.{part}" for layer in range(num_layers) for part in ("key", "value")]
+
+
+def export_onnx(model: PreTrainedModel, path: Path, precision: Precision = "fp32") -> None:
+    """
+    Export a causal LM with past key/value inputs and outputs.
+
+    The graph takes ``input_ids``, ``attention_mask``, ``position_ids`` and
+    ``past.<layer>.key``/``past.<layer>.value`` and returns ``logits`` and the
+    matching ``present.*`` tensors. Batch size, new tokens and past length are
+    all dynamic; an empty past (length 0) is the prefill. With ``int8`` the
+    exported weights are quantized for dynamic int8 matrix multiplications.
+    """
+    config = model.config
+    num_layers = config.num_hidden_layers
+    num_heads = getattr(config, "num_key_value_heads", None) or config.num_attention_heads
+    head_dim = getattr(config, "head_dim", None) or config.hidden_size // config.num_attention_heads
+
+    # Example inputs only fix the ranks; every size used here is dynamic
+    batch_size, new_tokens, past_length = 2, 3, 4
+    input_ids = torch.ones(batch_size, new_tokens, dtype=torch.long)
+    attention_mask = torch.ones(batch_size, past_length + new_tokens, dtype=torch.long)
+    position_ids = torch.arange(past_length, past_length + new_tokens).expand(batch_size, new_tokens)
+    past = [torch.zeros(batch_size, num_heads, past_length, head_dim) for _ in range(2 * num_layers)]
+
+    batch = torch.export.Dim("batch")
+    seq = torch.export.Dim("seq")
+    total = torch.export.Dim("total")
+    past_dim = torch.export.Dim("past", min=0)
+    dynamic_shapes = (
+        {0: batch, 1: seq},
+        {0: batch, 1: total},
+        {0: batch, 1: seq},
+        tuple({0: batch, 2: past_dim} for _ in past)
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Export next to the final location and move it into place, so a crash
+    # or a concurrent loader never sees a half-written graph
+    staging = Path(tempfile.mkdtemp(dir=path.parent))
+    try:
+        exported = staging / "exported"
+        exported.mkdir()
+        with torch.no_grad():
+            torch.onnx.export(
+                _DecoderWithPast(model).eval(),
+                (input_ids, attention_mask, position_ids, *past),
+                str(exported / MODEL_FILE),
+                input_names=["input_ids", "attention_mask", "position_ids", *_cache_names(num_layers, "past")],
+                output_names=["logits", *_cache_names(num_layers, "present")],
+                dynamic_shapes=dynamic_shapes,
+                opset_version=18,
+                dynamo=True,
+                external_data=True
+            )
+        if precision == "int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantized = staging / "quantized"
+            quantized.mkdir()
+            quantize_dynamic(
+                str(exported / MODEL_FILE),
+                str(quantized / MODEL_FILE),
+                weight_type=QuantType.QInt8,
+                use_external_data_format=True
+            )
+            exported = quantized
+        # The graph goes last: its presence marks the export as complete
+        for file in sorted(exported.iterdir(), key=lambda file: file.name == MODEL_FILE):
+            os.replace(file, path.parent / file.name)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class OnnxCausalLM(PreTrainedModel, GenerationMixin):
+    """A causal LM whose forward pass runs an exported graph in ONNX Runtime."""
+
+    main_input_name = "input_ids"
+
+    def __init__(self, config, session, path: Optional[Path] = None):
+        super().__init__(config)
+        self.session = session
+        self.path = path
+        self.input_names = [model_input.name for model_input in session.get_inputs()]
+        # Shape of one layer's past keys or values: (batch, heads, past, head_dim)
+        past_shape = session.get_inputs()[3].shape
+        self.num_heads, self.head_dim = past_shape[1], past_shape[3]
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device("cpu")
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return torch.float32
+
+    def get_memory_footprint(self, return_buffers: bool = True) -> int:
+        """Return the size of the exported graph and its weights."""
+        if self.path is None:
+            return 0
+        return sum(path.stat().st_size for path in self.path.parent.iterdir())
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        position_ids: Optional[torch.Tensor] = None,
+        past_key_values: Optional[DynamicCache] = None,
+        **kwargs: Any
+    ) -> CausalLMOutputWithPast:
+        batch_size, new_tokens = input_ids.shape
+        if past_key_values is not None and past_key_values.get_seq_length() > 0:
+            past = []
+            for layer in past_key_values.layers:
+                past += [layer.keys, layer.values]
+        else:
+            empty = torch.zeros(batch_size, self.num_heads, 0, self.head_dim)
+            past = [empty] * (len(self.input_names) - 3)
+        past_length = past[0].shape[2]
+        if attention_mask is None:
+            attention_mask = torch.ones(batch_size, past_length + new_tokens, dtype=torch.long)
+        if position_ids is None:
+            position_ids = torch.arange(past_length, past_length + new_tokens).expand(batch_size, new_tokens)
+
+        inputs = [input_ids, attention_mask, position_ids, *past]
+        feeds: Dict[str, Any] = {
+            name: tensor.detach().contiguous().numpy() for name, tensor in zip(self.input_names, inputs)
+        }
+        logits, *presents = self.session.run(None, feeds)
+        presents = [torch.from_numpy(present) for present in presents]
+        cache = DynamicCache(
+            ddp_cache_data=[(presents[i], presents[i + 1]) for i in range(0, len(presents), 2)],
+            config=self.config
+        )
+        return CausalLMOutputWithPast(logits=torch.from_numpy(logits), past_key_values=cache)
+
+
+def load_onnx_model(
+    model_name: str,
+    cache_dir: str,
+    precision: Precision = "fp32",
+    num_threads: Optional[int] = None,
+    model: Optional[PreTrainedModel] = None
+) -> OnnxCausalLM:
+    """
+    Load a causal LM for ONNX Runtime, exporting it on first use.
+
+    Args:
+        model_name: Hub name or local path of the model
+        cache_dir: Directory exported graphs are cached in
+        precision: ``fp32`` or ``int8``; ``bf16`` runs in fp32, since ORT has
+            no fast bf16 kernels on CPU
+        num_threads: Intra-op threads for ORT; torch's thread count by default
+        model: Already loaded fp32 torch model to export, instead of loading it
+
+    Returns:
+        The model, ready for ``generate``
+
+    Raises:
+        RuntimeError: If onnxruntime is not installed
+    """
+    require_onnxruntime()
+    if precision == "bf16":
+        logger.warning("bf16 is not supported by the onnxruntime runtime; running in fp32")
+        precision = "fp32"
+
+    config = AutoConfig.from_pretrained(model_name)
+    path = export_cache_path(cache_dir, model_name, config, precision)
+    if path.exists():
+        logger.info(f"Loading exported ONNX graph from {path}")
+        try:
+            generation_config = GenerationConfig.from_pretrained(model_name)
+        except OSError:
+            generation_config = GenerationConfig.from_model_config(config)
+    else:
+        logger.info(f"Exporting {model_name} to {path}")
+        if model is None:
+            model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+        export_onnx(model.eval(), path, precision)
+        generation_config = model.generation_config
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = num_threads or torch.get_num_threads()
+    session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    onnx_model = OnnxCausalLM(config, session, path=path).eval()
+    onnx_model.generation_config = generation_config
+    return onnx_model
+
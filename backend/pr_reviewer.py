@@ -1,14 +1,47 @@
 from typing import List, Dict, Optional
 
+from .generation_control import GenerationOptions
+
+# Instructions shared by every review prompt. They come before the diff, so the
+# model keeps their key/value state and only prefills the diff of each review.
+REVIEW_PREAMBLE = """Please review the following code changes and provide:
+1. Potential issues or bugs
+2. Code style improvements
+3. Performance considerations
+4. Security concerns
+5. Suggested improvements
+
+Format your response as:
+ISSUES:
+- [List any potential issues found]
+
+STYLE:
+- [List style improvements]
+
+PERFORMANCE:
+- [List performance considerations]
+
+SECURITY:
+- [List security concerns]
+
+SUGGESTIONS:
+- [List specific improvement suggestions]
+
+Changes to review:
+"""
+
 class PRReviewer:
     def __init__(self, llm_manager):
         """
         Initializes the PRReviewer with a language model manager.
 
+        The review instructions are registered as a shared prompt prefix with the manager.
+
         Args:
         	llm_manager: An object responsible for managing interactions with a large language model.
         """
         self.llm_manager = llm_manager
+        self.llm_manager.register_prefix(REVIEW_PREAMBLE)
 
     async def review_changes(self, diff_content: str) -> Dict:
         """
@@ -28,48 +61,24 @@ class PRReviewer:
         # Get review comments from LLM
         review_response = await self.llm_manager.generate_response(
             prompt,
-            max_length=1000,
-            temperature=0.7
+            options=GenerationOptions(max_new_tokens=1000)
         )
 
-        return self._parse_review_response(review_response)
+        return self._parse_review_response(review_response.content)
 
     def _prepare_review_prompt(self, diff_content: str) -> str:
         """
         Constructs a detailed prompt instructing the LLM to review code changes for issues, style, performance, security, and suggestions.
 
+        The prompt is the shared review preamble followed by the diff.
+
         Args:
             diff_content: The git diff string representing code changes to be reviewed.
 
         Returns:
             A formatted prompt string for the LLM to analyze and respond with categorized feedback.
         """
-        return f"""Please review the following code changes and provide:
-1. Potential issues or bugs
-2. Code style improvements
-3. Performance considerations
-4. Security concerns
-5. Suggested improvements
-
-Changes to review:
-{diff_content}
-
-Format your response as:
-ISSUES:
-- [List any potential issues found]
-
-STYLE:
-- [List style improvements]
-
-PERFORMANCE:
-- [List performance considerations]
-
-SECURITY:
-- [List security concerns]
-
-SUGGESTIONS:
-- [List specific improvement suggestions]
-"""
+        return REVIEW_PREAMBLE + diff_content
 
     def _parse_review_response(self, response: str) -> Dict:
         """
@@ -131,8 +140,7 @@ Provide specific, actionable suggestions."""
 
         suggestions = await self.llm_manager.generate_response(
             prompt,
-            max_length=800,
-            temperature=0.7
+            options=GenerationOptions(max_new_tokens=800)
         )
 
-        return {'suggestions': suggestions.split('\n')} 
+        return {'suggestions': suggestions.content.split('\n')} 
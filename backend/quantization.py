@@ -0,0 +1,71 @@
+"""
+Inference precision modes for AMEGA-AI
+
+This module applies the precision configured for a deployment when the model is
+loaded: full fp32, bfloat16 weights and activations, or dynamic int8
+quantization of the linear layers for CPU inference.
+"""
+import logging
+from typing import Literal
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+Precision = Literal["fp32", "bf16", "int8"]
+
+
+def load_dtype(precision: Precision) -> torch.dtype:
+    """Return the dtype the weights should be loaded in for ``precision``."""
+    return torch.bfloat16 if precision == "bf16" else torch.float32
+
+
+def conv1d_to_linear(model: nn.Module) -> int:
+    """
+    Replace transformers ``Conv1D`` layers with equivalent ``nn.Linear`` layers.
+
+    GPT-2 style models (including DialoGPT) implement their projections as
+    ``Conv1D``, which dynamic quantization does not recognise. ``Conv1D`` stores
+    its weight transposed relative to ``nn.Linear``.
+
+    Returns:
+        Number of layers replaced
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    replaced = 0
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if not isinstance(child, Conv1D):
+                continue
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features, dtype=child.weight.dtype)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                linear.bias.copy_(child.bias)
+            setattr(parent, name, linear)
+            replaced += 1
+    return replaced
+
+
+def apply_precision(model: nn.Module, precision: Precision, device: str = "cpu") -> nn.Module:
+    """
+    Apply post-load precision changes to a model.
+
+    ``fp32`` and ``bf16`` are handled by the load dtype; ``int8`` converts the
+    linear layers to dynamically quantized int8 kernels.
+
+    Raises:
+        ValueError: If int8 is requested for a non-CPU device
+    """
+    if precision != "int8":
+        return model
+    if device != "cpu":
+        raise ValueError("Dynamic int8 quantization is only supported on CPU")
+
+    from torch.ao.quantization import quantize_dynamic
+
+    replaced = conv1d_to_linear(model)
+    logger.info(f"Quantizing linear layers to int8 ({replaced} Conv1D layers converted)")
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
@@ -2,19 +2,144 @@
 Rate limiting module for AMEGA-AI
 
 This module implements rate limiting using Redis as a backend for request tracking
-and window management.
+and window management. Each check is a single atomic Lua script run over an
+async connection pool, so it neither blocks the event loop nor can leave a
+counter without its expiry.
+
+Each tier picks its algorithm: a fixed window, a sliding window counter, or
+GCRA (a token bucket with a burst size). The last two do not let a client
+through twice as fast at a window boundary, and keep one small value per
+client.
 """
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Tuple
-import redis
+from typing import Dict, List, Literal, Optional, Tuple
 from fastapi import HTTPException, Request, status
 from pydantic import BaseModel
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Count one request in a fixed window. The expiry is set in the same atomic
+# step as the increment, so a counter can never outlive its window.
+# Returns the request count and the requests remaining.
+FIXED_WINDOW_SCRIPT = """
+local current = redis.call('INCR', KEYS[1])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return {current, math.max(0, tonumber(ARGV[1]) - current)}
+"""
+
+# Sliding window counter: the previous window's count, weighted by how much of
+# it still overlaps the sliding window, plus the current window's count. The
+# value is "<window index>:<previous count>:<current count>". Rejected
+# requests are not counted.
+# ARGV: limit, window (ms), now (ms). Returns limited, remaining, reset (ms).
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local index = math.floor(now / window)
+local previous, current = 0, 0
+local state = redis.call('GET', KEYS[1])
+if state then
+    local stored, stored_previous, stored_current = string.match(state, '(%d+):(%d+):(%d+)')
+    stored = tonumber(stored)
+    if stored == index then
+        previous, current = tonumber(stored_previous), tonumber(stored_current)
+    elseif stored == index - 1 then
+        previous = tonumber(stored_current)
+    end
+end
+local elapsed = (now - index * window) / window
+local estimate = previous * (1 - elapsed) + current
+local reset = (index + 1) * window
+if estimate + 1 > limit then
+    return {1, 0, reset}
+end
+current = current + 1
+redis.call('SET', KEYS[1], index .. ':' .. previous .. ':' .. current, 'PX', 2 * window)
+return {0, math.floor(limit - estimate - 1), reset}
+"""
+
+# GCRA: the value is the theoretical arrival time (TAT) at which the client's
+# bucket would be full again. Each request moves it one emission interval
+# later, and a request is allowed while the TAT is at most ``burst - 1``
+# intervals ahead of now. Rejected requests do not move it.
+# ARGV: limit, window (ms), now (ms), burst. Returns limited, remaining, reset (ms).
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[2]) / tonumber(ARGV[1])
+local now = tonumber(ARGV[3])
+local tolerance = (tonumber(ARGV[4]) - 1) * interval
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+if tat - now > tolerance then
+    return {1, 0, math.ceil(tat - tolerance)}
+end
+tat = tat + interval
+redis.call('SET', KEYS[1], string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+return {0, math.floor((tolerance + interval - (tat - now)) / interval), math.ceil(tat)}
+"""
+
+# Add a process's unsynced requests to a window counter and return the
+# counter's total across all processes.
+# ARGV: requests to add, expiry (s).
+SYNC_COUNTER_SCRIPT = """
+local total = redis.call('INCRBY', KEYS[1], ARGV[1])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return total
+"""
+
+# Reserve tokens in every quota window if all of them have room, then report
+# each window's remaining tokens. Debiting a negative amount returns unused
+# reserved tokens.
+# ARGV: tokens, then a limit and an expiry (s) per key, and whether to check
+# the limits. Returns granted (1/0) followed by each window's remaining tokens.
+TOKEN_QUOTA_SCRIPT = """
+local amount = tonumber(ARGV[1])
+local check = ARGV[#ARGV] == '1'
+local granted = 1
+if check then
+    for i, key in ipairs(KEYS) do
+        local used = tonumber(redis.call('GET', key)) or 0
+        if used + amount > tonumber(ARGV[2 * i]) then
+            granted = 0
+        end
+    end
+end
+local result = {granted}
+for i, key in ipairs(KEYS) do
+    local used
+    if granted == 1 then
+        used = redis.call('INCRBY', key, amount)
+        if redis.call('TTL', key) < 0 then
+            redis.call('EXPIRE', key, ARGV[2 * i + 1])
+        end
+    else
+        used = tonumber(redis.call('GET', key)) or 0
+    end
+    result[i + 1] = math.max(0, tonumber(ARGV[2 * i]) - used)
+end
+return result
+"""
+
+Algorithm = Literal["fixed_window", "sliding_window", "gcra"]
 
 class RateLimitConfig(BaseModel):
     """Rate limit configuration."""
     requests: int
     window_seconds: int
     tier: str = "default"
+    algorithm: Algorithm = "fixed_window"
+    # Requests a GCRA client may make at once; defaults to ``requests``
+    burst: Optional[int] = None
 
 class RateLimiter:
     """Redis-based rate limiter."""
@@ -22,20 +147,52 @@ class RateLimiter:
     def __init__(
         self,
         redis_url: str = "redis://localhost:6379",
-        default_limits: Optional[dict] = None
+        default_limits: Optional[dict] = None,
+        max_connections: int = 50
     ):
-        """Initialize rate limiter with Redis connection."""
-        self.redis = redis.from_url(redis_url)
+        """
+        Initialize rate limiter with a pooled async Redis connection.
+
+        Args:
+            redis_url: Redis connection URL
+            default_limits: Rate limit configuration per tier
+            max_connections: Size of the Redis connection pool
+        """
+        self.redis = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(redis_url, max_connections=max_connections)
+        )
+        # Run by EVALSHA, loading the script on first use
+        self._fixed_window = self.redis.register_script(FIXED_WINDOW_SCRIPT)
+        self._scripts = {
+            "sliding_window": self.redis.register_script(SLIDING_WINDOW_SCRIPT),
+            "gcra": self.redis.register_script(GCRA_SCRIPT),
+        }
         self.default_limits = default_limits or {
             "default": RateLimitConfig(requests=100, window_seconds=60),  # 100 requests per minute
             "authenticated": RateLimitConfig(requests=1000, window_seconds=60),  # 1000 requests per minute
             "chat": RateLimitConfig(requests=50, window_seconds=60),  # 50 chat requests per minute
         }
 
+    def _get_config(self, tier: str) -> Tuple[str, RateLimitConfig]:
+        """Return the tier to apply and its configuration, falling back to the default tier."""
+        config = self.default_limits.get(tier)
+        if not config:
+            tier = "default"
+            config = self.default_limits[tier]
+        return tier, config
+
     def _get_window_key(self, identifier: str, window_start: int) -> str:
         """Generate Redis key for the rate limit window."""
         return f"rate_limit:{identifier}:{window_start}"
 
+    def _get_key(self, identifier: str, tier: str, algorithm: Algorithm) -> str:
+        """Generate the Redis key holding a client's state for a tier."""
+        return f"rate_limit:{algorithm}:{tier}:{identifier}"
+
+    def _now(self) -> float:
+        """Current time in seconds."""
+        return time.time()
+
     def _get_window_start(self, window_seconds: int) -> int:
         """Get the start timestamp of the current window."""
         now = int(datetime.utcnow().timestamp())
@@ -56,21 +213,32 @@ class RateLimiter:
         Returns:
             Tuple of (is_limited, limit_info)
         """
-        config = self.default_limits.get(tier)
-        if not config:
-            config = self.default_limits["default"]
-
-        window_start = self._get_window_start(config.window_seconds)
-        key = self._get_window_key(identifier, window_start)
+        tier, config = self._get_config(tier)
+        if config.algorithm == "fixed_window":
+            window_start = self._get_window_start(config.window_seconds)
+            key = self._get_window_key(identifier, window_start)
 
-        # Increment request count and set expiry
-        current = self.redis.incr(key)
-        if current == 1:
-            self.redis.expire(key, config.window_seconds)
+            current, remaining = await self._fixed_window(
+                keys=[key],
+                args=[config.requests, config.window_seconds],
+                client=self.redis
+            )
 
-        is_limited = current > config.requests
-        remaining = max(0, config.requests - current)
-        reset_time = window_start + config.window_seconds
+            is_limited = current > config.requests
+            reset_time = window_start + config.window_seconds
+        else:
+            limited, remaining, reset_ms = await self._scripts[config.algorithm](
+                keys=[self._get_key(identifier, tier, config.algorithm)],
+                args=[
+                    config.requests,
+                    config.window_seconds * 1000,
+                    int(self._now() * 1000),
+                    config.burst or config.requests
+                ],
+                client=self.redis
+            )
+            is_limited = bool(limited)
+            reset_time = math.ceil(reset_ms / 1000)
 
         limit_info = {
             "limit": config.requests,
@@ -81,6 +249,332 @@ class RateLimiter:
 
         return is_limited, limit_info
 
+    async def close(self) -> None:
+        """Close the Redis connection pool."""
+        await self.redis.aclose()
+
+@dataclass
+class _WindowCounter:
+    """A process's view of one Redis window counter."""
+    # Total across all processes as of the last sync
+    synced: int = 0
+    # Requests this process counted since the last sync
+    pending: int = 0
+    expires_at: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.synced + self.pending
+
+class HybridRateLimiter(RateLimiter):
+    """
+    Rate limiter that decides locally and syncs its counters with Redis in batches.
+
+    Each process counts requests in memory and adds its counts to the shared
+    Redis window counters in the background, one pipelined round trip per sync,
+    learning the other processes' counts in return. Until the next sync a
+    process can let through up to ``sync_tolerance`` of a tier's limit per
+    client more than the shared limit. If Redis is unreachable, the limits are
+    enforced per process from the last known counts.
+
+    Fixed and sliding windows are counted this way. GCRA tiers keep their state
+    in Redis, since a bucket cannot be split into counts, and fall back to a
+    per-process bucket while Redis is unreachable.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379",
+        default_limits: Optional[dict] = None,
+        max_connections: int = 50,
+        sync_interval_seconds: float = 1.0,
+        sync_tolerance: float = 0.1
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            redis_url: Redis connection URL
+            default_limits: Rate limit configuration per tier
+            max_connections: Size of the Redis connection pool
+            sync_interval_seconds: Longest time counts stay unsynced
+            sync_tolerance: Fraction of a tier's limit a process may count per
+                client before it syncs early
+        """
+        super().__init__(redis_url, default_limits, max_connections)
+        self.sync_interval_seconds = sync_interval_seconds
+        self.sync_tolerance = sync_tolerance
+        self._sync_counter = self.redis.register_script(SYNC_COUNTER_SCRIPT)
+        self._counters: Dict[str, _WindowCounter] = {}
+        # Theoretical arrival times of GCRA clients while Redis is unreachable
+        self._local_tats: Dict[str, float] = {}
+        self._sync_needed = asyncio.Event()
+        self._sync_task: Optional[asyncio.Task] = None
+        self.degraded = False
+        self._syncs = 0
+        self._sync_errors = 0
+
+    async def is_rate_limited(
+        self,
+        identifier: str,
+        tier: str = "default"
+    ) -> Tuple[bool, dict]:
+        """
+        Check if the request should be rate limited, without waiting for Redis.
+
+        Args:
+            identifier: Unique identifier for the client (IP or user ID)
+            tier: Rate limit tier to apply
+
+        Returns:
+            Tuple of (is_limited, limit_info)
+        """
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+        tier, config = self._get_config(tier)
+        if config.algorithm == "gcra":
+            return await self._check_gcra(identifier, tier, config)
+
+        now = self._now()
+        window = config.window_seconds
+        index = int(now // window)
+        if config.algorithm == "fixed_window":
+            current = self._counter(self._get_window_key(identifier, index * window), now, window)
+            count = current.total
+        else:
+            key = self._get_key(identifier, tier, config.algorithm)
+            current = self._counter(f"{key}:{index}", now, 2 * window)
+            previous = self._counters.get(f"{key}:{index - 1}")
+            elapsed = (now - index * window) / window
+            count = (previous.total * (1 - elapsed) if previous else 0) + current.total
+
+        is_limited = count + 1 > config.requests
+        if not is_limited:
+            current.pending += 1
+            if current.pending >= max(1, int(config.requests * self.sync_tolerance)):
+                self._sync_needed.set()
+
+        limit_info = {
+            "limit": config.requests,
+            "remaining": max(0, math.floor(config.requests - count - (0 if is_limited else 1))),
+            "reset": (index + 1) * window,
+            "tier": tier
+        }
+        return is_limited, limit_info
+
+    def _counter(self, key: str, now: float, ttl: int) -> _WindowCounter:
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = _WindowCounter(expires_at=now + ttl)
+        return counter
+
+    async def _check_gcra(self, identifier: str, tier: str, config: RateLimitConfig) -> Tuple[bool, dict]:
+        key = self._get_key(identifier, tier, config.algorithm)
+        if not self.degraded:
+            try:
+                return await super().is_rate_limited(identifier, tier)
+            except (RedisError, OSError) as e:
+                self._mark_degraded(e)
+
+        # The same algorithm as GCRA_SCRIPT, for this process only
+        now = self._now()
+        interval = config.window_seconds / config.requests
+        tolerance = ((config.burst or config.requests) - 1) * interval
+        tat = max(self._local_tats.get(key, now), now)
+        is_limited = tat - now > tolerance
+        if is_limited:
+            remaining, reset = 0, tat - tolerance
+        else:
+            tat += interval
+            self._local_tats[key] = tat
+            remaining, reset = math.floor((tolerance + interval - (tat - now)) / interval), tat
+        return is_limited, {
+            "limit": config.requests,
+            "remaining": remaining,
+            "reset": math.ceil(reset),
+            "tier": tier
+        }
+
+    def _mark_degraded(self, error: Exception) -> None:
+        self._sync_errors += 1
+        if not self.degraded:
+            logger.warning(f"Redis unreachable, enforcing rate limits per process: {error}")
+        self.degraded = True
+
+    async def _sync_loop(self) -> None:
+        """Sync counters every interval, or sooner when a client nears its tolerance."""
+        while True:
+            try:
+                await asyncio.wait_for(self._sync_needed.wait(), self.sync_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._sync_needed.clear()
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Rate limit counter sync failed")
+
+    async def sync(self) -> None:
+        """Add unsynced counts to Redis and learn the totals, in one round trip."""
+        now = self._now()
+        for key in [key for key, counter in self._counters.items() if counter.expires_at <= now]:
+            del self._counters[key]
+        self._local_tats = {key: tat for key, tat in self._local_tats.items() if tat > now}
+
+        batch = [(key, counter, counter.pending) for key, counter in self._counters.items() if counter.pending]
+        if not batch and not self.degraded:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, counter, pending in batch:
+                    ttl = max(1, math.ceil(counter.expires_at - now))
+                    await self._sync_counter(keys=[key], args=[pending, ttl], client=pipe)
+                # With nothing to sync, check whether Redis is back
+                if not batch:
+                    pipe.ping()
+                totals = await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._mark_degraded(e)
+            return
+
+        for (key, counter, pending), total in zip(batch, totals):
+            # Requests counted while the sync was in flight stay pending
+            counter.pending -= pending
+            counter.synced = int(total)
+        self._syncs += 1
+        if self.degraded:
+            logger.info("Redis reachable again, rate limits are shared across processes")
+        self.degraded = False
+
+    def stats(self) -> dict:
+        """Return sync counts and whether limits are currently per process."""
+        return {
+            "counters": len(self._counters),
+            "pending": sum(counter.pending for counter in self._counters.values()),
+            "syncs": self._syncs,
+            "sync_errors": self._sync_errors,
+            "degraded": self.degraded
+        }
+
+    async def close(self) -> None:
+        """Sync the remaining counts and close the Redis connection pool."""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        await self.sync()
+        await super().close()
+
+@dataclass
+class TokenReservation:
+    """Tokens held from a client's quota for one request."""
+    keys: List[str]
+    tokens: int
+    granted: bool
+    # Per window name: its limit, remaining tokens and reset time
+    windows: Dict[str, dict] = field(default_factory=dict)
+
+class TokenQuota:
+    """
+    Per-client budgets of prompt and generated tokens over fixed windows.
+
+    A request reserves its worst case (prompt plus requested max tokens) from
+    every window before generating, so concurrent requests cannot overdraw a
+    budget, and is settled with the tokens it actually used afterwards. While
+    Redis is unreachable, requests are let through without a reservation.
+    """
+
+    WINDOWS = {"minute": 60, "day": 86400}
+
+    def __init__(self, redis, tokens_per_minute: int = 0, tokens_per_day: int = 0):
+        """
+        Initialize the quota.
+
+        Args:
+            redis: Async Redis client holding the counters
+            tokens_per_minute: Tokens a client may use per minute; 0 for no limit
+            tokens_per_day: Tokens a client may use per day; 0 for no limit
+        """
+        self.redis = redis
+        limits = {"minute": tokens_per_minute, "day": tokens_per_day}
+        self.limits = {name: limit for name, limit in limits.items() if limit}
+        self._script = redis.register_script(TOKEN_QUOTA_SCRIPT)
+
+    def _now(self) -> float:
+        """Current time in seconds."""
+        return time.time()
+
+    async def _run(self, keys: List[str], tokens: int, check: bool) -> List[int]:
+        args = [tokens]
+        for name in self.limits:
+            args += [self.limits[name], self.WINDOWS[name]]
+        args.append(1 if check else 0)
+        return await self._script(keys=keys, args=args, client=self.redis)
+
+    def _windows(self, remaining: List[int], now: float) -> Dict[str, dict]:
+        return {
+            name: {
+                "limit": self.limits[name],
+                "remaining": left,
+                "reset": int(now // self.WINDOWS[name] + 1) * self.WINDOWS[name]
+            }
+            for name, left in zip(self.limits, remaining)
+        }
+
+    async def reserve(self, identifier: str, tokens: int) -> TokenReservation:
+        """
+        Reserve ``tokens`` from every window, or nothing if any lacks room.
+
+        A reservation larger than the smallest budget is capped to it, so a
+        single request can always run when the client has not used its quota.
+        """
+        now = self._now()
+        if self.limits:
+            tokens = min(tokens, min(self.limits.values()))
+        keys = [
+            f"token_quota:{identifier}:{name}:{int(now // self.WINDOWS[name])}"
+            for name in self.limits
+        ]
+        if not keys:
+            return TokenReservation(keys=[], tokens=0, granted=True)
+        try:
+            granted, *remaining = await self._run(keys, tokens, check=True)
+        except (RedisError, OSError) as e:
+            # Fail open: an unreachable Redis must not take chat down with it
+            logger.warning(f"Redis unreachable, token quota not enforced: {e}")
+            return TokenReservation(keys=[], tokens=0, granted=True)
+        return TokenReservation(
+            keys=keys,
+            tokens=tokens if granted else 0,
+            granted=bool(granted),
+            windows=self._windows(remaining, now)
+        )
+
+    async def settle(self, reservation: TokenReservation, tokens: int) -> TokenReservation:
+        """Debit the tokens a request actually used in place of its reservation."""
+        if not reservation.granted or not reservation.keys:
+            return reservation
+        try:
+            _, *remaining = await self._run(reservation.keys, tokens - reservation.tokens, check=False)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Redis unreachable, token quota not settled: {e}")
+            return reservation
+        reservation.tokens = tokens
+        # The request is debited in the windows it reserved from
+        for window, left in zip(reservation.windows.values(), remaining):
+            window["remaining"] = left
+        return reservation
+
+    @staticmethod
+    def headers(reservation: TokenReservation) -> Dict[str, str]:
+        """Return the ``X-TokenLimit-*`` response headers of a reservation."""
+        headers = {}
+        for name, window in reservation.windows.items():
+            suffix = name.capitalize()
+            headers[f"X-TokenLimit-Limit-{suffix}"] = str(window["limit"])
+            headers[f"X-TokenLimit-Remaining-{suffix}"] = str(window["remaining"])
+            headers[f"X-TokenLimit-Reset-{suffix}"] = str(window["reset"])
+        return headers
+
 def rate_limit_dependency(tier: str = "default"):
     """
     FastAPI dependency for rate limiting.
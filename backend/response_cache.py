@@ -0,0 +1,172 @@
+"""
+Response caching for AMEGA-AI
+
+This module caches generated responses keyed by the normalized prompt, the model
+name and the full set of generation parameters. Lookups go to a bounded
+in-process LRU first and then to Redis, so identical prompts are answered
+without running the model again, across all API replicas.
+"""
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from .config import LLMConfig
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+
+def is_deterministic(config: LLMConfig) -> bool:
+    """Return True if the configuration produces greedy, repeatable output."""
+    return config.temperature == 0
+
+
+def make_cache_key(
+    prompt: str,
+    model_name: str,
+    config: LLMConfig,
+    stop: Sequence[str] = ()
+) -> str:
+    """Build a cache key from the prompt, model, generation parameters and stop sequences."""
+    params = config.model_dump(mode="json")
+    if stop:
+        params["stop"] = list(stop)
+    payload = json.dumps(
+        {
+            "prompt": normalize_prompt(prompt),
+            "model": model_name,
+            "params": params
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (in-process LRU + Redis) cache of generated responses."""
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        max_entries: int = 1024,
+        ttl_seconds: int = 300,
+        cache_sampled: bool = False,
+        namespace: str = "response_cache"
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            redis_url: Redis connection URL for the shared tier; local only if None
+            max_entries: Maximum number of responses kept in process
+            ttl_seconds: Time after which cached responses expire in both tiers
+            cache_sampled: Also cache responses generated with sampling by default
+            namespace: Prefix for Redis keys
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_sampled = cache_sampled
+        self.namespace = namespace
+        self.redis = aioredis.from_url(redis_url) if redis_url else None
+
+        self._local: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._local_hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._redis_errors = 0
+
+    def should_cache(self, config: LLMConfig, cache_sampled: Optional[bool] = None) -> bool:
+        """
+        Decide whether responses for ``config`` may be cached.
+
+        Greedy generations are always cacheable. Sampled ones are only cached when
+        the caller opts in, since a cached answer removes their variety.
+        """
+        if is_deterministic(config):
+            return True
+        return self.cache_sampled if cache_sampled is None else cache_sampled
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str) -> None:
+        self._local[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return a cached response, checking the local tier before Redis."""
+        value = self._get_local(key)
+        if value is not None:
+            self._local_hits += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._redis_key(key))
+            except (RedisError, OSError) as e:
+                self._redis_errors += 1
+                logger.warning(f"Response cache lookup failed: {str(e)}")
+                raw = None
+            if raw is not None:
+                value = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+                self._set_local(key, value)
+                self._redis_hits += 1
+                return value
+
+        self._misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        """Store a response in both tiers."""
+        self._set_local(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._redis_key(key), value, ex=self.ttl_seconds)
+            except (RedisError, OSError) as e:
+                self._redis_errors += 1
+                logger.warning(f"Response cache store failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and occupancy."""
+        lookups = self._local_hits + self._redis_hits + self._misses
+        hits = self._local_hits + self._redis_hits
+        return {
+            "entries": len(self._local),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "local_hits": self._local_hits,
+            "redis_hits": self._redis_hits,
+            "misses": self._misses,
+            "redis_errors": self._redis_errors,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+    async def close(self) -> None:
+        """Close the Redis connection pool."""
+        if self.redis is not None:
+            await self.redis.aclose()
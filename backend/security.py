@@ -8,7 +8,7 @@ from typing import List, Optional, Callable
 from fastapi import Request, Response, HTTPException, status, Depends
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.types import ASGIApp
-from .auth import get_current_user, User
+from .auth import get_current_user, get_request_user, User
 
 # Role hierarchy definition
 ROLE_HIERARCHY = {
@@ -84,7 +84,8 @@ class RBACMiddleware(BaseHTTPMiddleware):
             "/docs",
             "/redoc",
             "/openapi.json",
-            "/health"
+            "/health",
+            "/ready"
         }
 
     def _is_public_endpoint(self, path: str) -> bool:
@@ -128,7 +129,7 @@ class RBACMiddleware(BaseHTTPMiddleware):
 
 def requires_roles(roles: List[str]) -> Callable:
     """Dependency for role-based access control."""
-    async def role_checker(user: User = Depends(get_current_user)) -> User:
+    async def role_checker(user: User = Depends(get_request_user)) -> User:
         if not any(check_role_access(user.role, role) for role in roles):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,181 @@
+"""
+Conversation session store for AMEGA-AI
+
+This module keeps the message history of each (user, conversation) pair. Sessions
+are spread over independently locked shards to avoid contention, each session is
+a sliding window bounded by a token budget, idle sessions expire, and the total
+number of resident messages across all sessions has a hard cap.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+SessionKey = Tuple[str, str]
+
+
+def approximate_token_count(text: str) -> int:
+    """Cheap token estimate used when no tokenizer is supplied."""
+    return max(1, len(text.split()))
+
+
+@dataclass
+class _Session:
+    """Messages of one conversation with their token counts."""
+    messages: Deque[Tuple[Any, int]] = field(default_factory=deque)
+    token_count: int = 0
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class _Shard:
+    """A lock and the sessions that hash to it, in least recently used order."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[SessionKey, _Session]" = OrderedDict()
+
+
+class SessionStore:
+    """Sharded, bounded store of per-user conversation histories."""
+
+    def __init__(
+        self,
+        num_shards: int = 16,
+        max_tokens_per_session: int = 1024,
+        ttl_seconds: float = 1800,
+        max_total_messages: int = 100_000,
+        token_counter: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            num_shards: Number of independently locked shards
+            max_tokens_per_session: Token budget of each session's sliding window
+            ttl_seconds: Idle time after which a session is evicted
+            max_total_messages: Hard cap on messages resident across all sessions
+            token_counter: Function returning the token count of a message text
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.max_tokens_per_session = max_tokens_per_session
+        self.ttl_seconds = ttl_seconds
+        self.max_total_messages = max_total_messages
+        self.token_counter = token_counter or approximate_token_count
+
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self._total_messages = 0
+        self._total_lock = threading.Lock()
+        self._expired = 0
+        self._evicted_for_cap = 0
+
+    def _shard_for(self, key: SessionKey) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _adjust_total(self, delta: int) -> int:
+        with self._total_lock:
+            self._total_messages += delta
+            return self._total_messages
+
+    def _expire_locked(self, shard: _Shard, now: float) -> None:
+        """Drop idle sessions from the front of a shard; caller holds its lock."""
+        removed = 0
+        while shard.sessions:
+            key, session = next(iter(shard.sessions.items()))
+            if now - session.last_access < self.ttl_seconds:
+                break
+            del shard.sessions[key]
+            removed += len(session.messages)
+            self._expired += 1
+        if removed:
+            self._adjust_total(-removed)
+
+    def append(self, user_id: str, conversation_id: str, message: Any) -> None:
+        """Add a message to a session, trimming its window to the token budget."""
+        key = (user_id, conversation_id)
+        tokens = self.token_counter(message.content)
+        now = time.monotonic()
+        shard = self._shard_for(key)
+
+        with shard.lock:
+            self._expire_locked(shard, now)
+            session = shard.sessions.get(key)
+            if session is None:
+                session = shard.sessions[key] = _Session()
+            shard.sessions.move_to_end(key)
+            session.last_access = now
+
+            session.messages.append((message, tokens))
+            session.token_count += tokens
+            removed = 0
+            # Slide the window, but always keep the newest message
+            while session.token_count > self.max_tokens_per_session and len(session.messages) > 1:
+                _, old_tokens = session.messages.popleft()
+                session.token_count -= old_tokens
+                removed += 1
+
+        total = self._adjust_total(1 - removed)
+        if total > self.max_total_messages:
+            self._enforce_total_cap(key)
+
+    def _enforce_total_cap(self, protected: SessionKey) -> None:
+        """Evict least recently used sessions until the global cap holds.
+
+        Other shards are visited before the one just written to, and the session
+        that triggered the eviction is never evicted itself.
+        """
+        start_index = self._shards.index(self._shard_for(protected))
+        for offset in range(1, len(self._shards) + 1):
+            shard = self._shards[(start_index + offset) % len(self._shards)]
+            while self._total_messages > self.max_total_messages:
+                with shard.lock:
+                    victim = next((key for key in shard.sessions if key != protected), None)
+                    if victim is None:
+                        break
+                    session = shard.sessions.pop(victim)
+                self._adjust_total(-len(session.messages))
+                self._evicted_for_cap += 1
+            if self._total_messages <= self.max_total_messages:
+                return
+
+    def get_history(self, user_id: str, conversation_id: str) -> List[Any]:
+        """Return the messages currently in a session's window, oldest first."""
+        key = (user_id, conversation_id)
+        now = time.monotonic()
+        shard = self._shard_for(key)
+        with shard.lock:
+            self._expire_locked(shard, now)
+            session = shard.sessions.get(key)
+            if session is None:
+                return []
+            shard.sessions.move_to_end(key)
+            session.last_access = now
+            return [message for message, _ in session.messages]
+
+    def clear(self, user_id: str, conversation_id: str) -> None:
+        """Delete a session."""
+        key = (user_id, conversation_id)
+        shard = self._shard_for(key)
+        with shard.lock:
+            session = shard.sessions.pop(key, None)
+        if session is not None:
+            self._adjust_total(-len(session.messages))
+
+    def evict_expired(self) -> None:
+        """Sweep every shard for idle sessions."""
+        now = time.monotonic()
+        for shard in self._shards:
+            with shard.lock:
+                self._expire_locked(shard, now)
+
+    def stats(self) -> Dict[str, int]:
+        """Return occupancy and eviction counters."""
+        return {
+            "sessions": sum(len(shard.sessions) for shard in self._shards),
+            "messages": self._total_messages,
+            "max_total_messages": self.max_total_messages,
+            "shards": len(self._shards),
+            "expired": self._expired,
+            "evicted_for_cap": self._evicted_for_cap
+        }
@@ -0,0 +1,90 @@
+"""
+Request coalescing for AMEGA-AI
+
+This module lets concurrent identical requests share one execution: the first
+caller for a key starts the work and later callers wait for its result instead
+of starting their own. Unlike the response cache nothing is kept once the work
+finishes, so only requests that are in flight at the same time are coalesced.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from .generation_control import CancellationToken, await_cancellable
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Flight:
+    """Shared execution for one key and the callers waiting for it."""
+    task: asyncio.Future
+    token: CancellationToken
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._started = 0
+        self._coalesced = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[CancellationToken], Awaitable[T]],
+        token: Optional[CancellationToken] = None
+    ) -> T:
+        """
+        Return the result of ``fn`` for ``key``, sharing it with concurrent callers.
+
+        ``fn`` receives the flight's own cancellation token, which is cancelled
+        only once every caller waiting for the flight has gone away. Each
+        caller's ``token`` bounds just its own wait.
+
+        Raises:
+            GenerationCancelled: If the caller's token fires before the result is ready
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight_token = CancellationToken()
+            flight = _Flight(task=asyncio.ensure_future(fn(flight_token)), token=flight_token)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self._started += 1
+        else:
+            self._coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await await_cancellable(asyncio.shield(flight.task), token)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to read the result: stop the work, and let
+                # new callers start a fresh flight
+                self._forget(key, flight)
+                flight.token.cancel("caller went away")
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        self._forget(key, flight)
+        # Mark the outcome as retrieved even if every caller left early
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many executions ran and how many calls joined one."""
+        return {
+            "in_flight": len(self._flights),
+            "started": self._started,
+            "coalesced": self._coalesced
+        }
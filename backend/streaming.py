@@ -0,0 +1,105 @@
+"""
+Token streaming for AMEGA-AI
+
+This module bridges ``model.generate`` running on a worker thread to async
+consumers on the event loop, and turns the stream of token ids into text deltas
+without re-decoding the whole sequence for every token.
+"""
+import asyncio
+from typing import List, Optional
+
+from transformers.generation.streamers import BaseStreamer
+
+# Marks the end of a token stream
+_END = None
+
+
+class IncrementalDecoder:
+    """
+    Decode a growing sequence of token ids into text deltas.
+
+    Only a small window of recent tokens is decoded on each step: the tokens
+    already emitted as text form a short prefix that gives the tokenizer enough
+    context (e.g. for leading spaces), and the new tokens after it are decoded
+    once. Deltas that end in an incomplete multi-byte character are held back
+    until the next token completes them.
+    """
+
+    def __init__(self, tokenizer, skip_special_tokens: bool = True):
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.token_ids: List[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def _decode(self, token_ids: List[int]) -> str:
+        return self.tokenizer.decode(
+            token_ids,
+            skip_special_tokens=self.skip_special_tokens,
+            clean_up_tokenization_spaces=False
+        )
+
+    def push(self, token_ids: List[int]) -> str:
+        """Add new token ids and return the text they complete, if any."""
+        self.token_ids.extend(token_ids)
+        prefix_text = self._decode(self.token_ids[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self.token_ids[self._prefix_offset:])
+
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            self._prefix_offset = self._read_offset
+            self._read_offset = len(self.token_ids)
+            return new_text[len(prefix_text):]
+        return ""
+
+    def flush(self) -> str:
+        """Return any text still held back at the end of the stream."""
+        prefix_text = self._decode(self.token_ids[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self.token_ids[self._prefix_offset:])
+        self._prefix_offset = self._read_offset = len(self.token_ids)
+        return new_text[len(prefix_text):]
+
+
+class AsyncTokenStreamer(BaseStreamer):
+    """
+    Streamer that hands generated token ids to an asyncio consumer.
+
+    ``generate`` calls ``put`` and ``end`` from the worker thread; the values are
+    forwarded to the event loop thread-safely and can be consumed with
+    ``async for``.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, skip_prompt: bool = True):
+        self.loop = loop
+        self.skip_prompt = skip_prompt
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._next_is_prompt = True
+        self._finished = False
+
+    def put(self, value) -> None:
+        """Receive a tensor of new token ids from ``generate``."""
+        if self._next_is_prompt:
+            self._next_is_prompt = False
+            if self.skip_prompt:
+                return
+        token_ids = value.reshape(-1).tolist()
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, token_ids)
+
+    def end(self) -> None:
+        """Signal that generation has finished."""
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, _END)
+
+    def close(self) -> None:
+        """End the stream from the event loop thread."""
+        self._queue.put_nowait(_END)
+
+    def __aiter__(self) -> "AsyncTokenStreamer":
+        return self
+
+    async def __anext__(self) -> List[int]:
+        if self._finished:
+            raise StopAsyncIteration
+        token_ids: Optional[List[int]] = await self._queue.get()
+        if token_ids is _END:
+            self._finished = True
+            raise StopAsyncIteration
+        return token_ids
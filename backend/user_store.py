@@ -0,0 +1,216 @@
+"""
+User storage for AMEGA-AI
+
+This module keeps registered users, either in a process-local dict (for
+development and tests) or in a database through async SQLAlchemy, so users
+survive restarts and are shared by all replicas. A read-through cache in front
+of the database keeps repeated lookups of the same users off the network.
+
+Users are exchanged as plain dicts with the fields of ``auth.UserInDB``.
+"""
+import bisect
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from .models import Base, UserRecord
+
+USER_FIELDS = ("username", "email", "full_name", "disabled", "role", "hashed_password")
+
+
+def async_database_url(url: str) -> str:
+    """Return ``url`` with the async driver SQLAlchemy needs for its database."""
+    for scheme, driver in (
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(scheme):
+            return driver + url[len(scheme):]
+    return url
+
+
+class UserRepository(ABC):
+    """Where users are stored."""
+
+    @abstractmethod
+    async def get(self, username: str) -> Optional[Dict[str, Any]]:
+        """Return a user, or None if there is no such user."""
+
+    @abstractmethod
+    async def add(self, user: Dict[str, Any]) -> bool:
+        """Store a new user; returns False if the username is taken."""
+
+    @abstractmethod
+    async def update(self, username: str, **changes: Any) -> bool:
+        """Change a user's fields; returns False if there is no such user."""
+
+    @abstractmethod
+    async def list(self, after: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` users ordered by username, starting after ``after``."""
+
+    async def close(self) -> None:
+        """Release the repository's connections."""
+
+
+class InMemoryUserRepository(UserRepository):
+    """Users in a dict of this process, keyed by username."""
+
+    def __init__(self, users: Dict[str, Dict[str, Any]]):
+        self.users = users
+
+    async def get(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.users.get(username)
+
+    async def add(self, user: Dict[str, Any]) -> bool:
+        if user["username"] in self.users:
+            return False
+        self.users[user["username"]] = user
+        return True
+
+    async def update(self, username: str, **changes: Any) -> bool:
+        if username not in self.users:
+            return False
+        self.users[username].update(changes)
+        return True
+
+    async def list(self, after: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        usernames = sorted(self.users)
+        start = bisect.bisect_right(usernames, after) if after is not None else 0
+        return [self.users[username] for username in usernames[start:start + limit]]
+
+
+class SQLUserRepository(UserRepository):
+    """Users in a database table, through an async SQLAlchemy engine."""
+
+    def __init__(self, database_url: str, pool_size: int = 5):
+        """
+        Initialize the repository.
+
+        Args:
+            database_url: SQLAlchemy URL; drivers are switched to their async
+                counterparts
+            pool_size: Connections kept open to the database
+        """
+        url = async_database_url(database_url)
+        options = {} if url.startswith("sqlite") else {"pool_size": pool_size, "pool_pre_ping": True}
+        self.engine: AsyncEngine = create_async_engine(url, **options)
+        self._sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def create_schema(self) -> None:
+        """Create the tables that do not exist yet."""
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    @staticmethod
+    def _to_dict(record: UserRecord) -> Dict[str, Any]:
+        return {field: getattr(record, field) for field in USER_FIELDS}
+
+    async def get(self, username: str) -> Optional[Dict[str, Any]]:
+        async with self._sessions() as session:
+            record = await session.scalar(select(UserRecord).where(UserRecord.username == username))
+            return self._to_dict(record) if record is not None else None
+
+    async def add(self, user: Dict[str, Any]) -> bool:
+        async with self._sessions() as session:
+            session.add(UserRecord(**{field: user[field] for field in USER_FIELDS if field in user}))
+            try:
+                await session.commit()
+            except IntegrityError:
+                return False
+            return True
+
+    async def update(self, username: str, **changes: Any) -> bool:
+        async with self._sessions() as session:
+            result = await session.execute(
+                update(UserRecord).where(UserRecord.username == username).values(**changes)
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def list(self, after: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        # Keyset pagination: the username index finds where the page starts,
+        # however deep it is
+        query = select(UserRecord).order_by(UserRecord.username).limit(limit)
+        if after is not None:
+            query = query.where(UserRecord.username > after)
+        async with self._sessions() as session:
+            return [self._to_dict(record) for record in await session.scalars(query)]
+
+    async def close(self) -> None:
+        await self.engine.dispose()
+
+
+class CachedUserRepository(UserRepository):
+    """
+    Read-through cache of another repository's users.
+
+    Users are cached for ``ttl_seconds`` after they are read. Changes made
+    through this cache invalidate the user at once; changes made by other
+    replicas are seen once the entry expires.
+    """
+
+    def __init__(self, repository: UserRepository, ttl_seconds: float = 30.0, max_entries: int = 10000):
+        """
+        Initialize the cache.
+
+        Args:
+            repository: Repository the users are read from and written to
+            ttl_seconds: How long a user is served from the cache
+            max_entries: Users kept in the cache; the least recently used are
+                evicted first
+        """
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._users: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    async def get(self, username: str) -> Optional[Dict[str, Any]]:
+        entry = self._users.get(username)
+        if entry is not None:
+            user, expires_at = entry
+            if expires_at > time.monotonic():
+                self._users.move_to_end(username)
+                self._hits += 1
+                return user
+            del self._users[username]
+
+        self._misses += 1
+        user = await self.repository.get(username)
+        if user is not None:
+            self._users[username] = (user, time.monotonic() + self.ttl_seconds)
+            self._users.move_to_end(username)
+            while len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, username: str) -> None:
+        """Forget a cached user."""
+        self._users.pop(username, None)
+
+    async def add(self, user: Dict[str, Any]) -> bool:
+        self.invalidate(user["username"])
+        return await self.repository.add(user)
+
+    async def update(self, username: str, **changes: Any) -> bool:
+        try:
+            return await self.repository.update(username, **changes)
+        finally:
+            self.invalidate(username)
+
+    async def list(self, after: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        return await self.repository.list(after, limit)
+
+    async def close(self) -> None:
+        await self.repository.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache's size and hit counts."""
+        return {"entries": len(self._users), "hits": self._hits, "misses": self._misses}
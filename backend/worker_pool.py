@@ -0,0 +1,526 @@
+"""
+Multi-process model workers for AMEGA-AI
+
+This module runs the local model in several worker processes, each pinned to
+its own slice of CPU cores with a matching torch thread count, so a large node's
+cores are used without every request contending for one interpreter. Requests
+are sent to the least-loaded worker over a pipe, and workers that crash or stop
+answering health checks are restarted.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from .config import LLMConfig
+from .generation_control import CancellationToken, GenerationCancelled, GenerationOptions, aclosing
+from .inference_pool import InferenceQueueFull
+from .llm_backends import BackendError, Messages
+from .quantization import Precision
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores() -> List[int]:
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_core_slices(
+    num_workers: int,
+    threads_per_worker: int = 0,
+    cores: Optional[Sequence[int]] = None
+) -> List[List[int]]:
+    """
+    Split the available cores into one contiguous slice per worker.
+
+    Args:
+        num_workers: Number of worker processes
+        threads_per_worker: Cores per worker; 0 divides the cores evenly
+        cores: Cores to divide; defaults to the ones this process may use
+
+    Returns:
+        The cores of each worker. Slices wrap around (and so overlap) when
+        ``num_workers * threads_per_worker`` exceeds the available cores.
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    if threads_per_worker <= 0:
+        threads_per_worker = max(1, len(cores) // num_workers)
+    slices = []
+    for index in range(num_workers):
+        start = index * threads_per_worker
+        worker_cores = [cores[(start + offset) % len(cores)] for offset in range(threads_per_worker)]
+        slices.append(list(dict.fromkeys(worker_cores)))
+    return slices
+
+
+def _encode_error(error: Exception) -> Dict[str, Any]:
+    """Turn a worker-side exception into a picklable description."""
+    if isinstance(error, InferenceQueueFull):
+        return {"type": "busy", "retry_after": error.retry_after}
+    if isinstance(error, GenerationCancelled):
+        return {"type": "cancelled", "reason": error.reason}
+    return {"type": "error", "detail": str(error)}
+
+
+def _decode_error(error: Dict[str, Any]) -> Exception:
+    """Rebuild the exception described by ``_encode_error``."""
+    if error["type"] == "busy":
+        return InferenceQueueFull(error["retry_after"])
+    if error["type"] == "cancelled":
+        return GenerationCancelled(error["reason"])
+    return BackendError(f"workers request failed: {error['detail']}")
+
+
+async def _serve(conn: Any, manager: Any) -> None:
+    """Answer requests from the parent process until it asks to stop."""
+    loop = asyncio.get_running_loop()
+    tokens: Dict[int, CancellationToken] = {}
+    tasks = set()
+
+    async def handle(kind: str, request_id: int, request: Dict[str, Any]) -> None:
+        options = GenerationOptions(
+            max_new_tokens=request["max_tokens"],
+            stop=tuple(request["stop"]),
+            cancel=tokens[request_id]
+        )
+        try:
+            if kind == "generate":
+                conn.send(("result", request_id, await manager.complete(request["messages"], options)))
+            else:
+                async for text in manager.stream_response(request["messages"][-1]["content"], options):
+                    conn.send(("chunk", request_id, text))
+                conn.send(("end", request_id, None))
+        except Exception as e:
+            conn.send(("error", request_id, _encode_error(e)))
+        finally:
+            tokens.pop(request_id, None)
+
+    while True:
+        try:
+            kind, request_id, request = await loop.run_in_executor(None, conn.recv)
+        except EOFError:
+            break
+        if kind == "stop":
+            break
+        if kind == "ping":
+            conn.send(("pong", request_id, None))
+        elif kind == "cancel":
+            token = tokens.get(request_id)
+            if token is not None:
+                token.cancel("caller went away")
+        else:
+            tokens[request_id] = CancellationToken()
+            task = loop.create_task(handle(kind, request_id, request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    for token in list(tokens.values()):
+        token.cancel("worker stopping")
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await manager.close()
+
+
+def _worker_main(
+    conn: Any,
+    model_name: str,
+    config: LLMConfig,
+    precision: Optional[Precision],
+    cores: List[int],
+    warm_up: bool
+) -> None:
+    """Entry point of a worker process: pin, load the model and serve."""
+    import torch
+    from .llm_manager import LLMManager
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only possible before the first parallel torch operation
+        pass
+
+    try:
+        manager = LLMManager(model_name=model_name, config=config, precision=precision)
+        if warm_up:
+            manager.warm_up()
+    except Exception as e:
+        conn.send(("failed", None, str(e)))
+        return
+    conn.send(("ready", None, {
+        "pid": os.getpid(),
+        "load_timings": manager.load_timings,
+        "memory_footprint": manager.memory_footprint()
+    }))
+    asyncio.run(_serve(conn, manager))
+
+
+@dataclass
+class _Call:
+    """A request waiting for replies from a worker."""
+    loop: asyncio.AbstractEventLoop
+    replies: asyncio.Queue = field(default_factory=asyncio.Queue)
+
+    def deliver(self, kind: str, payload: Any) -> None:
+        """Hand a reply to the waiting coroutine from the reader thread."""
+        try:
+            self.loop.call_soon_threadsafe(self.replies.put_nowait, (kind, payload))
+        except RuntimeError:
+            # The caller's event loop is gone
+            pass
+
+
+@dataclass
+class _Worker:
+    """Parent-side state of one worker process."""
+    index: int
+    cores: List[int]
+    state: str = "stopped"
+    error: Optional[str] = None
+    process: Any = None
+    conn: Any = None
+    pid: Optional[int] = None
+    # Bytes of model weights the worker reported once loaded
+    memory_footprint: int = 0
+    requests: int = 0
+    restarts: int = 0
+    last_seen: float = 0.0
+    calls: Dict[int, _Call] = field(default_factory=dict)
+    settled: threading.Event = field(default_factory=threading.Event)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def send(self, message: Tuple[str, int, Any]) -> None:
+        with self.lock:
+            conn = self.conn
+            if conn is None:
+                raise BackendError(f"Model worker {self.index} is not running")
+            try:
+                conn.send(message)
+            except (OSError, ValueError) as e:
+                raise BackendError(f"Model worker {self.index} is not running") from e
+
+
+class ModelWorkerPool:
+    """
+    Local model served by several pinned worker processes.
+
+    The pool has the same interface as the remote backends, so an LLMManager
+    created with ``backend=pool`` keeps conversation histories, the response
+    cache and request limits in the API process while generation runs in the
+    workers.
+    """
+
+    name = "workers"
+
+    def __init__(
+        self,
+        model_name: str,
+        config: Optional[LLMConfig] = None,
+        num_workers: int = 2,
+        threads_per_worker: int = 0,
+        precision: Optional[Precision] = None,
+        warm_up: bool = True,
+        max_in_flight_per_worker: int = 64,
+        health_interval: float = 5.0,
+        retry_after_seconds: int = 5
+    ):
+        """
+        Initialize the pool; worker processes are started by ``start()``.
+
+        Args:
+            model_name: Model each worker loads
+            config: Generation parameters of the workers' models
+            num_workers: Number of worker processes
+            threads_per_worker: Cores, and torch threads, per worker; 0 divides
+                the available cores evenly
+            precision: Inference precision of the workers' models
+            warm_up: Run a short generation in each worker after loading
+            max_in_flight_per_worker: Requests a worker may have outstanding
+                before new ones are rejected
+            health_interval: Seconds between health checks; a worker silent
+                for three intervals is restarted
+            retry_after_seconds: Value suggested to clients when no worker can
+                take a request
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        self._model_name = model_name
+        self.config = config or LLMConfig()
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.precision = precision
+        self.warm_up = warm_up
+        self.max_in_flight_per_worker = max_in_flight_per_worker
+        self.health_interval = health_interval
+        self.retry_after_seconds = retry_after_seconds
+
+        # Spawned rather than forked: forking a process with torch threads
+        # running can deadlock the child
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [
+            _Worker(index=index, cores=cores)
+            for index, cores in enumerate(plan_core_slices(num_workers, threads_per_worker))
+        ]
+        self._request_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    def with_model(self, model_name: str) -> "ModelWorkerPool":
+        """Return a pool with the same layout serving another model."""
+        return ModelWorkerPool(
+            model_name,
+            config=self.config,
+            num_workers=self.num_workers,
+            threads_per_worker=self.threads_per_worker,
+            precision=self.precision,
+            warm_up=self.warm_up,
+            max_in_flight_per_worker=self.max_in_flight_per_worker,
+            health_interval=self.health_interval,
+            retry_after_seconds=self.retry_after_seconds
+        )
+
+    def start(self) -> None:
+        """Start the worker processes and the health monitor."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for worker in self._workers:
+                self._spawn(worker)
+            self._monitor = threading.Thread(target=self._watch, name="model-worker-monitor", daemon=True)
+            self._monitor.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> None:
+        """
+        Start the workers and block until each has loaded its model or failed.
+
+        Raises:
+            RuntimeError: If no worker could load the model
+        """
+        self.start()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for worker in self._workers:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not worker.settled.wait(remaining):
+                raise RuntimeError(f"Model worker {worker.index} did not start within {timeout}s")
+        failed = [worker for worker in self._workers if worker.state == "failed"]
+        for worker in failed:
+            logger.error(f"Model worker {worker.index} failed to start: {worker.error}")
+        if len(failed) == len(self._workers):
+            raise RuntimeError(f"No model worker could load {self.model_name}: {failed[0].error}")
+
+    def _spawn(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.model_name, self.config, self.precision, worker.cores, self.warm_up),
+            name=f"model-worker-{worker.index}",
+            daemon=True
+        )
+        worker.settled.clear()
+        worker.state = "starting"
+        worker.error = None
+        process.start()
+        child_conn.close()
+        with worker.lock:
+            worker.process = process
+            worker.conn = parent_conn
+        worker.last_seen = time.monotonic()
+        threading.Thread(
+            target=self._read,
+            args=(worker, parent_conn),
+            name=f"model-worker-{worker.index}-reader",
+            daemon=True
+        ).start()
+
+    def _read(self, worker: _Worker, conn: Any) -> None:
+        """Reader thread: route one worker's replies until its pipe closes."""
+        while True:
+            try:
+                kind, request_id, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            worker.last_seen = time.monotonic()
+            if kind == "ready":
+                worker.pid = payload["pid"]
+                worker.memory_footprint = payload["memory_footprint"]
+                worker.state = "ready"
+                worker.settled.set()
+                logger.info(f"Model worker {worker.index} ready on cores {worker.cores}")
+            elif kind == "failed":
+                worker.error = payload
+                worker.state = "failed"
+                worker.settled.set()
+            elif kind != "pong":
+                call = worker.calls.get(request_id)
+                if call is not None:
+                    call.deliver(kind, payload)
+
+        # The process exited or crashed: fail what it was working on
+        with worker.lock:
+            if worker.conn is not conn:
+                return
+            worker.conn = None
+            calls, worker.calls = worker.calls, {}
+        conn.close()
+        if worker.state == "starting":
+            worker.state = "failed"
+            worker.error = worker.error or "exited during startup"
+        elif worker.state != "failed":
+            worker.state = "stopped" if self._closed.is_set() else "crashed"
+        worker.settled.set()
+        for call in calls.values():
+            call.deliver("error", {"type": "error", "detail": f"worker {worker.index} exited"})
+
+    def _watch(self) -> None:
+        """Monitor thread: restart crashed workers and ping the others."""
+        while not self._closed.wait(self.health_interval):
+            for worker in self._workers:
+                if worker.state == "crashed":
+                    worker.restarts += 1
+                    logger.warning(f"Restarting model worker {worker.index} (restart {worker.restarts})")
+                    self._spawn(worker)
+                elif worker.state == "ready":
+                    if time.monotonic() - worker.last_seen > 3 * self.health_interval:
+                        logger.warning(f"Model worker {worker.index} is unresponsive, killing it")
+                        worker.process.kill()
+                        continue
+                    try:
+                        worker.send(("ping", 0, None))
+                    except BackendError:
+                        pass
+
+    def _choose(self) -> _Worker:
+        """Pick the ready worker with the fewest outstanding requests."""
+        ready = [worker for worker in self._workers if worker.state == "ready"]
+        if not ready:
+            raise InferenceQueueFull(self.retry_after_seconds)
+        # Ties go to the worker that has served fewer requests overall
+        worker = min(ready, key=lambda worker: (len(worker.calls), worker.requests))
+        if len(worker.calls) >= self.max_in_flight_per_worker:
+            raise InferenceQueueFull(self.retry_after_seconds)
+        return worker
+
+    async def _call(
+        self,
+        kind: str,
+        messages: Messages,
+        max_tokens: Optional[int],
+        stop: Sequence[str]
+    ) -> AsyncIterator[str]:
+        """Send one request to a worker and yield its reply text."""
+        worker = self._choose()
+        request_id = next(self._request_ids)
+        call = _Call(asyncio.get_running_loop())
+        with worker.lock:
+            worker.calls[request_id] = call
+        worker.requests += 1
+        finished = False
+        try:
+            worker.send((kind, request_id, {"messages": messages, "max_tokens": max_tokens, "stop": list(stop)}))
+            while True:
+                reply, payload = await call.replies.get()
+                if reply == "chunk":
+                    yield payload
+                    continue
+                finished = True
+                if reply == "error":
+                    raise _decode_error(payload)
+                if reply == "result":
+                    yield payload
+                return
+        finally:
+            with worker.lock:
+                worker.calls.pop(request_id, None)
+            if not finished:
+                # Abandoned by the caller: stop the worker's generation too
+                try:
+                    worker.send(("cancel", request_id, None))
+                except BackendError:
+                    pass
+
+    async def generate(
+        self,
+        messages: Messages,
+        max_tokens: Optional[int] = None,
+        stop: Sequence[str] = ()
+    ) -> str:
+        """Return the reply to a list of ``{"role", "content"}`` messages."""
+        async with aclosing(self._call("generate", messages, max_tokens, stop)) as replies:
+            async for text in replies:
+                return text
+        return ""
+
+    async def stream(
+        self,
+        messages: Messages,
+        max_tokens: Optional[int] = None,
+        stop: Sequence[str] = ()
+    ) -> AsyncIterator[str]:
+        """Yield the reply to the last of ``messages`` as text deltas."""
+        async with aclosing(self._call("stream", messages, max_tokens, stop)) as replies:
+            async for text in replies:
+                yield text
+
+    def memory_footprint(self) -> int:
+        """Return the bytes of model weights held across the running workers."""
+        return sum(worker.memory_footprint for worker in self._workers if worker.state == "ready")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-worker load, placement and restart counts."""
+        workers = [
+            {
+                "index": worker.index,
+                "pid": worker.pid,
+                "state": worker.state,
+                "cores": worker.cores,
+                "in_flight": len(worker.calls),
+                "requests": worker.requests,
+                "restarts": worker.restarts,
+                "memory_footprint": worker.memory_footprint
+            }
+            for worker in self._workers
+        ]
+        return {
+            "backend": self.name,
+            "model": self.model_name,
+            "in_flight": sum(worker["in_flight"] for worker in workers),
+            "requests": sum(worker["requests"] for worker in workers),
+            "restarts": sum(worker["restarts"] for worker in workers),
+            "workers": workers
+        }
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the workers, killing any that do not exit within ``timeout``."""
+        self._closed.set()
+        for worker in self._workers:
+            try:
+                worker.send(("stop", 0, None))
+            except BackendError:
+                pass
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+
+    async def close(self) -> None:
+        """Stop the workers without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
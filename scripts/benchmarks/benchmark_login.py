@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+Login throughput benchmark for Amega AI.
+
+Sends bursts of logins to an in-process app while other clients keep calling a
+cheap endpoint, once with bcrypt verifying passwords on the event loop (as
+logins used to) and once on the password hashing threads, and reports login
+throughput and the latency the other requests saw meanwhile.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+
+def build_app():
+    """An app with a login endpoint per verification mode and a cheap endpoint."""
+    from fastapi import FastAPI, HTTPException
+    from backend.auth import authenticate_user, get_user, pwd_context
+
+    app = FastAPI()
+
+    @app.post("/login/event-loop")
+    async def login_on_event_loop(username: str, password: str):
+        user = await get_user(username)
+        if not user or not pwd_context.verify(password, user.hashed_password):
+            raise HTTPException(status_code=401)
+        return {"username": user.username}
+
+    @app.post("/login/threads")
+    async def login_on_threads(username: str, password: str):
+        user = await authenticate_user(username, password)
+        if not user:
+            raise HTTPException(status_code=401)
+        return {"username": user.username}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run(client, mode, logins, login_concurrency, ping_clients, ping_interval=0.005):
+    """Run ``logins`` logins while ``ping_clients`` clients call /ping until they finish."""
+    remaining = iter(range(logins))
+    ping_latencies = []
+    done = asyncio.Event()
+
+    async def login_client():
+        for _ in remaining:
+            response = await client.post(f"/login/{mode}", params={"username": "user", "password": "user"})
+            response.raise_for_status()
+
+    async def ping_client():
+        # In-process requests never wait on a socket, so pace them like
+        # steady background traffic
+        while not done.is_set():
+            due = time.perf_counter() + ping_interval
+            await asyncio.sleep(ping_interval)
+            await client.get("/ping")
+            # Measured from when the request was due, so time the event loop
+            # spent blocked counts against it
+            ping_latencies.append(time.perf_counter() - due)
+
+    pingers = [asyncio.ensure_future(ping_client()) for _ in range(ping_clients)]
+    started = time.perf_counter()
+    await asyncio.gather(*(login_client() for _ in range(login_concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*pingers)
+
+    ping_latencies.sort()
+    return {
+        "logins_per_second": round(logins / elapsed, 2),
+        "ping_latency_mean_ms": round(statistics.mean(ping_latencies) * 1000, 3),
+        "ping_latency_p99_ms": round(ping_latencies[int(len(ping_latencies) * 0.99) - 1] * 1000, 3),
+        "ping_latency_max_ms": round(ping_latencies[-1] * 1000, 3),
+        "pings": len(ping_latencies),
+    }
+
+
+async def main_async(args):
+    import httpx
+    from backend.auth import shutdown_password_hashing
+
+    transport = httpx.ASGITransport(app=build_app())
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for mode in ("event-loop", "threads"):
+            print(f"Running {args.logins} logins verified on the {mode}...")
+            # Warm up outside the measurement
+            await run(client, mode, 1, 1, 1)
+            results[mode] = await run(client, mode, args.logins, args.concurrency, args.ping_clients)
+    shutdown_password_hashing()
+
+    result = {
+        "login_concurrency": args.concurrency,
+        "ping_clients": args.ping_clients,
+        **{f"{mode}_{key}": value for mode, stats in results.items() for key, value in stats.items()},
+        "ping_p99_improvement": round(
+            results["event-loop"]["ping_latency_p99_ms"] / results["threads"]["ping_latency_p99_ms"], 2
+        ),
+    }
+
+    print()
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40, help="Logins per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent login clients")
+    parser.add_argument("--ping-clients", type=int, default=4, help="Concurrent clients of the cheap endpoint")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
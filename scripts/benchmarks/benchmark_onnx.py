@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+ONNX Runtime benchmark for Amega AI.
+
+Generates replies to a fixed prompt set with the PyTorch and the ONNX Runtime
+runtimes, one prompt at a time and as one batch, and reports the latency of
+each, the speedup and whether the greedy outputs are identical.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+PROMPTS = [
+    "Hello, how are you today?",
+    "What is the best way to learn Python?",
+    "Can you recommend a good book?",
+    "What do you think about the weather?",
+    "Tell me something interesting about space.",
+    "What did you have for breakfast?",
+    "Do you like music?",
+    "Where would you go on holiday?",
+]
+
+
+def measure(manager, repeats):
+    """Return per-prompt latencies, batch latencies and the replies of the last pass."""
+    single, batched = [], []
+    replies = []
+    for _ in range(repeats):
+        replies = []
+        for prompt in PROMPTS:
+            started = time.perf_counter()
+            replies.append(manager.generate_batch([prompt])[0])
+            single.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        replies.extend(manager.generate_batch(PROMPTS))
+        batched.append(time.perf_counter() - started)
+    return single, batched, replies
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model name or path")
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the prompt set")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = default)")
+    parser.add_argument("--onnx-cache-dir", default=".cache/onnx", help="Where the exported graph is cached")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    import torch
+    from backend.config import LLMConfig
+    from backend.llm_manager import LLMManager
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    config = LLMConfig(temperature=0.0, max_length=args.max_new_tokens)
+    results = {}
+    replies = {}
+    for runtime in ("torch", "onnxruntime"):
+        print(f"Loading {args.model} with the {runtime} runtime...")
+        manager = LLMManager(
+            model_name=args.model,
+            config=config,
+            precision=args.precision,
+            runtime=runtime,
+            onnx_cache_dir=args.onnx_cache_dir
+        )
+        manager.warm_up()
+        single, batched, replies[runtime] = measure(manager, args.repeats)
+        results[runtime] = {
+            "load_seconds": round(manager.load_timings["model_seconds"], 2),
+            "single_latency_mean_ms": round(statistics.mean(single) * 1000, 1),
+            "batch_latency_mean_ms": round(statistics.mean(batched) * 1000, 1),
+            "memory_mb": round(manager.memory_footprint() / 1024 / 1024, 1),
+        }
+
+    identical = sum(a == b for a, b in zip(replies["torch"], replies["onnxruntime"]))
+    result = {
+        "model": args.model,
+        "precision": args.precision,
+        **{f"{runtime}_{key}": value for runtime, stats in results.items() for key, value in stats.items()},
+        "single_speedup": round(
+            results["torch"]["single_latency_mean_ms"] / results["onnxruntime"]["single_latency_mean_ms"], 2
+        ),
+        "batch_speedup": round(
+            results["torch"]["batch_latency_mean_ms"] / results["onnxruntime"]["batch_latency_mean_ms"], 2
+        ),
+        "identical_outputs": f"{identical}/{len(replies['torch'])}",
+    }
+
+    print()
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""
+Precision benchmark for Amega AI.
+
+Loads the model once per precision mode (fp32, bf16, int8) in a fresh process and
+reports generation latency, tokens per second, resident memory and a basic
+output-quality check: perplexity on a reference text and how often greedy
+outputs agree with fp32.
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+PROMPTS = [
+    "Hello, how are you today?",
+    "What is the best way to learn Python?",
+    "Can you recommend a good book?",
+    "What do you think about the weather?",
+    "Tell me something interesting about space.",
+]
+
+REFERENCE_TEXT = (
+    "The quick brown fox jumps over the lazy dog. "
+    "I really enjoyed the movie we watched last night, the ending was great."
+)
+
+
+def _rss_mb() -> float:
+    """Return the current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS is the best we can do without /proc (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(model_name: str, precision: str, max_new_tokens: int, repeats: int, threads: int) -> dict:
+    """Benchmark a single precision mode; meant to run in its own process."""
+    import torch
+    from backend.config import LLMConfig
+    from backend.llm_manager import LLMManager
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    manager = LLMManager(
+        model_name=model_name,
+        config=LLMConfig(temperature=0.0, max_length=max_new_tokens),
+        precision=precision
+    )
+    load_seconds = time.perf_counter() - started
+    manager.warm_up()
+    tokenizer, model = manager.tokenizer, manager.model
+    generation_kwargs = manager._generation_kwargs()
+
+    latencies = []
+    generated_tokens = 0
+    outputs = {}
+    with torch.inference_mode():
+        for _ in range(repeats):
+            for prompt in PROMPTS:
+                inputs = tokenizer([prompt + tokenizer.eos_token], return_tensors="pt")
+                started = time.perf_counter()
+                sequences = model.generate(**inputs, **generation_kwargs)
+                latencies.append(time.perf_counter() - started)
+                new_tokens = sequences[0, inputs["input_ids"].shape[1]:]
+                generated_tokens += new_tokens.shape[0]
+                outputs[prompt] = new_tokens.tolist()
+
+        reference = tokenizer(REFERENCE_TEXT, return_tensors="pt")
+        loss = model(**reference, labels=reference["input_ids"]).loss
+        perplexity = float(torch.exp(loss.float()))
+
+    return {
+        "precision": precision,
+        "load_seconds": round(load_seconds, 3),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "tokens_per_second": round(generated_tokens / sum(latencies), 2),
+        "rss_mb": round(_rss_mb(), 1),
+        "model_rss_mb": round(_rss_mb() - rss_before, 1),
+        "perplexity": round(perplexity, 3),
+        "outputs": outputs,
+    }
+
+
+def main():
+    """Run the benchmark for every requested precision and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model name or path")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"], choices=["fp32", "bf16", "int8"])
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the prompt set")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Each mode runs in a fresh process so memory measurements do not overlap
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for precision in args.modes:
+        print(f"Benchmarking {precision}...")
+        with context.Pool(1) as pool:
+            results.append(pool.apply(
+                run_mode,
+                (args.model, precision, args.max_new_tokens, args.repeats, args.threads)
+            ))
+
+    # Quality check: how often greedy outputs match the fp32 reference
+    outputs = {result["precision"]: result.pop("outputs") for result in results}
+    if "fp32" in outputs:
+        for result in results:
+            reference = outputs["fp32"]
+            agree = sum(outputs[result["precision"]][prompt] == tokens for prompt, tokens in reference.items())
+            result["greedy_agreement"] = round(agree / len(reference), 2)
+
+    columns = [
+        "precision", "load_seconds", "latency_mean_ms", "latency_p50_ms",
+        "tokens_per_second", "model_rss_mb", "rss_mb", "perplexity", "greedy_agreement"
+    ]
+    print()
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result.get(column, "-")) for column in columns))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
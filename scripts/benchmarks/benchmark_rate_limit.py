@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Rate limiter benchmark for Amega AI.
+
+Runs concurrent rate limit checks against a Redis server with the previous
+limiter (a synchronous client doing INCR then EXPIRE), the current one (one
+Lua script over an async connection pool) and the hybrid one (local counts
+synced in batches), and reports throughput, check latency and how long the
+event loop was blocked.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the project root directory to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+
+class LegacyRateLimiter:
+    """The limiter before the Lua script: two blocking round trips per check."""
+
+    def __init__(self, redis_url, limit, window_seconds):
+        import redis
+
+        self.redis = redis.from_url(redis_url)
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+    async def is_rate_limited(self, identifier, tier="default"):
+        now = int(time.time())
+        window_start = now - (now % self.window_seconds)
+        key = f"rate_limit:{identifier}:{window_start}"
+        current = self.redis.incr(key)
+        if current == 1:
+            self.redis.expire(key, self.window_seconds)
+        return current > self.limit, {"remaining": max(0, self.limit - current)}
+
+    async def close(self):
+        self.redis.close()
+
+
+async def loop_lag(stop, interval=0.001):
+    """Return the longest delay of a timer on the event loop until ``stop`` is set."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(limiter, checks, concurrency, identifiers):
+    """Run ``checks`` rate limit checks from ``concurrency`` coroutines."""
+    latencies = []
+    remaining = iter(range(checks))
+
+    async def client(index):
+        for count in remaining:
+            identifier = identifiers[(index + count) % len(identifiers)]
+            started = time.perf_counter()
+            await limiter.is_rate_limited(identifier, "default")
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    latencies.sort()
+    return {
+        "checks_per_second": round(checks / elapsed),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "latency_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+        "max_loop_lag_ms": round(await lag * 1000, 3),
+    }
+
+
+async def main_async(args):
+    from backend.rate_limit import HybridRateLimiter, RateLimitConfig, RateLimiter
+
+    # Fresh identifiers so earlier runs do not count against this one
+    prefix = uuid.uuid4().hex[:8]
+    identifiers = [f"benchmark:{prefix}:{index}" for index in range(args.identifiers)]
+    limiters = {
+        "legacy": LegacyRateLimiter(args.redis_url, limit=args.limit, window_seconds=60),
+        "lua_async": RateLimiter(
+            redis_url=args.redis_url,
+            default_limits={"default": RateLimitConfig(requests=args.limit, window_seconds=60)},
+            max_connections=args.concurrency
+        ),
+        "hybrid": HybridRateLimiter(
+            redis_url=args.redis_url,
+            default_limits={"default": RateLimitConfig(requests=args.limit, window_seconds=60)},
+            max_connections=args.concurrency
+        ),
+    }
+    results = {}
+    for name, limiter in limiters.items():
+        print(f"Running {args.checks} checks with the {name} limiter...")
+        # Warm up connections (and load the script) outside the measurement
+        await run(limiter, args.concurrency, args.concurrency, [f"benchmark:{prefix}:warm-up"])
+        results[name] = await run(limiter, args.checks, args.concurrency, [f"{name}:{i}" for i in identifiers])
+        await limiter.close()
+
+    result = {
+        "concurrency": args.concurrency,
+        **{f"{name}_{key}": value for name, stats in results.items() for key, value in stats.items()},
+        "throughput_gain": round(
+            results["lua_async"]["checks_per_second"] / results["legacy"]["checks_per_second"], 2
+        ),
+        "hybrid_throughput_gain": round(
+            results["hybrid"]["checks_per_second"] / results["legacy"]["checks_per_second"], 2
+        ),
+    }
+
+    print()
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379", help="Redis server to benchmark against")
+    parser.add_argument("--checks", type=int, default=20000, help="Rate limit checks per limiter")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--identifiers", type=int, default=1000, help="Distinct clients being limited")
+    parser.add_argument("--limit", type=int, default=100, help="Requests allowed per window")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Speculative decoding benchmark for Amega AI.
+
+Generates replies to a fixed prompt set with and without a draft model and
+reports the draft token acceptance rate, the end-to-end speedup and whether the
+greedy outputs are identical.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+PROMPTS = [
+    "Hello, how are you today?",
+    "What is the best way to learn Python?",
+    "Can you recommend a good book?",
+    "What do you think about the weather?",
+    "Tell me something interesting about space.",
+    "What did you have for breakfast?",
+    "Do you like music?",
+    "Where would you go on holiday?",
+]
+
+
+class ForwardCounter:
+    """Counts forward passes of a model."""
+
+    def __init__(self, model):
+        self.calls = 0
+        self._handle = model.register_forward_hook(self._hook)
+
+    def _hook(self, *args):
+        self.calls += 1
+
+    def reset(self):
+        self.calls = 0
+
+    def remove(self):
+        self._handle.remove()
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Main model name or path")
+    parser.add_argument("--draft-model", default="microsoft/DialoGPT-small", help="Draft model name or path")
+    parser.add_argument("--num-assistant-tokens", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the prompt set")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "int8"])
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    import torch
+    from backend.config import LLMConfig
+    from backend.llm_manager import LLMManager
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print(f"Loading {args.model} with draft model {args.draft_model}...")
+    manager = LLMManager(
+        model_name=args.model,
+        config=LLMConfig(
+            temperature=0.0,
+            max_length=args.max_new_tokens,
+            draft_model_name=args.draft_model,
+            num_assistant_tokens=args.num_assistant_tokens
+        ),
+        precision=args.precision
+    )
+    if manager.draft_model is None:
+        sys.exit("The draft model cannot assist the main model (different vocabularies)")
+    manager.warm_up()
+    tokenizer = manager.tokenizer
+    assisted_kwargs = manager._generation_kwargs()
+    plain_kwargs = {key: value for key, value in assisted_kwargs.items() if key != "assistant_model"}
+
+    main_counter = ForwardCounter(manager.model)
+    draft_counter = ForwardCounter(manager.draft_model)
+    latencies = {"plain": [], "speculative": []}
+    generated_tokens = 0
+    verify_passes = 0
+    drafted_tokens = 0
+    identical = 0
+
+    with torch.inference_mode():
+        for _ in range(args.repeats):
+            for prompt in PROMPTS:
+                inputs = tokenizer([prompt + tokenizer.eos_token], return_tensors="pt").to(manager.device)
+                prompt_length = inputs["input_ids"].shape[1]
+
+                started = time.perf_counter()
+                plain = manager.model.generate(**inputs, **plain_kwargs)
+                latencies["plain"].append(time.perf_counter() - started)
+
+                main_counter.reset()
+                draft_counter.reset()
+                started = time.perf_counter()
+                speculative = manager.model.generate(**inputs, **assisted_kwargs)
+                latencies["speculative"].append(time.perf_counter() - started)
+
+                # Every verification pass accepts some drafted tokens and adds
+                # one token of its own
+                new_tokens = speculative.shape[1] - prompt_length
+                generated_tokens += new_tokens
+                verify_passes += main_counter.calls
+                drafted_tokens += draft_counter.calls
+                identical += torch.equal(plain, speculative)
+
+    main_counter.remove()
+    draft_counter.remove()
+    runs = len(latencies["plain"])
+    accepted = max(0, generated_tokens - verify_passes)
+    result = {
+        "model": args.model,
+        "draft_model": args.draft_model,
+        "num_assistant_tokens": args.num_assistant_tokens,
+        "plain_latency_mean_ms": round(statistics.mean(latencies["plain"]) * 1000, 1),
+        "speculative_latency_mean_ms": round(statistics.mean(latencies["speculative"]) * 1000, 1),
+        "speedup": round(sum(latencies["plain"]) / sum(latencies["speculative"]), 2),
+        "acceptance_rate": round(accepted / drafted_tokens, 3) if drafted_tokens else 0.0,
+        "tokens_per_verify_pass": round(generated_tokens / verify_passes, 2) if verify_passes else 0.0,
+        "identical_outputs": f"{identical}/{runs}",
+    }
+
+    print()
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
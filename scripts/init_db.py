@@ -5,6 +5,7 @@ Database initialization script for Amega AI.
 This script creates the initial database schema and sets up any required tables.
 """
 
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -14,38 +15,30 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
 
 # Load environment variables
 load_dotenv()
 
-def init_database():
+async def init_database():
     """Initialize the database with required tables and initial data."""
-    try:
-        # Get database URL from environment variables
-        db_url = os.getenv('DB_URL')
-        if not db_url:
-            print("Error: DB_URL environment variable not set")
-            sys.exit(1)
-
-        # Create database engine
-        engine = create_engine(db_url)
-
-        # Import models here to avoid circular imports
-        from src.amega_ai.models import Base
+    # Import models here so the settings see the loaded environment
+    from backend.config import settings
+    from backend.user_store import SQLUserRepository
+
+    # Get database URL from environment variables
+    db_url = os.getenv('DB_URL') or (str(settings.DATABASE_URL) if settings.DATABASE_URL else None)
+    if not db_url:
+        print("Error: DB_URL or DATABASE_URL environment variable not set")
+        sys.exit(1)
 
+    repository = SQLUserRepository(db_url)
+    try:
         # Create all tables
-        Base.metadata.create_all(engine)
-
-        # Create session
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        await repository.create_schema()
 
         # Add any initial data here if needed
 
-        session.commit()
         print("Database initialized successfully!")
 
     except SQLAlchemyError as e:
@@ -55,9 +48,8 @@ def init_database():
         print(f"Unexpected error: {e}")
         sys.exit(1)
     finally:
-        if 'session' in locals():
-            session.close()
+        await repository.close()
 
 if __name__ == "__main__":
     print("Initializing database...")
-    init_database() 
+    asyncio.run(init_database())
@@ -2,27 +2,76 @@
 PyTest configuration and fixtures for AMEGA-AI tests.
 """
 import pytest
-from unittest.mock import MagicMock
+import torch
 from fastapi.testclient import TestClient
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+from backend import llm_manager as llm_manager_module
 from backend.app import app
 from backend.auth import fake_users_db
-from backend.llm_manager import ChatMessage
+from backend.config import LLMConfig
+from backend.llm_manager import ChatMessage, LLMManager
 
 # Create a mock LLM manager
 class MockLLMManager:
     def __init__(self, *args, **kwargs):
-        self.memory = MagicMock()
-        self.memory.chat_memory.messages = []
+        pass
 
-    async def chat(self, message: ChatMessage) -> ChatMessage:
+    async def chat(self, message: ChatMessage, **kwargs) -> ChatMessage:
         return ChatMessage(
             role="assistant",
             content="This is a mock response"
         )
 
-    def get_conversation_history(self):
+    async def stream_response(self, message: str, options=None):
+        for chunk in ["This is ", "a mock ", "response"]:
+            yield chunk
+
+    def get_conversation_history(self, *args, **kwargs):
         return []
 
+def build_tiny_tokenizer() -> PreTrainedTokenizerFast:
+    """Build a byte-level tokenizer that needs no downloads."""
+    alphabet = sorted(pre_tokenizers.ByteLevel.alphabet())
+    vocab = {char: index for index, char in enumerate(alphabet)}
+    vocab["<|endoftext|>"] = len(vocab)
+    tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|endoftext|>")
+
+def build_tiny_model(tokenizer: PreTrainedTokenizerFast) -> GPT2LMHeadModel:
+    """Build a small randomly initialised GPT-2 model."""
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=len(tokenizer),
+        n_positions=512,
+        n_embd=32,
+        n_layer=2,
+        n_head=2,
+        bos_token_id=tokenizer.eos_token_id,
+        eos_token_id=tokenizer.eos_token_id
+    )
+    return GPT2LMHeadModel(config)
+
+@pytest.fixture
+def tiny_llm_manager(monkeypatch):
+    """Create a real LLMManager backed by a tiny local model."""
+    tokenizer = build_tiny_tokenizer()
+    model = build_tiny_model(tokenizer)
+    monkeypatch.setattr(
+        llm_manager_module.AutoTokenizer, "from_pretrained",
+        lambda *args, **kwargs: tokenizer
+    )
+    monkeypatch.setattr(
+        llm_manager_module.AutoModelForCausalLM, "from_pretrained",
+        lambda *args, **kwargs: model
+    )
+    return LLMManager(
+        model_name="tiny-gpt2",
+        config=LLMConfig(temperature=0.0, max_length=48)
+    )
+
 @pytest.fixture
 def client():
     """Create a test client with a mock LLM manager."""
@@ -0,0 +1,120 @@
+"""
+Fake OpenAI, Anthropic and Ollama chat server.
+
+Replies echo the last user message word by word, so tests (and local
+development) can exercise the remote backends without network access or API
+keys. Use it in-process with ``httpx.ASGITransport(app=create_app())`` or run it
+standalone with ``python -m tests.fake_llm_server``.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _reply_words(body: Dict[str, Any]) -> List[str]:
+    last = next(
+        (message["content"] for message in reversed(body["messages"]) if message["role"] == "user"),
+        ""
+    )
+    words = f"Echo: {last}".split(" ")
+    return [word if index == 0 else f" {word}" for index, word in enumerate(words)]
+
+
+def create_app(delay: float = 0.0) -> FastAPI:
+    """
+    Create the fake server.
+
+    Args:
+        delay: Seconds each request takes, to observe concurrency limits
+
+    ``app.state`` records the headers and bodies of received requests and the
+    highest number of requests served at once.
+    """
+    app = FastAPI()
+    app.state.delay = delay
+    app.state.requests = []
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    app.state.status_code = 200
+
+    async def receive(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        app.state.requests.append({"headers": dict(request.headers), "body": body})
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(app.state.delay)
+        finally:
+            app.state.in_flight -= 1
+        return body
+
+    def failure():
+        if app.state.status_code == 200:
+            return None
+        return JSONResponse(
+            status_code=app.state.status_code,
+            content={"error": "fake failure"},
+            headers={"Retry-After": "7"}
+        )
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await receive(request)
+        error = failure()
+        if error:
+            return error
+        words = _reply_words(body)
+        if not body.get("stream"):
+            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words)}}]}
+
+        async def events() -> AsyncIterator[str]:
+            for word in words:
+                chunk = {"choices": [{"index": 0, "delta": {"content": word}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        body = await receive(request)
+        error = failure()
+        if error:
+            return error
+        words = _reply_words(body)
+        if not body.get("stream"):
+            return {"role": "assistant", "content": [{"type": "text", "text": "".join(words)}]}
+
+        async def events() -> AsyncIterator[str]:
+            yield f"event: message_start\ndata: {json.dumps({'type': 'message_start'})}\n\n"
+            for word in words:
+                delta = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+                yield f"event: content_block_delta\ndata: {json.dumps(delta)}\n\n"
+            yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await receive(request)
+        error = failure()
+        if error:
+            return error
+        words = _reply_words(body)
+        if not body.get("stream", True):
+            return {"message": {"role": "assistant", "content": "".join(words)}, "done": True}
+
+        async def lines() -> AsyncIterator[str]:
+            for word in words:
+                yield json.dumps({"message": {"role": "assistant", "content": word}, "done": False}) + "\n"
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(create_app(), host="127.0.0.1", port=11434)
@@ -2,7 +2,8 @@
 Tests for authentication functionality.
 """
 import pytest
-from backend.auth import fake_users_db
+from passlib.context import CryptContext
+from backend.auth import authenticate_user, fake_users_db, pwd_context
 
 def test_register_user(client):
     """Test user registration."""
@@ -145,4 +146,23 @@ def test_chat_endpoint_no_auth(client):
 def cleanup():
     """Clean up the fake database after each test."""
     yield
-    fake_users_db.clear() 
\ No newline at end of file
+    fake_users_db.clear()
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_with_new_cost():
+    """Test a hash with an outdated bcrypt cost is replaced when the user logs in."""
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("rehash-secret")
+    fake_users_db["rehash"] = {"username": "rehash", "role": "user", "hashed_password": old_hash}
+    try:
+        assert await authenticate_user("rehash", "wrong") is None
+        assert fake_users_db["rehash"]["hashed_password"] == old_hash
+
+        user = await authenticate_user("rehash", "rehash-secret")
+        assert user is not None
+        new_hash = fake_users_db["rehash"]["hashed_password"]
+        assert new_hash != old_hash
+        assert not pwd_context.needs_update(new_hash)
+        assert await authenticate_user("rehash", "rehash-secret") is not None
+    finally:
+        fake_users_db.pop("rehash", None)
@@ -1,39 +1,48 @@
 """
 Tests for rate limiting functionality.
 """
+import asyncio
 import pytest
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from redis import asyncio as aioredis
 
-from backend.rate_limit import RateLimiter, RateLimitConfig, rate_limit_dependency
+from backend.app import add_rate_limit_headers
+from backend.rate_limit import (
+    HybridRateLimiter, RateLimiter, RateLimitConfig, TokenQuota, TokenReservation, rate_limit_dependency
+)
+
+fakeredis = pytest.importorskip("fakeredis")
 
 @pytest.fixture
 def redis_mock():
-    """Mock Redis client."""
-    with patch("redis.from_url") as mock:
-        yield mock.return_value
+    """In-memory Redis that runs Lua scripts."""
+    return fakeredis.FakeAsyncRedis()
 
 @pytest.fixture
 def rate_limiter(redis_mock):
-    """Create a RateLimiter instance with mocked Redis."""
-    return RateLimiter(
+    """Create a RateLimiter instance backed by the in-memory Redis."""
+    limiter = RateLimiter(
         redis_url="redis://fake",
         default_limits={
+            "default": RateLimitConfig(requests=100, window_seconds=60),
             "test": RateLimitConfig(requests=2, window_seconds=60)
         }
     )
+    limiter.redis = redis_mock
+    return limiter
 
 @pytest.fixture
 def test_app(rate_limiter):
     """Create a test FastAPI app with rate limiting."""
     app = FastAPI()
     app.state.rate_limiter = rate_limiter
-    
+    app.middleware("http")(add_rate_limit_headers)
+
     @app.get("/test")
     async def test_endpoint(rate_limit: dict = Depends(rate_limit_dependency("test"))):
         return {"message": "success"}
-    
+
     return app
 
 @pytest.fixture
@@ -60,9 +69,8 @@ def test_window_key_generation(rate_limiter):
     key = rate_limiter._get_window_key("test_id", 1000)
     assert key == "rate_limit:test_id:1000"
 
-def test_successful_request(test_client, redis_mock):
+def test_successful_request(test_client):
     """Test successful request within rate limit."""
-    redis_mock.incr.return_value = 1
     response = test_client.get("/test")
     assert response.status_code == 200
     assert response.json() == {"message": "success"}
@@ -70,47 +78,243 @@ def test_successful_request(test_client, redis_mock):
     assert "X-RateLimit-Remaining" in response.headers
     assert "X-RateLimit-Reset" in response.headers
 
-def test_rate_limit_exceeded(test_client, redis_mock):
+def test_rate_limit_exceeded(test_client):
     """Test request when rate limit is exceeded."""
-    redis_mock.incr.return_value = 3  # Over the limit of 2
+    for _ in range(2):
+        assert test_client.get("/test").status_code == 200
     response = test_client.get("/test")
     assert response.status_code == 429
     assert "Rate limit exceeded" in response.json()["detail"]
-    assert "X-RateLimit-Limit" in response.headers
-    assert "X-RateLimit-Remaining" in response.headers
+    assert response.headers["X-RateLimit-Remaining"] == "0"
     assert "X-RateLimit-Reset" in response.headers
 
-def test_rate_limit_headers(test_client, redis_mock):
+def test_rate_limit_headers(test_client):
     """Test rate limit headers are set correctly."""
-    redis_mock.incr.return_value = 1
     response = test_client.get("/test")
     assert response.headers["X-RateLimit-Limit"] == "2"
     assert response.headers["X-RateLimit-Remaining"] == "1"
     assert "X-RateLimit-Reset" in response.headers
 
 @pytest.mark.asyncio
-async def test_rate_limit_tiers(rate_limiter, redis_mock):
+async def test_counter_expires_with_its_window(rate_limiter, redis_mock):
+    """Test the first request of a window creates its counter with an expiry."""
+    is_limited, info = await rate_limiter.is_rate_limited("test_id", "test")
+    assert not is_limited
+    assert info["remaining"] == 1
+
+    window_start = rate_limiter._get_window_start(60)
+    key = rate_limiter._get_window_key("test_id", window_start)
+    assert int(await redis_mock.get(key)) == 1
+    assert 0 < await redis_mock.ttl(key) <= 60
+
+    # A counter left without an expiry gets one on the next request
+    await redis_mock.persist(key)
+    await rate_limiter.is_rate_limited("test_id", "test")
+    assert await redis_mock.ttl(key) > 0
+
+    is_limited, info = await rate_limiter.is_rate_limited("test_id", "test")
+    assert is_limited
+    assert info["remaining"] == 0
+    assert info["reset"] == window_start + 60
+
+@pytest.mark.asyncio
+async def test_rate_limit_tiers(rate_limiter):
     """Test different rate limit tiers."""
-    redis_mock.incr.return_value = 1
-    
+    rate_limiter.default_limits.update(
+        authenticated=RateLimitConfig(requests=1000, window_seconds=60),
+        chat=RateLimitConfig(requests=50, window_seconds=60)
+    )
+
     # Test default tier
     is_limited, info = await rate_limiter.is_rate_limited("test_id", "default")
     assert not is_limited
     assert info["tier"] == "default"
-    
+
     # Test authenticated tier
     is_limited, info = await rate_limiter.is_rate_limited("test_id", "authenticated")
     assert not is_limited
     assert info["tier"] == "authenticated"
-    
+
     # Test chat tier
     is_limited, info = await rate_limiter.is_rate_limited("test_id", "chat")
     assert not is_limited
     assert info["tier"] == "chat"
 
-def test_invalid_tier_fallback(rate_limiter, redis_mock):
+@pytest.mark.asyncio
+async def test_invalid_tier_fallback(rate_limiter):
     """Test fallback to default tier for invalid tier names."""
-    redis_mock.incr.return_value = 1
     is_limited, info = await rate_limiter.is_rate_limited("test_id", "invalid_tier")
     assert not is_limited
-    assert info["tier"] == "default" 
\ No newline at end of file
+    assert info["tier"] == "default"
+    assert info["limit"] == 100
+
+@pytest.mark.asyncio
+async def test_sliding_window_smooths_window_boundaries(rate_limiter, redis_mock):
+    """Test a client that used its limit late in a window cannot use it again right after."""
+    rate_limiter.default_limits["sliding"] = RateLimitConfig(
+        requests=10, window_seconds=60, algorithm="sliding_window"
+    )
+    rate_limiter._now = lambda: 60 * 1000 + 59
+    for _ in range(10):
+        assert not (await rate_limiter.is_rate_limited("test_id", "sliding"))[0]
+    assert (await rate_limiter.is_rate_limited("test_id", "sliding"))[0]
+
+    # A fixed window would allow 10 more here; 6 seconds into the next window
+    # 90% of the previous window still counts
+    rate_limiter._now = lambda: 60 * 1001 + 6
+    is_limited, info = await rate_limiter.is_rate_limited("test_id", "sliding")
+    assert not is_limited
+    assert info["remaining"] == 0
+    assert info["reset"] == 60 * 1002
+    assert (await rate_limiter.is_rate_limited("test_id", "sliding"))[0]
+
+    # Half-way through, half of the previous window's requests still count
+    rate_limiter._now = lambda: 60 * 1001 + 30
+    allowed = 0
+    while not (await rate_limiter.is_rate_limited("test_id", "sliding"))[0]:
+        allowed += 1
+    assert allowed == 4
+
+    # The whole state is one small value
+    assert await redis_mock.keys("rate_limit:*") == [b"rate_limit:sliding_window:sliding:test_id"]
+    assert await redis_mock.get("rate_limit:sliding_window:sliding:test_id") == b"1001:10:5"
+
+@pytest.mark.asyncio
+async def test_gcra_allows_bursts_then_spaces_requests(rate_limiter, redis_mock):
+    """Test GCRA lets a burst through, then one request per emission interval."""
+    rate_limiter.default_limits["gcra"] = RateLimitConfig(
+        requests=60, window_seconds=60, algorithm="gcra", burst=3
+    )
+    now = 1000.0
+    rate_limiter._now = lambda: now
+
+    remaining = [(await rate_limiter.is_rate_limited("test_id", "gcra"))[1]["remaining"] for _ in range(3)]
+    assert remaining == [2, 1, 0]
+    is_limited, info = await rate_limiter.is_rate_limited("test_id", "gcra")
+    assert is_limited
+    assert info["reset"] == 1001
+
+    # One request per second after the burst
+    now = 1000.5
+    assert (await rate_limiter.is_rate_limited("test_id", "gcra"))[0]
+    now = 1001.0
+    assert not (await rate_limiter.is_rate_limited("test_id", "gcra"))[0]
+    assert (await rate_limiter.is_rate_limited("test_id", "gcra"))[0]
+
+    # An idle client gets its whole burst back
+    now = 1010.0
+    is_limited, info = await rate_limiter.is_rate_limited("test_id", "gcra")
+    assert not is_limited
+    assert info["remaining"] == 2
+    assert 0 < await redis_mock.pttl("rate_limit:gcra:gcra:test_id") <= 1000
+
+def hybrid_limiter(redis_client, redis_url="redis://fake", algorithm="fixed_window"):
+    """A hybrid limiter with a limit of 10 that syncs early after 2 local requests."""
+    limiter = HybridRateLimiter(
+        redis_url=redis_url,
+        default_limits={
+            "default": RateLimitConfig(requests=10, window_seconds=60, algorithm=algorithm),
+            "gcra": RateLimitConfig(requests=60, window_seconds=60, algorithm="gcra", burst=2)
+        },
+        sync_interval_seconds=60,
+        sync_tolerance=0.2
+    )
+    if redis_client is not None:
+        limiter.redis = redis_client
+    limiter._now = lambda: 60 * 1000 + 30
+    return limiter
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["fixed_window", "sliding_window"])
+async def test_hybrid_limiters_share_counts_through_syncs(algorithm):
+    """Test processes decide locally and learn each other's counts when they sync."""
+    server = fakeredis.FakeServer()
+    first = hybrid_limiter(fakeredis.FakeAsyncRedis(server=server), algorithm=algorithm)
+    second = hybrid_limiter(fakeredis.FakeAsyncRedis(server=server), algorithm=algorithm)
+
+    for _ in range(4):
+        assert not (await first.is_rate_limited("client"))[0]
+    # Reaching the tolerance wakes the background sync
+    await asyncio.sleep(0.01)
+    assert first.stats()["syncs"] >= 1
+    assert first.stats()["pending"] == 0
+
+    for _ in range(4):
+        assert not (await second.is_rate_limited("client"))[0]
+    await second.sync()
+    # The second process now knows about all 8 requests
+    is_limited, info = await second.is_rate_limited("client")
+    assert not is_limited
+    assert info["remaining"] == 1
+    assert not (await second.is_rate_limited("client"))[0]
+    assert (await second.is_rate_limited("client"))[0]
+
+    await first.close()
+    await second.close()
+
+@pytest.mark.asyncio
+async def test_hybrid_limiter_degrades_to_local_limits():
+    """Test an unreachable Redis leaves limits enforced per process instead of failing."""
+    limiter = hybrid_limiter(None, redis_url="redis://127.0.0.1:1")
+    results = [(await limiter.is_rate_limited("client"))[0] for _ in range(11)]
+    assert results == [False] * 10 + [True]
+
+    # GCRA tiers fall back to a bucket in this process
+    results = [(await limiter.is_rate_limited("client", "gcra"))[0] for _ in range(3)]
+    assert results == [False, False, True]
+
+    await limiter.sync()
+    assert limiter.stats()["degraded"]
+    assert limiter.stats()["sync_errors"] >= 1
+    await limiter.close()
+
+@pytest.mark.asyncio
+async def test_token_quota_reserves_then_settles(redis_mock):
+    """Test requests reserve their worst case and are refunded what they did not use."""
+    quota = TokenQuota(redis_mock, tokens_per_minute=100, tokens_per_day=1000)
+    quota._now = lambda: 60 * 1000 + 30
+
+    first = await quota.reserve("user:alice", 80)
+    assert first.granted
+    assert first.windows["minute"]["remaining"] == 20
+    assert first.windows["day"]["remaining"] == 920
+
+    # The reservation leaves no room for a second large request
+    refused = await quota.reserve("user:alice", 30)
+    assert not refused.granted
+    assert refused.windows["minute"]["remaining"] == 20
+
+    # Settling refunds the unused part of the reservation
+    await quota.settle(first, 25)
+    assert first.windows["minute"]["remaining"] == 75
+    assert (await quota.reserve("user:alice", 30)).granted
+
+    headers = quota.headers(first)
+    assert headers["X-TokenLimit-Limit-Minute"] == "100"
+    assert headers["X-TokenLimit-Remaining-Minute"] == "75"
+    assert headers["X-TokenLimit-Reset-Minute"] == str(60 * 1001)
+    assert headers["X-TokenLimit-Remaining-Day"] == "975"
+
+    # Budgets start over in the next window and requests over the budget are capped
+    quota._now = lambda: 60 * 1001
+    capped = await quota.reserve("user:alice", 500)
+    assert capped.granted
+    assert capped.tokens == 100
+    assert 0 < await redis_mock.ttl(capped.keys[0]) <= 60
+
+@pytest.mark.asyncio
+async def test_token_quota_fails_open_without_redis():
+    """Test an unreachable Redis lets requests through without reserving tokens."""
+    client = aioredis.from_url("redis://127.0.0.1:1")
+    quota = TokenQuota(client, tokens_per_minute=100, tokens_per_day=1000)
+
+    reservation = await quota.reserve("user:alice", 80)
+    assert reservation.granted
+    assert reservation.keys == []
+    assert quota.headers(reservation) == {}
+    assert await quota.settle(reservation, 25) is reservation
+
+    # A reservation made before Redis went away is left as it was
+    held = TokenReservation(keys=["token_quota:user:alice:minute:0"], tokens=80, granted=True)
+    assert (await quota.settle(held, 25)).tokens == 80
+    await client.aclose()
@@ -0,0 +1,108 @@
+"""Tests for dynamic request batching."""
+import asyncio
+import threading
+import pytest
+from backend.batching import BatchScheduler
+
+def make_recorder():
+    """Return a batch function that echoes prompts and records batch sizes."""
+    batches = []
+
+    def process_batch(prompts, options):
+        batches.append(list(prompts))
+        return [prompt.upper() for prompt in prompts]
+
+    return process_batch, batches
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_a_batch():
+    """Test requests arriving together are generated together."""
+    process_batch, batches = make_recorder()
+    scheduler = BatchScheduler(process_batch, max_batch_size=8, max_wait_ms=50)
+
+    results = await asyncio.gather(*(scheduler.submit(f"p{i}") for i in range(5)))
+
+    assert results == [f"P{i}" for i in range(5)]
+    assert len(batches) == 1
+    assert len(batches[0]) == 5
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_batch_size_cap():
+    """Test a batch is closed once it reaches the size cap."""
+    process_batch, batches = make_recorder()
+    scheduler = BatchScheduler(process_batch, max_batch_size=2, max_wait_ms=50)
+
+    results = await asyncio.gather(*(scheduler.submit(str(i)) for i in range(5)))
+
+    assert results == [str(i) for i in range(5)]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_max_wait_deadline():
+    """Test a lone request is not held longer than the wait deadline."""
+    process_batch, batches = make_recorder()
+    scheduler = BatchScheduler(process_batch, max_batch_size=8, max_wait_ms=20)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    assert await scheduler.submit("only") == "ONLY"
+    assert loop.time() - start < 1.0
+    assert batches == [["only"]]
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_batch_errors_reach_every_caller():
+    """Test a failing batch raises in every waiting caller."""
+    def failing_batch(prompts, options):
+        raise RuntimeError("model exploded")
+
+    scheduler = BatchScheduler(failing_batch, max_batch_size=4, max_wait_ms=20)
+    results = await asyncio.gather(
+        scheduler.submit("a"), scheduler.submit("b"), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_batches_run_off_the_event_loop():
+    """Test the batch function is not executed on the event loop thread."""
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def process_batch(prompts, options):
+        threads.append(threading.get_ident())
+        return prompts
+
+    scheduler = BatchScheduler(process_batch, max_wait_ms=0)
+    await scheduler.submit("x")
+    assert threads and threads[0] != loop_thread
+    await scheduler.close()
+
+def test_generate_batch_matches_single_generation(tiny_llm_manager):
+    """Test padding does not change a prompt's greedy output."""
+    prompts = ["hi", "a much longer prompt than the first one"]
+    batched = tiny_llm_manager.generate_batch(prompts)
+    single = [tiny_llm_manager.generate_batch([prompt])[0] for prompt in prompts]
+    assert batched == single
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_batcher(tiny_llm_manager):
+    """Test concurrent generate_response calls are batched."""
+    sizes = []
+    original = tiny_llm_manager.generate_batch
+
+    def recording_batch(messages, options):
+        sizes.append(len(messages))
+        return original(messages, options)
+
+    tiny_llm_manager.batcher.process_batch = recording_batch
+    tiny_llm_manager.batcher.max_wait = 0.05
+    responses = await asyncio.gather(
+        *(tiny_llm_manager.generate_response(f"hello {i}") for i in range(3))
+    )
+    assert len(responses) == 3
+    assert all(response.role == "assistant" for response in responses)
+    assert sizes == [3]
+    await tiny_llm_manager.batcher.close()
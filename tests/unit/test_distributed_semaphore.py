@@ -0,0 +1,85 @@
+"""Tests for the cluster-wide concurrency limiter."""
+import asyncio
+import pytest
+import redis.asyncio as aioredis
+from backend.distributed_semaphore import ConcurrencyLimitExceeded, DistributedSemaphore
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def replicas(count, **kwargs):
+    """Semaphores of ``count`` replicas sharing one in-memory Redis."""
+    server = fakeredis.FakeServer()
+    kwargs.setdefault("max_wait_seconds", 0)
+    return [DistributedSemaphore(fakeredis.FakeAsyncRedis(server=server), **kwargs) for _ in range(count)]
+
+@pytest.mark.asyncio
+async def test_slots_are_capped_across_replicas():
+    """Test the global and per-user caps hold across replicas and are reported."""
+    first, second = replicas(2, max_holders=2, max_per_user=1)
+    async with first.slot("alice"):
+        with pytest.raises(ConcurrencyLimitExceeded) as exc:
+            await second.slot("alice").__aenter__()
+        assert exc.value.per_user
+
+        async with second.slot("bob"):
+            with pytest.raises(ConcurrencyLimitExceeded) as exc:
+                await second.slot("carol").__aenter__()
+            assert not exc.value.per_user
+            assert await first.holders() == {"total": 2, "users": {"alice": 1, "bob": 1}}
+            assert first.stats()["held"] == second.stats()["held"] == 1
+        assert second.stats()["rejected"] == 2
+
+    assert (await first.holders())["total"] == 0
+
+@pytest.mark.asyncio
+async def test_waiters_get_released_slots():
+    """Test a request waits briefly for a slot instead of failing at once."""
+    first, second = replicas(2, max_holders=1, max_wait_seconds=1.0, poll_interval_seconds=0.01)
+    release = asyncio.Event()
+
+    async def hold():
+        async with first.slot("alice"):
+            await release.wait()
+
+    holding = asyncio.ensure_future(hold())
+    await asyncio.sleep(0.01)
+    slot = second.slot("bob")
+    waiting = asyncio.ensure_future(slot.__aenter__())
+    await asyncio.sleep(0.03)
+    assert second.stats()["waiting"] == 1
+
+    release.set()
+    await asyncio.gather(holding, waiting)
+    stats = second.stats()
+    assert stats["held"] == 1 and stats["waiting"] == 0
+    assert stats["wait"]["max_ms"] > 0
+    await slot.__aexit__(None, None, None)
+    assert (await second.holders())["total"] == 0
+
+@pytest.mark.asyncio
+async def test_leases_are_renewed_while_held_and_expire_when_abandoned():
+    """Test a running holder keeps its slot while a dead replica's slot frees itself."""
+    first, second = replicas(2, max_holders=1, lease_seconds=0.06)
+    async with first.slot("alice"):
+        await asyncio.sleep(0.15)
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await second.slot("bob").__aenter__()
+    assert first.stats()["leases_lost"] == 0
+
+    # A replica that dies holding a slot never releases or renews it
+    assert await second._try_acquire(second._keys("bob"), "bob:dead") == 1
+    with pytest.raises(ConcurrencyLimitExceeded):
+        await first.slot("alice").__aenter__()
+    await asyncio.sleep(0.1)
+    async with first.slot("alice"):
+        pass
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_runs_without_a_slot():
+    """Test requests are not failed when Redis cannot be reached."""
+    semaphore = DistributedSemaphore(aioredis.Redis.from_url("redis://127.0.0.1:1"), max_holders=1)
+    async with semaphore.slot("alice"):
+        pass
+    assert semaphore.stats()["errors"] == 1
+    assert await semaphore.holders() is None
+    await semaphore.redis.aclose()
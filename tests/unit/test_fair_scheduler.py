@@ -0,0 +1,131 @@
+"""Tests for fair scheduling of generation requests."""
+import asyncio
+import pytest
+from backend.fair_scheduler import FairScheduler
+from backend.generation_control import CancellationToken, GenerationCancelled, GenerationOptions
+from backend.inference_pool import InferenceQueueFull
+
+async def admission_order(scheduler, requests):
+    """Queue ``(name, user, role)`` requests behind a held slot and return the order they run in."""
+    order = []
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.slot("blocker"):
+            await release.wait()
+
+    async def request(name, user, role):
+        async with scheduler.slot(user, role):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    holding = asyncio.ensure_future(blocker())
+    await asyncio.sleep(0)
+    tasks = []
+    for name, user, role in requests:
+        tasks.append(asyncio.ensure_future(request(name, user, role)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holding, *tasks)
+    return order
+
+@pytest.mark.asyncio
+async def test_heavy_user_does_not_starve_others():
+    """Test a user arriving behind another user's backlog is served next."""
+    scheduler = FairScheduler(max_concurrent=1)
+    order = await admission_order(
+        scheduler,
+        [(f"heavy-{index}", "heavy", "user") for index in range(5)] + [("light", "light", "user")]
+    )
+    assert order == ["heavy-0", "light", "heavy-1", "heavy-2", "heavy-3", "heavy-4"]
+
+@pytest.mark.asyncio
+async def test_roles_get_weighted_shares():
+    """Test a backlogged admin gets four slots for every one of a backlogged user."""
+    scheduler = FairScheduler(max_concurrent=1)
+    order = await admission_order(
+        scheduler,
+        [(f"user-{index}", "bob", "user") for index in range(3)]
+        + [(f"admin-{index}", "alice", "admin") for index in range(5)]
+    )
+    assert order == ["user-0", "admin-0", "admin-1", "admin-2", "admin-3", "user-1", "admin-4", "user-2"]
+
+    stats = scheduler.stats()
+    assert stats["classes"]["admin"]["admitted"] == 5
+    assert stats["classes"]["user"]["queue_wait"]["count"] == 4
+    assert stats["active"] == stats["waiting"] == stats["users"] == 0
+
+@pytest.mark.asyncio
+async def test_per_user_in_flight_cap():
+    """Test a user over their cap waits while other users are admitted."""
+    scheduler = FairScheduler(max_concurrent=4, max_in_flight_per_user=1)
+    release = asyncio.Event()
+    running = []
+
+    async def request(user):
+        async with scheduler.slot(user):
+            running.append(user)
+            await release.wait()
+
+    tasks = [asyncio.ensure_future(request(user)) for user in ["x", "x", "x", "y"]]
+    await asyncio.sleep(0.01)
+    assert running == ["x", "y"]
+    assert scheduler.stats()["classes"]["user"]["waiting"] == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert running == ["x", "y", "x", "x"]
+
+@pytest.mark.asyncio
+async def test_waiting_is_bounded_and_cancellable():
+    """Test waits end on the request's token and a full queue rejects new requests."""
+    scheduler = FairScheduler(max_concurrent=1, max_waiting=1)
+    async with scheduler.slot("alice"):
+        with pytest.raises(GenerationCancelled):
+            await scheduler.slot("bob", token=CancellationToken(timeout=0.01)).__aenter__()
+        assert scheduler.stats()["waiting"] == 0
+
+        waiting = asyncio.ensure_future(scheduler.slot("bob").__aenter__())
+        await asyncio.sleep(0)
+        with pytest.raises(InferenceQueueFull):
+            await scheduler.slot("carol").__aenter__()
+        assert scheduler.stats()["rejected"] == 1
+    await waiting
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped_when_slot_frees():
+    """Test a wait cancelled in the same loop iteration the slot is released is not admitted."""
+    scheduler = FairScheduler(max_concurrent=1)
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("alice"):
+            await release.wait()
+
+    holding = asyncio.ensure_future(holder())
+    await asyncio.sleep(0)
+    token = CancellationToken()
+    waiting = asyncio.ensure_future(scheduler.slot("bob", token=token).__aenter__())
+    await asyncio.sleep(0)
+
+    token.cancel("client disconnected")
+    release.set()
+    await holding
+    with pytest.raises(GenerationCancelled):
+        await waiting
+    stats = scheduler.stats()
+    assert stats["active"] == 0
+    assert stats["waiting"] == 0
+    assert stats["users"] == 0
+
+@pytest.mark.asyncio
+async def test_manager_schedules_requests_by_user(tiny_llm_manager):
+    """Test generation and streams hold a slot of the requesting user's class."""
+    options = GenerationOptions(max_new_tokens=4, user_id="alice", role="admin")
+    await tiny_llm_manager.generate_response("hello", options=options)
+    chunks = [chunk async for chunk in tiny_llm_manager.stream_response("hello", options)]
+    assert chunks
+
+    stats = tiny_llm_manager.inference_stats()["scheduler"]
+    assert stats["classes"]["admin"]["admitted"] == 2
+    assert stats["active"] == 0
@@ -0,0 +1,134 @@
+"""Tests for per-request token budgets, stop sequences and cancellation."""
+import asyncio
+import time
+import httpx
+import pytest
+from backend.config import BackendConfig, LLMConfig
+from backend.generation_control import (
+    CancellationToken, GenerationCancelled, GenerationOptions, StopSequenceFilter,
+    await_cancellable, truncate_at_stop
+)
+from backend.llm_backends import create_backend
+from tests.fake_llm_server import create_app
+
+def test_token_deadline_and_callbacks():
+    """Test a token fires on its deadline and runs its callbacks once."""
+    calls = []
+    token = CancellationToken(timeout=0.05)
+    token.add_callback(lambda: calls.append("cancelled"))
+    assert not token.cancelled
+
+    time.sleep(0.06)
+    assert token.cancelled
+    assert token.reason == "deadline exceeded"
+    token.cancel("again")
+    assert calls == ["cancelled"]
+    with pytest.raises(GenerationCancelled):
+        token.raise_if_cancelled()
+
+def test_stop_sequences():
+    """Test text is cut before the earliest stop sequence, also when streamed."""
+    assert truncate_at_stop("Hello. World\nBye", ["\n", "."]) == ("Hello", True)
+    assert truncate_at_stop("Hello", ["END"]) == ("Hello", False)
+
+    stop_filter = StopSequenceFilter(["END"])
+    emitted = [stop_filter.push(chunk) for chunk in ["Hel", "lo E", "N", "D and more"]]
+    assert emitted == ["Hel", "lo ", "", ""]
+    assert stop_filter.stopped
+
+    stop_filter = StopSequenceFilter(["END"])
+    assert stop_filter.push("The E") == "The "
+    assert stop_filter.flush() == "E"
+
+def generate_with_max_length(manager, prompt, max_length):
+    """Generate with a different server-wide token limit."""
+    config = manager.config
+    manager.config = config.model_copy(update={"max_length": max_length})
+    try:
+        return manager.generate_batch([prompt])[0]
+    finally:
+        manager.config = config
+
+def test_per_request_token_budget(tiny_llm_manager):
+    """Test each row of a batch stops at its own max_new_tokens."""
+    full, short = tiny_llm_manager.generate_batch(
+        ["hello there", "hello there"],
+        [None, GenerationOptions(max_new_tokens=3)]
+    )
+    assert full == generate_with_max_length(tiny_llm_manager, "hello there", 48)
+    assert short == generate_with_max_length(tiny_llm_manager, "hello there", 3)
+    assert len(full) > len(short)
+
+def test_stop_sequence_ends_generation(tiny_llm_manager):
+    """Test generation stops at a stop sequence, which is not returned."""
+    full = tiny_llm_manager.generate_batch(["hello there"])[0]
+    stop = full[4:6]
+    stopped = tiny_llm_manager.generate_batch(["hello there"], [GenerationOptions(stop=[stop])])[0]
+    assert stopped == truncate_at_stop(full, [stop])[0]
+
+def test_cancelled_request_stops_immediately(tiny_llm_manager):
+    """Test a cancelled row generates no tokens while its batch mate continues."""
+    token = CancellationToken()
+    token.cancel("client disconnected")
+    alive, cancelled = tiny_llm_manager.generate_batch(
+        ["hello there", "hello there"],
+        [None, GenerationOptions(cancel=token)]
+    )
+    assert alive == generate_with_max_length(tiny_llm_manager, "hello there", 48)
+    # The stopping criteria run after each token, so at most one is produced
+    assert cancelled == generate_with_max_length(tiny_llm_manager, "hello there", 1)
+
+@pytest.mark.asyncio
+async def test_deadline_raises(tiny_llm_manager):
+    """Test a request past its deadline raises instead of returning a reply."""
+    options = GenerationOptions(cancel=CancellationToken(timeout=0.0))
+    with pytest.raises(GenerationCancelled) as exc_info:
+        await tiny_llm_manager.generate_response("hello", options=options)
+    assert exc_info.value.reason == "deadline exceeded"
+
+@pytest.mark.asyncio
+async def test_abandoned_caller_cancels_token():
+    """Test cancelling the awaiting task cancels the token behind it."""
+    token = CancellationToken()
+    waiter = asyncio.ensure_future(await_cancellable(asyncio.sleep(10), token))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert token.cancelled
+    assert token.reason == "caller went away"
+
+@pytest.mark.asyncio
+async def test_closing_stream_cancels_generation(tiny_llm_manager):
+    """Test closing a stream early cancels its token."""
+    options = GenerationOptions(cancel=CancellationToken())
+    stream = tiny_llm_manager.stream_response("hello there", options)
+    await stream.__anext__()
+    await stream.aclose()
+    assert options.cancel.cancelled
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name,field", [
+    ("openai", ("stop",)),
+    ("anthropic", ("stop_sequences",)),
+    ("ollama", ("options", "stop"))
+])
+async def test_remote_limits_are_forwarded(name, field):
+    """Test remote backends receive the request's budget and stop sequences."""
+    server = create_app()
+    backend = create_backend(
+        name,
+        BackendConfig(model_name="model", api_base="http://fake/v1" if name == "openai" else "http://fake"),
+        generation=LLMConfig(max_length=16),
+        transport=httpx.ASGITransport(app=server)
+    )
+    await backend.generate([{"role": "user", "content": "hi"}], max_tokens=64, stop=["\n"])
+    body = server.state.requests[0]["body"]
+
+    value = body
+    for key in field:
+        value = value[key]
+    assert value == ["\n"]
+    budget = body["options"]["num_predict"] if name == "ollama" else body["max_tokens"]
+    assert budget == 16
+    await backend.close()
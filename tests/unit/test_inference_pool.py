@@ -0,0 +1,73 @@
+"""Tests for the bounded inference worker pool."""
+import asyncio
+import threading
+import pytest
+from backend.app import inference_queue_full_handler
+from backend.inference_pool import InferencePool, InferenceQueueFull
+
+@pytest.mark.asyncio
+async def test_run_executes_off_event_loop():
+    """Test work runs on a pool thread and returns its result."""
+    pool = InferencePool(max_workers=1, max_queue_size=4)
+    loop_thread = threading.get_ident()
+    result = await pool.run(lambda: threading.get_ident())
+    assert result != loop_thread
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive():
+    """Test the loop keeps running while a blocking job is in progress."""
+    pool = InferencePool(max_workers=1, max_queue_size=4)
+    release = threading.Event()
+    job = asyncio.ensure_future(pool.run(release.wait, 5))
+
+    # The loop is free to run other coroutines while the job blocks
+    await asyncio.sleep(0.01)
+    assert not job.done()
+    release.set()
+    assert await job is True
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected():
+    """Test submissions beyond the queue bound fail fast."""
+    pool = InferencePool(max_workers=1, max_queue_size=1, retry_after_seconds=7)
+    release = threading.Event()
+    running = asyncio.ensure_future(pool.run(release.wait, 5))
+    await asyncio.sleep(0.05)
+    queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(InferenceQueueFull) as exc_info:
+        await pool.run(lambda: "rejected")
+    assert exc_info.value.retry_after == 7
+
+    stats = pool.stats()
+    assert stats["queue_depth"] == 1
+    assert stats["active"] == 1
+    assert stats["rejected"] == 1
+
+    release.set()
+    assert await running is True
+    assert await queued == "queued"
+    assert pool.stats()["queue_wait"]["count"] == 2
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_exceptions_propagate():
+    """Test errors raised in a worker reach the caller."""
+    pool = InferencePool()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await pool.run(fail)
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_queue_full_handler_returns_503():
+    """Test overload is reported as 503 with a Retry-After header."""
+    response = await inference_queue_full_handler(None, InferenceQueueFull(retry_after=3))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
@@ -0,0 +1,95 @@
+"""Tests for per-conversation key/value cache reuse."""
+import threading
+import torch
+from backend.kv_cache import ConversationKVCache, cache_nbytes
+
+def fake_cache(num_tokens: int):
+    """Build a legacy-format cache of 2 layers holding float32 tensors."""
+    return tuple(
+        (torch.zeros(1, 2, num_tokens, 4), torch.zeros(1, 2, num_tokens, 4))
+        for _ in range(2)
+    )
+
+def test_cache_nbytes():
+    """Test cache size accounts for every key and value tensor."""
+    assert cache_nbytes(fake_cache(10)) == 4 * (2 * 10 * 4) * 4
+
+def test_lru_eviction_under_budget():
+    """Test least recently used conversations are evicted first."""
+    entry_size = cache_nbytes(fake_cache(10))
+    store = ConversationKVCache(max_bytes=entry_size * 2)
+    ids = torch.zeros(1, 10, dtype=torch.long)
+
+    store.put("a", ids, fake_cache(10))
+    store.put("b", ids, fake_cache(10))
+    # Using "a" makes "b" the least recently used entry
+    store.put("a", ids, store.pop("a").past_key_values)
+    store.put("c", ids, fake_cache(10))
+
+    assert "a" in store and "c" in store and "b" not in store
+    stats = store.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+def test_oversized_entry_is_not_stored():
+    """Test a cache bigger than the whole budget is dropped."""
+    store = ConversationKVCache(max_bytes=16)
+    store.put("big", torch.zeros(1, 10, dtype=torch.long), fake_cache(10))
+    assert len(store) == 0
+
+def test_second_turn_matches_full_prefill(tiny_llm_manager):
+    """Test reusing the cache gives the same reply as re-encoding the history."""
+    manager = tiny_llm_manager
+    manager.generate_with_history("conv", "hello there")
+    history = manager.kv_cache._entries["conv"].token_ids
+    cached_tokens = history.shape[-1]
+
+    reply = manager.generate_with_history("conv", "how are you?")
+
+    # Recompute the second turn from scratch without any cache
+    eos = manager.tokenizer.eos_token
+    if history[0, -1].item() != manager.tokenizer.eos_token_id:
+        history = torch.cat([history, torch.tensor([[manager.tokenizer.eos_token_id]])], dim=-1)
+    new_ids = manager.tokenizer.encode("how are you?" + eos, return_tensors="pt")
+    full_ids = torch.cat([history, new_ids], dim=-1)
+    expected = manager.model.generate(
+        full_ids, attention_mask=torch.ones_like(full_ids), **manager._generation_kwargs()
+    )
+    assert reply == manager.tokenizer.decode(
+        expected[0, full_ids.shape[-1]:], skip_special_tokens=True
+    )
+
+    stats = manager.kv_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["prefill_tokens_saved"] == cached_tokens
+
+def test_concurrent_turns_wait_for_the_cache(tiny_llm_manager):
+    """Test a turn started while another is generating continues from its cache."""
+    manager = tiny_llm_manager
+    manager.generate_with_history("conv", "hello there")
+
+    threads = [
+        threading.Thread(target=manager.generate_with_history, args=("conv", message))
+        for message in ["how are you?", "what is new?"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = manager.kv_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert not manager.kv_cache._conversation_locks
+
+def test_truncated_turn_saves_no_prefill(tiny_llm_manager, monkeypatch):
+    """Test a cache dropped because the context is full is not counted as saved prefill."""
+    manager = tiny_llm_manager
+    manager.generate_with_history("conv", "hello there")
+    monkeypatch.setattr(manager, "_context_limit", lambda: 4)
+
+    manager.generate_with_history("conv", "how are you?")
+
+    stats = manager.kv_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["prefill_tokens_saved"] == 0
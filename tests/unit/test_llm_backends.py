@@ -0,0 +1,103 @@
+"""Tests for the remote LLM backends against the fake server."""
+import asyncio
+import httpx
+import pytest
+from backend.config import BackendConfig, LLMConfig
+from backend.inference_pool import InferenceQueueFull
+from backend.llm_backends import BackendError, create_backend
+from backend.llm_manager import ChatMessage, LLMManager
+from tests.fake_llm_server import create_app
+
+BACKEND_BASES = {
+    "openai": "http://fake/v1",
+    "anthropic": "http://fake",
+    "ollama": "http://fake"
+}
+
+def make_backend(name, server, **config):
+    return create_backend(
+        name,
+        BackendConfig(model_name=f"{name}-model", api_base=BACKEND_BASES[name], api_key="key", **config),
+        generation=LLMConfig(temperature=0.0, max_length=16),
+        transport=httpx.ASGITransport(app=server)
+    )
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", ["openai", "anthropic", "ollama"])
+async def test_generate_and_stream(name):
+    """Test each backend parses complete and streamed replies."""
+    server = create_app()
+    backend = make_backend(name, server)
+    messages = [{"role": "user", "content": "hello there"}]
+
+    assert await backend.generate(messages) == "Echo: hello there"
+    chunks = [chunk async for chunk in backend.stream(messages)]
+    assert chunks == ["Echo:", " hello", " there"]
+
+    body = server.state.requests[0]["body"]
+    assert body["model"] == f"{name}-model"
+    assert body["messages"] == messages
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_credentials_are_sent():
+    """Test API keys are sent in each API's own header."""
+    server = create_app()
+    openai = make_backend("openai", server, organization_id="org")
+    anthropic = make_backend("anthropic", server)
+    await openai.generate([{"role": "user", "content": "hi"}])
+    await anthropic.generate([{"role": "user", "content": "hi"}])
+
+    openai_headers, anthropic_headers = (request["headers"] for request in server.state.requests)
+    assert openai_headers["authorization"] == "Bearer key"
+    assert openai_headers["openai-organization"] == "org"
+    assert anthropic_headers["x-api-key"] == "key"
+    assert "anthropic-version" in anthropic_headers
+    await openai.close()
+    await anthropic.close()
+
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    """Test no more than max_concurrency requests are in flight at once."""
+    server = create_app(delay=0.05)
+    backend = make_backend("ollama", server, max_concurrency=2)
+    await asyncio.gather(*(backend.generate([{"role": "user", "content": "hi"}]) for _ in range(6)))
+
+    assert server.state.max_in_flight == 2
+    assert backend.stats()["requests"] == 6
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_upstream_errors():
+    """Test overload becomes backpressure and other failures a BackendError."""
+    server = create_app()
+    backend = make_backend("openai", server)
+    server.state.status_code = 429
+    with pytest.raises(InferenceQueueFull) as exc_info:
+        await backend.generate([{"role": "user", "content": "hi"}])
+    assert exc_info.value.retry_after == 7
+
+    server.state.status_code = 500
+    with pytest.raises(BackendError):
+        await backend.generate([{"role": "user", "content": "hi"}])
+    assert backend.stats()["errors"] == 1
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_manager_delegates_to_backend():
+    """Test LLMManager sends conversation history to a remote backend."""
+    server = create_app()
+    manager = LLMManager(backend=make_backend("anthropic", server), load=False)
+    assert manager.is_loaded
+    assert manager.model_name == "anthropic-model"
+
+    await manager.chat(ChatMessage(role="user", content="first"), user_id="alice", conversation_id="c")
+    reply = await manager.chat(ChatMessage(role="user", content="second"), user_id="alice", conversation_id="c")
+
+    assert reply.content == "Echo: second"
+    assert [message["role"] for message in server.state.requests[-1]["body"]["messages"]] == [
+        "user", "assistant", "user"
+    ]
+    chunks = [chunk async for chunk in manager.stream_response("streamed")]
+    assert "".join(chunks) == "Echo: streamed"
+    await manager.close()
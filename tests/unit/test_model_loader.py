@@ -0,0 +1,76 @@
+"""Tests for background model loading and readiness."""
+import pytest
+from backend.app import app
+from backend.config import LLMConfig
+from backend.llm_manager import LLMManager
+from backend.model_loader import ModelLoader
+from tests.conftest import build_tiny_model, build_tiny_tokenizer
+
+@pytest.fixture
+def tiny_model_dir(tmp_path):
+    """Save a tiny model and tokenizer in safetensors format."""
+    tokenizer = build_tiny_tokenizer()
+    build_tiny_model(tokenizer).save_pretrained(tmp_path)
+    tokenizer.save_pretrained(tmp_path)
+    return str(tmp_path)
+
+def make_manager(model_name: str) -> LLMManager:
+    return LLMManager(
+        model_name=model_name,
+        config=LLMConfig(temperature=0.0, max_length=8),
+        load=False
+    )
+
+@pytest.mark.asyncio
+async def test_background_load_and_warm_up(tiny_model_dir):
+    """Test the loader walks through every stage and records timings."""
+    manager = make_manager(tiny_model_dir)
+    loader = ModelLoader(manager, budget_seconds=60)
+    assert not manager.is_loaded
+    assert loader.status()["stage"] == "pending"
+
+    stages = []
+    original = loader._enter_stage
+    loader._enter_stage = lambda stage: (stages.append(stage), original(stage))
+    loader.start()
+    await loader.wait()
+
+    assert stages == ["loading_tokenizer", "loading_model", "warming_up", "ready"]
+    status = loader.status()
+    assert status["ready"] is True
+    assert status["progress"] == 1.0
+    assert status["within_budget"] is True
+    assert set(status["timings"]) == {"tokenizer_seconds", "model_seconds", "warm_up_seconds"}
+    assert manager.is_loaded
+    await manager.close()
+
+@pytest.mark.asyncio
+async def test_failed_load_is_reported():
+    """Test a load error leaves the loader in the failed stage."""
+    manager = make_manager("/nonexistent/model")
+    loader = ModelLoader(manager)
+    loader.start()
+    await loader.wait()
+
+    status = loader.status()
+    assert status["ready"] is False
+    assert status["stage"] == "failed"
+    assert "error" in status
+    await manager.close()
+
+def test_ready_endpoint(client, tiny_model_dir):
+    """Test /ready returns 503 while loading and 200 once ready."""
+    loader = ModelLoader(make_manager(tiny_model_dir))
+    app.state.model_loader = loader
+    try:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["stage"] == "pending"
+
+        loader.manager.load()
+        loader.stage = "ready"
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+    finally:
+        del app.state.model_loader
@@ -0,0 +1,115 @@
+"""Tests for the on-demand model registry."""
+import asyncio
+import pytest
+from backend.config import LLMConfig
+from backend.inference_pool import InferencePool
+from backend.llm_manager import LLMManager
+from backend.model_registry import ModelLoadError, ModelNotAllowed, ModelRegistry
+from tests.conftest import build_tiny_model, build_tiny_tokenizer
+
+@pytest.fixture
+def model_dirs(tmp_path):
+    """Save three tiny models the registry can load by path."""
+    tokenizer = build_tiny_tokenizer()
+    paths = []
+    for name in ("model-a", "model-b", "model-c"):
+        path = tmp_path / name
+        build_tiny_model(tokenizer).save_pretrained(path)
+        tokenizer.save_pretrained(path)
+        paths.append(str(path))
+    return paths
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(max_workers=1, max_queue_size=8)
+    yield pool
+    pool.shutdown(wait=False)
+
+def make_registry(pool, allowed, max_bytes=1 << 30):
+    loads = []
+
+    def factory(model_name: str) -> LLMManager:
+        loads.append(model_name)
+        return LLMManager(
+            model_name=model_name,
+            config=LLMConfig(temperature=0.0, max_length=8),
+            pool=pool,
+            load=False
+        )
+
+    registry = ModelRegistry(factory, max_bytes=max_bytes, allowed_models=allowed)
+    return registry, loads
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_load(pool, model_dirs):
+    """Test concurrent requests for the same model load it once."""
+    registry, loads = make_registry(pool, model_dirs)
+    managers = await asyncio.gather(*(registry.get(model_dirs[0]) for _ in range(5)))
+
+    assert loads == [model_dirs[0]]
+    assert all(manager is managers[0] for manager in managers)
+    assert managers[0].is_loaded
+    await registry.close()
+
+@pytest.mark.asyncio
+async def test_least_recently_used_model_is_evicted(pool, model_dirs):
+    """Test models are evicted in LRU order once the budget is exceeded."""
+    registry, _ = make_registry(pool, model_dirs)
+    first = await registry.get(model_dirs[0])
+    # Room for two models but not three
+    registry.max_bytes = int(first.memory_footprint() * 2.5)
+
+    await registry.get(model_dirs[1])
+    await registry.get(model_dirs[0])
+    await registry.get(model_dirs[2])
+
+    stats = registry.stats()
+    assert set(stats["resident"]) == {model_dirs[0], model_dirs[2]}
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    await registry.close()
+
+@pytest.mark.asyncio
+async def test_pinned_default_model_is_kept(pool, model_dirs):
+    """Test the registered default model is never evicted."""
+    registry, _ = make_registry(pool, model_dirs[1:], max_bytes=1)
+    default = LLMManager(model_name=model_dirs[0], pool=pool, load=False)
+    default.load()
+    registry.register(default)
+
+    assert await registry.get() is default
+    await registry.get(model_dirs[1])
+    await registry.get(model_dirs[2])
+
+    assert set(registry.stats()["resident"]) == {model_dirs[0], model_dirs[2]}
+    await registry.close()
+
+@pytest.mark.asyncio
+async def test_unknown_model_is_rejected(pool, model_dirs):
+    """Test models outside the allow list are not loaded."""
+    registry, loads = make_registry(pool, model_dirs[:1])
+    with pytest.raises(ModelNotAllowed):
+        await registry.get("gpt2-xl")
+    assert loads == []
+
+@pytest.mark.asyncio
+async def test_model_evicted_in_use_closes_after_release(pool, model_dirs):
+    """Test a model evicted mid-request stays usable until the request ends."""
+    registry, _ = make_registry(pool, model_dirs)
+    async with registry.acquire(model_dirs[0]) as manager:
+        registry.max_bytes = 1
+        await registry.get(model_dirs[1])
+        assert model_dirs[0] not in registry.stats()["resident"]
+        assert manager.is_loaded
+    assert not manager.is_loaded
+    await registry.close()
+
+@pytest.mark.asyncio
+async def test_failed_load_can_be_retried(pool, tmp_path):
+    """Test a failed load raises and does not stay cached."""
+    missing = str(tmp_path / "missing")
+    registry, loads = make_registry(pool, [missing])
+    for _ in range(2):
+        with pytest.raises(ModelLoadError):
+            await registry.get(missing)
+    assert loads == [missing, missing]
@@ -0,0 +1,69 @@
+"""Tests for ONNX Runtime inference."""
+import pytest
+from backend import onnx_runtime
+from backend.config import LLMConfig
+from backend.llm_manager import LLMManager
+from backend.onnx_runtime import export_cache_path
+from tests.conftest import build_tiny_model, build_tiny_tokenizer
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnxscript")
+
+CONFIG = LLMConfig(temperature=0.0, max_length=16, repetition_penalty=1.2)
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    """Save the tiny model so it can be exported."""
+    path = tmp_path_factory.mktemp("tiny-model")
+    tokenizer = build_tiny_tokenizer()
+    tokenizer.save_pretrained(path)
+    build_tiny_model(tokenizer).save_pretrained(path)
+    return str(path)
+
+@pytest.fixture(scope="module")
+def onnx_cache_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("onnx-cache"))
+
+@pytest.fixture(scope="module")
+def managers(model_path, onnx_cache_dir):
+    """A torch manager and an ONNX Runtime manager of the same model."""
+    torch_manager = LLMManager(model_name=model_path, config=CONFIG)
+    onnx_manager = LLMManager(
+        model_name=model_path, config=CONFIG, runtime="onnxruntime", onnx_cache_dir=onnx_cache_dir
+    )
+    return torch_manager, onnx_manager
+
+@pytest.mark.asyncio
+async def test_generation_matches_torch(managers):
+    """Test batched, multi-turn and streamed replies are those of the torch model."""
+    torch_manager, onnx_manager = managers
+    prompts = ["hello there", "hi", "what is the weather like?"]
+    assert onnx_manager.generate_batch(prompts) == torch_manager.generate_batch(prompts)
+
+    for message in ["first", "second"]:
+        expected = torch_manager.generate_with_history("c", message)
+        assert onnx_manager.generate_with_history("c", message) == expected
+
+    expected = "".join([chunk async for chunk in torch_manager.stream_response("tell me a story")])
+    assert "".join([chunk async for chunk in onnx_manager.stream_response("tell me a story")]) == expected
+    assert onnx_manager.memory_footprint() > 0
+
+def test_exported_graph_is_reused(managers, model_path, onnx_cache_dir, monkeypatch):
+    """Test a second load uses the cached graph, keyed by model version."""
+    _, onnx_manager = managers
+
+    def fail_export(*args, **kwargs):
+        raise AssertionError("the cached graph should have been used")
+
+    monkeypatch.setattr(onnx_runtime, "export_onnx", fail_export)
+    reloaded = LLMManager(
+        model_name=model_path, config=CONFIG, runtime="onnxruntime", onnx_cache_dir=onnx_cache_dir
+    )
+    assert reloaded.model.path == onnx_manager.model.path
+    assert reloaded.generate_batch(["hello there"]) == onnx_manager.generate_batch(["hello there"])
+
+    config = onnx_manager.model.config
+    path = export_cache_path(onnx_cache_dir, model_path, config)
+    assert path == onnx_manager.model.path
+    assert export_cache_path(onnx_cache_dir, model_path, config, precision="int8") != path
+    assert export_cache_path(onnx_cache_dir, "other-model", config) != path
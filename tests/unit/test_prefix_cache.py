@@ -0,0 +1,76 @@
+"""Tests for shared prompt prefix key/value caching."""
+import pytest
+from backend.pr_reviewer import REVIEW_PREAMBLE, PRReviewer
+
+PREFIX = "You are a helpful assistant. Answer politely and briefly.\n"
+
+def count_prefill_tokens(manager):
+    """Record how many prompt tokens the model's first forward pass processes."""
+    seen = []
+
+    def hook(module, args, kwargs):
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        if input_ids is not None:
+            seen.append(input_ids.shape[-1])
+
+    handle = manager.model.register_forward_pre_hook(hook, with_kwargs=True)
+    return seen, handle
+
+def test_prefix_reuse_keeps_output(tiny_llm_manager):
+    """Test a prompt starting with a registered prefix only prefills its suffix."""
+    prompt = PREFIX + "What is the capital of France?"
+    expected = tiny_llm_manager.generate_batch([prompt])[0]
+
+    tiny_llm_manager.register_prefix(PREFIX)
+    seen, handle = count_prefill_tokens(tiny_llm_manager)
+    assert tiny_llm_manager.generate_batch([prompt])[0] == expected
+    handle.remove()
+
+    prefix_tokens = len(tiny_llm_manager.tokenizer.encode(PREFIX))
+    prompt_tokens = len(tiny_llm_manager.tokenizer.encode(prompt)) + 1
+    # The prefix is prefilled once, then the request prefills only the rest
+    assert seen[0] == prefix_tokens
+    assert seen[1] == prompt_tokens - prefix_tokens
+
+    stats = tiny_llm_manager.inference_stats()["prefix_cache"]
+    assert stats["prefixes"] == 1
+    assert stats["hits"] == 1
+    assert stats["prefill_tokens_saved"] == prefix_tokens
+
+def test_other_prompts_are_unaffected(tiny_llm_manager):
+    """Test prompts without the prefix, and batches, generate as before."""
+    prompts = ["Hello there", PREFIX + "Hi"]
+    expected = tiny_llm_manager.generate_batch(prompts)
+    single = tiny_llm_manager.generate_batch(["Hello there"])[0]
+
+    tiny_llm_manager.register_prefix(PREFIX)
+    assert tiny_llm_manager.generate_batch(prompts) == expected
+    assert tiny_llm_manager.generate_batch(["Hello there"])[0] == single
+
+    stats = tiny_llm_manager.prefix_cache.stats()
+    assert stats["hits"] == 0
+    assert stats["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_conversations_and_streams_use_prefix(tiny_llm_manager):
+    """Test new conversations and streamed replies start from the prefix state."""
+    prompt = PREFIX + "Tell me a story"
+    expected_turn = tiny_llm_manager.generate_with_history("before", prompt)
+    expected_stream = "".join([chunk async for chunk in tiny_llm_manager.stream_response(prompt)])
+
+    tiny_llm_manager.register_prefix(PREFIX)
+    assert tiny_llm_manager.generate_with_history("after", prompt) == expected_turn
+    # The conversation continues from its own cache, not the prefix
+    tiny_llm_manager.generate_with_history("after", "And then?")
+    assert "".join([chunk async for chunk in tiny_llm_manager.stream_response(prompt)]) == expected_stream
+    assert tiny_llm_manager.prefix_cache.stats()["hits"] == 2
+
+@pytest.mark.asyncio
+async def test_pr_reviewer_registers_preamble(tiny_llm_manager):
+    """Test review prompts share the registered review preamble."""
+    reviewer = PRReviewer(tiny_llm_manager)
+    assert reviewer._prepare_review_prompt("+x = 1").startswith(REVIEW_PREAMBLE)
+
+    review = await reviewer.review_changes("+x = 1")
+    assert set(review) == {"ISSUES", "STYLE", "PERFORMANCE", "SECURITY", "SUGGESTIONS"}
+    assert tiny_llm_manager.prefix_cache.stats()["hits"] == 1
@@ -0,0 +1,61 @@
+"""Tests for inference precision modes."""
+import pytest
+import torch
+from backend.config import BackendConfig, LLMConfig
+from backend.llm_manager import LLMManager
+from backend.quantization import apply_precision, conv1d_to_linear
+from tests.conftest import build_tiny_model, build_tiny_tokenizer
+
+@pytest.fixture
+def tiny_model_dir(tmp_path):
+    tokenizer = build_tiny_tokenizer()
+    build_tiny_model(tokenizer).save_pretrained(tmp_path)
+    tokenizer.save_pretrained(tmp_path)
+    return str(tmp_path)
+
+def test_backend_config_precision_default():
+    """Test fp32 stays the default precision."""
+    assert BackendConfig(model_name="m").precision == "fp32"
+    with pytest.raises(ValueError):
+        BackendConfig(model_name="m", precision="fp8")
+
+def test_conv1d_to_linear_preserves_outputs():
+    """Test replacing Conv1D layers does not change the logits."""
+    model = build_tiny_model(build_tiny_tokenizer()).eval()
+    input_ids = torch.tensor([[1, 2, 3, 4]])
+    with torch.no_grad():
+        expected = model(input_ids).logits
+        assert conv1d_to_linear(model) == 8
+        actual = model(input_ids).logits
+    assert torch.allclose(expected, actual, atol=1e-5)
+
+def test_int8_quantizes_linear_layers():
+    """Test int8 mode swaps linear layers for dynamically quantized ones."""
+    model = apply_precision(build_tiny_model(build_tiny_tokenizer()).eval(), "int8")
+    quantized = [m for m in model.modules() if isinstance(m, torch.ao.nn.quantized.dynamic.Linear)]
+    assert len(quantized) == 9  # 8 projections + lm_head
+
+def test_int8_requires_cpu():
+    """Test int8 is rejected on accelerators."""
+    with pytest.raises(ValueError):
+        apply_precision(torch.nn.Linear(2, 2), "int8", device="cuda")
+
+@pytest.mark.parametrize("precision,dtype", [("fp32", torch.float32), ("bf16", torch.bfloat16)])
+def test_llm_manager_loads_in_precision(tiny_model_dir, precision, dtype):
+    """Test the configured precision is applied at load time."""
+    manager = LLMManager(
+        model_name=tiny_model_dir,
+        config=LLMConfig(temperature=0.0, max_length=4),
+        precision=precision
+    )
+    assert manager.model.dtype == dtype
+    assert isinstance(manager.generate_batch(["hello"])[0], str)
+
+def test_llm_manager_int8_generates(tiny_model_dir):
+    """Test an int8 model can serve generations."""
+    manager = LLMManager(
+        model_name=tiny_model_dir,
+        config=LLMConfig(temperature=0.0, max_length=4),
+        precision="int8"
+    )
+    assert isinstance(manager.generate_batch(["hello", "hi there"])[1], str)
@@ -0,0 +1,95 @@
+"""Tests for the two-tier response cache."""
+import pytest
+from backend import response_cache as response_cache_module
+from backend.config import LLMConfig
+from backend.response_cache import ResponseCache, make_cache_key
+
+class FakeAsyncRedis:
+    """Dict-backed stand-in for the async Redis client."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    async def get(self, key):
+        value = self.data.get(key)
+        return value.encode() if value is not None else None
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiry[key] = ex
+
+GREEDY = LLMConfig(temperature=0.0)
+SAMPLED = LLMConfig(temperature=0.7)
+
+def test_cache_key_normalizes_prompt():
+    """Test whitespace differences map to the same key."""
+    assert make_cache_key("  Hello   world\n", "m", GREEDY) == make_cache_key("Hello world", "m", GREEDY)
+    assert make_cache_key("Hello world", "m", GREEDY) != make_cache_key("hello world", "m", GREEDY)
+
+def test_cache_key_includes_model_and_parameters():
+    """Test the model name and every generation parameter affect the key."""
+    base = make_cache_key("hi", "model-a", GREEDY)
+    assert base != make_cache_key("hi", "model-b", GREEDY)
+    assert base != make_cache_key("hi", "model-a", LLMConfig(temperature=0.0, top_k=10))
+
+def test_sampled_generations_require_opt_in():
+    """Test only greedy settings are cached unless the caller opts in."""
+    cache = ResponseCache()
+    assert cache.should_cache(GREEDY)
+    assert not cache.should_cache(SAMPLED)
+    assert cache.should_cache(SAMPLED, cache_sampled=True)
+    assert ResponseCache(cache_sampled=True).should_cache(SAMPLED)
+
+@pytest.mark.asyncio
+async def test_local_lru_and_ttl(monkeypatch):
+    """Test the in-process tier is bounded and entries expire."""
+    now = [1000.0]
+    monkeypatch.setattr(response_cache_module.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=2, ttl_seconds=10)
+
+    await cache.set("a", "A")
+    await cache.set("b", "B")
+    assert await cache.get("a") == "A"
+    await cache.set("c", "C")
+    # "b" was least recently used
+    assert await cache.get("b") is None
+
+    now[0] += 11
+    assert await cache.get("a") is None
+    stats = cache.stats()
+    assert stats["local_hits"] == 1
+    assert stats["misses"] == 2
+
+@pytest.mark.asyncio
+async def test_redis_tier_fills_local_tier():
+    """Test a Redis hit is served and copied into the local tier."""
+    cache = ResponseCache(ttl_seconds=60)
+    cache.redis = FakeAsyncRedis()
+    await cache.set("k", "value")
+    assert cache.redis.expiry["response_cache:k"] == 60
+
+    cache._local.clear()
+    assert await cache.get("k") == "value"
+    assert await cache.get("k") == "value"
+    assert cache.stats()["redis_hits"] == 1
+    assert cache.stats()["local_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_cache(tiny_llm_manager):
+    """Test a repeated greedy prompt skips generation."""
+    calls = []
+    original = tiny_llm_manager.generate_batch
+
+    def counting_batch(messages, options):
+        calls.append(messages)
+        return original(messages, options)
+
+    tiny_llm_manager.batcher.process_batch = counting_batch
+    tiny_llm_manager.response_cache = ResponseCache()
+
+    first = await tiny_llm_manager.generate_response("What is AMEGA?")
+    second = await tiny_llm_manager.generate_response("What  is AMEGA? ")
+    assert first.content == second.content
+    assert len(calls) == 1
+    await tiny_llm_manager.close()
@@ -1,14 +1,16 @@
 """Tests for security middleware and RBAC functionality."""
+import time
 import pytest
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.testclient import TestClient
 from datetime import timedelta
 from backend.security import (
     SecurityMiddleware, RBACMiddleware, RequestValidationMiddleware,
     requires_admin, requires_moderator, requires_user
 )
+from backend import auth
 from backend.auth import (
-    User, create_access_token,
+    User, create_access_token, get_current_user, update_user, clear_token_cache,
     ACCESS_TOKEN_EXPIRE_MINUTES, fake_users_db, get_password_hash
 )
 
@@ -55,6 +57,7 @@ def setup_test_users():
     
     # Add test users to fake database
     fake_users_db.update(test_users)
+    clear_token_cache()
     
     yield
     
@@ -221,4 +224,46 @@ def test_request_validation():
         json={"content": "valid"},
         headers=headers
     )
-    assert response.status_code == 200 
\ No newline at end of file
+    assert response.status_code == 200 
+
+def test_token_verified_once_per_request_and_cached(monkeypatch):
+    """Test the middleware's user is reused and a token is not decoded again until it changes."""
+    decodes = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: decodes.append(1) or decode(*args, **kwargs))
+    headers = {"Authorization": f"Bearer {create_test_token('test_admin')}"}
+
+    for endpoint in ["/test/user", "/test/admin", "/test/user"]:
+        assert client.get(endpoint, headers=headers).status_code == 200
+    assert len(decodes) == 1
+
+@pytest.mark.asyncio
+async def test_token_cache_forgets_changed_users():
+    """Test disabling a user or changing their role takes effect on their cached token."""
+    token = create_test_token("test_user")
+    assert not (await get_current_user(token)).disabled
+
+    await update_user("test_user", disabled=True)
+    assert (await get_current_user(token)).disabled
+
+    await update_user("test_user", role="moderator")
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(token)
+    assert exc.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_cached_token_is_rechecked_after_user_cache_ttl(monkeypatch):
+    """Test a verified token is decoded and its user read again once the user cache TTL passes."""
+    decodes = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: decodes.append(1) or decode(*args, **kwargs))
+    token = create_test_token("test_user")
+    now = time.time()
+
+    await get_current_user(token)
+    await get_current_user(token)
+    assert len(decodes) == 1
+
+    monkeypatch.setattr(auth.time, "time", lambda: now + auth.settings.USER_CACHE_TTL_SECONDS + 1)
+    await get_current_user(token)
+    assert len(decodes) == 2
@@ -0,0 +1,67 @@
+"""Tests for the sharded conversation session store."""
+import pytest
+from backend import session_store as session_store_module
+from backend.llm_manager import ChatMessage
+from backend.session_store import SessionStore
+
+def message(content: str, role: str = "user") -> ChatMessage:
+    return ChatMessage(role=role, content=content)
+
+def test_sessions_are_isolated_per_user_and_conversation():
+    """Test one user's messages never appear in another's history."""
+    store = SessionStore(num_shards=4)
+    store.append("alice", "default", message("alice says hi"))
+    store.append("bob", "default", message("bob says hi"))
+    store.append("alice", "work", message("work topic"))
+
+    assert [m.content for m in store.get_history("alice", "default")] == ["alice says hi"]
+    assert [m.content for m in store.get_history("bob", "default")] == ["bob says hi"]
+    assert [m.content for m in store.get_history("alice", "work")] == ["work topic"]
+    assert store.get_history("carol", "default") == []
+
+def test_token_budget_slides_window():
+    """Test old messages fall out once the token budget is exceeded."""
+    store = SessionStore(max_tokens_per_session=4)
+    for text in ["one two", "three four", "five six"]:
+        store.append("u", "c", message(text))
+
+    assert [m.content for m in store.get_history("u", "c")] == ["three four", "five six"]
+    assert store.stats()["messages"] == 2
+
+def test_idle_sessions_expire(monkeypatch):
+    """Test sessions idle longer than the TTL are evicted."""
+    now = [0.0]
+    monkeypatch.setattr(session_store_module.time, "monotonic", lambda: now[0])
+    store = SessionStore(num_shards=1, ttl_seconds=10)
+    store.append("u", "old", message("stale"))
+    now[0] = 5
+    store.append("u", "new", message("fresh"))
+
+    now[0] = 12
+    store.evict_expired()
+    assert store.get_history("u", "old") == []
+    assert [m.content for m in store.get_history("u", "new")] == ["fresh"]
+    assert store.stats()["expired"] == 1
+
+def test_total_message_cap():
+    """Test the global cap evicts least recently used sessions."""
+    store = SessionStore(num_shards=2, max_total_messages=3)
+    for index in range(5):
+        store.append(f"user{index}", "c", message(f"m{index}"))
+
+    stats = store.stats()
+    assert stats["messages"] <= 3
+    assert stats["evicted_for_cap"] == 2
+    assert store.get_history("user4", "c")
+
+@pytest.mark.asyncio
+async def test_llm_manager_chat_records_history(tiny_llm_manager):
+    """Test chat stores both sides of the exchange per user."""
+    response = await tiny_llm_manager.chat(message("hello"), user_id="alice", conversation_id="c1")
+    assert response.role == "assistant"
+    assert response.conversation_id == "c1"
+
+    history = tiny_llm_manager.get_conversation_history("alice", "c1")
+    assert [m.role for m in history] == ["user", "assistant"]
+    assert tiny_llm_manager.get_conversation_history("bob", "c1") == []
+    await tiny_llm_manager.close()
@@ -0,0 +1,103 @@
+"""Tests for coalescing identical in-flight requests."""
+import asyncio
+import pytest
+from backend.generation_control import CancellationToken, GenerationCancelled, GenerationOptions
+from backend.singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test callers arriving together get one shared result, later ones run again."""
+    flights = SingleFlight()
+    calls = []
+
+    async def work(token):
+        calls.append(token)
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+    # Nothing is kept once the flight has landed
+    assert await flights.do("key", work) == "answer"
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    """Test a failing execution raises in every waiting caller."""
+    flights = SingleFlight()
+
+    async def failing(token):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model exploded")
+
+    results = await asyncio.gather(*(flights.do("key", failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+@pytest.mark.asyncio
+async def test_work_stops_only_when_every_caller_left():
+    """Test one caller's deadline leaves the shared work running for the others."""
+    flights = SingleFlight()
+    started = asyncio.Event()
+    tokens = []
+
+    async def slow(token):
+        tokens.append(token)
+        started.set()
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    impatient = asyncio.ensure_future(flights.do("key", slow, CancellationToken(timeout=0.01)))
+    patient = asyncio.ensure_future(flights.do("key", slow))
+    await started.wait()
+
+    with pytest.raises(GenerationCancelled):
+        await impatient
+    assert not tokens[0].cancelled
+    assert await patient == "answer"
+
+    leaving = asyncio.ensure_future(flights.do("other", slow))
+    await asyncio.sleep(0.01)
+    leaving.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leaving
+    assert tokens[1].cancelled
+    assert len(flights) == 0
+
+@pytest.mark.asyncio
+async def test_identical_prompts_are_generated_once(tiny_llm_manager):
+    """Test concurrent identical greedy requests share one batch row."""
+    rows = []
+    original = tiny_llm_manager.generate_batch
+
+    def recording_batch(messages, options):
+        rows.extend(messages)
+        return original(messages, options)
+
+    tiny_llm_manager.batcher.process_batch = recording_batch
+    replies = await asyncio.gather(
+        *(tiny_llm_manager.generate_response("trending question") for _ in range(4)),
+        tiny_llm_manager.generate_response("trending question", options=GenerationOptions(max_new_tokens=2))
+    )
+
+    assert len({reply.content for reply in replies[:4]}) == 1
+    # A different token budget is a different request
+    assert rows == ["trending question", "trending question"]
+    assert tiny_llm_manager.inference_stats()["singleflight"]["coalesced"] == 3
+
+@pytest.mark.asyncio
+async def test_sampled_requests_are_not_coalesced(tiny_llm_manager):
+    """Test requests with sampling enabled each get their own generation."""
+    tiny_llm_manager.config = tiny_llm_manager.config.model_copy(update={"temperature": 0.7})
+    rows = []
+    original = tiny_llm_manager.generate_batch
+
+    def recording_batch(messages, options):
+        rows.extend(messages)
+        return original(messages, options)
+
+    tiny_llm_manager.batcher.process_batch = recording_batch
+    await asyncio.gather(*(tiny_llm_manager.generate_response("tell me a joke") for _ in range(3)))
+    assert len(rows) == 3
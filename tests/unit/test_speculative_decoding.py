@@ -0,0 +1,66 @@
+"""Tests for speculative decoding with a draft model."""
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+from backend import llm_manager as llm_manager_module
+from backend.config import LLMConfig
+from backend.llm_manager import LLMManager
+from tests.conftest import build_tiny_model, build_tiny_tokenizer
+
+PROMPTS = ["Hello there", "How are you today?", "Tell me a story"]
+
+def build_draft_model(vocab_size: int) -> GPT2LMHeadModel:
+    """Build a smaller model than the tiny main model."""
+    torch.manual_seed(1)
+    return GPT2LMHeadModel(GPT2Config(
+        vocab_size=vocab_size, n_positions=512, n_embd=16, n_layer=1, n_head=2,
+        bos_token_id=vocab_size - 1, eos_token_id=vocab_size - 1
+    ))
+
+def make_managers(monkeypatch, draft_vocab_size=None):
+    """Create a plain manager and one assisted by a draft model."""
+    tokenizer = build_tiny_tokenizer()
+    model = build_tiny_model(tokenizer)
+    draft = build_draft_model(draft_vocab_size or len(tokenizer))
+    monkeypatch.setattr(
+        llm_manager_module.AutoTokenizer, "from_pretrained",
+        lambda *args, **kwargs: tokenizer
+    )
+    monkeypatch.setattr(
+        llm_manager_module.AutoModelForCausalLM, "from_pretrained",
+        lambda name, *args, **kwargs: draft if name == "tiny-draft" else model
+    )
+    config = LLMConfig(temperature=0.0, max_length=24)
+    plain = LLMManager(model_name="tiny-gpt2", config=config)
+    assisted = LLMManager(
+        model_name="tiny-gpt2",
+        config=config.model_copy(update={"draft_model_name": "tiny-draft", "num_assistant_tokens": 4})
+    )
+    return plain, assisted
+
+def test_greedy_output_is_unchanged(monkeypatch):
+    """Test assisted greedy decoding produces exactly the plain output."""
+    plain, assisted = make_managers(monkeypatch)
+    assert assisted.draft_model is not None
+    assert assisted.draft_model.generation_config.num_assistant_tokens == 4
+    assert "draft_model_seconds" in assisted.load_timings
+
+    for prompt in PROMPTS:
+        assert assisted.generate_batch([prompt]) == plain.generate_batch([prompt])
+
+    # The first turn is speculated; the second reuses its key/value cache
+    for prompt in PROMPTS[:2]:
+        expected = plain.generate_with_history("plain", prompt)
+        assert assisted.generate_with_history("assisted", prompt) == expected
+
+def test_batches_are_not_assisted(monkeypatch):
+    """Test only single-sequence generation uses the draft model."""
+    _, assisted = make_managers(monkeypatch)
+    assert "assistant_model" in assisted._generation_kwargs()
+    assert "assistant_model" not in assisted._generation_kwargs(batch_size=2)
+    assert len(assisted.generate_batch(PROMPTS)) == len(PROMPTS)
+
+def test_draft_with_other_vocabulary_is_ignored(monkeypatch):
+    """Test a draft model with a different vocabulary disables speculation."""
+    _, assisted = make_managers(monkeypatch, draft_vocab_size=300)
+    assert assisted.draft_model is None
+    assert "assistant_model" not in assisted._generation_kwargs()
@@ -0,0 +1,111 @@
+"""Tests for token streaming and incremental decoding."""
+import pytest
+from backend.app import app
+from backend.auth import create_access_token, fake_users_db, get_password_hash
+from backend.generation_control import GenerationCancelled
+from backend.streaming import IncrementalDecoder
+from tests.conftest import build_tiny_tokenizer
+
+class AllowAllRateLimiter:
+    """Rate limiter stand-in that never limits."""
+
+    async def is_rate_limited(self, identifier, tier="default"):
+        return False, {"limit": 1, "remaining": 1, "reset": 0, "tier": tier}
+
+def test_incremental_decoder_matches_full_decode():
+    """Test streamed deltas add up to the fully decoded text."""
+    tokenizer = build_tiny_tokenizer()
+    text = "héllo wörld, ça va? 你好"
+    decoder = IncrementalDecoder(tokenizer)
+
+    deltas = [decoder.push([token_id]) for token_id in tokenizer.encode(text)]
+    deltas.append(decoder.flush())
+
+    assert "".join(deltas) == text
+    # Multi-byte characters are held back until complete
+    assert not any("�" in delta for delta in deltas)
+    assert "" in deltas
+
+@pytest.mark.asyncio
+async def test_stream_response_matches_generation(tiny_llm_manager):
+    """Test streaming yields the same text as a non-streamed generation."""
+    chunks = [chunk async for chunk in tiny_llm_manager.stream_response("hello there")]
+    assert "".join(chunks) == tiny_llm_manager.generate_batch(["hello there"])[0]
+    await tiny_llm_manager.close()
+
+def make_token(username: str = "streamer") -> str:
+    """Register a user and return an access token for it."""
+    fake_users_db[username] = {
+        "username": username,
+        "email": f"{username}@example.com",
+        "disabled": False,
+        "role": "user",
+        "hashed_password": get_password_hash("secret")
+    }
+    return create_access_token(data={"sub": username, "role": "user"})
+
+def test_websocket_streams_tokens(client, monkeypatch):
+    """Test the WebSocket endpoint authenticates once and streams each reply."""
+    monkeypatch.setattr(app.state, "rate_limiter", AllowAllRateLimiter(), raising=False)
+    token = make_token()
+
+    with client.websocket_connect("/api/v1/chat/stream/ws") as websocket:
+        websocket.send_json({"type": "auth", "token": token})
+        assert websocket.receive_json() == {"type": "ready", "user": "streamer"}
+
+        for _ in range(2):
+            websocket.send_json({"role": "user", "content": "Hello"})
+            chunks = []
+            while True:
+                event = websocket.receive_json()
+                if event["type"] == "done":
+                    break
+                chunks.append(event["content"])
+            assert "".join(chunks) == "This is a mock response"
+
+@pytest.mark.parametrize("reason, detail", [
+    ("deadline exceeded", "Generation deadline exceeded"),
+    ("caller went away", "Request cancelled")
+])
+def test_websocket_reports_cancellation_reason(client, monkeypatch, reason, detail):
+    """Test a cancelled WebSocket generation reports why it stopped."""
+    monkeypatch.setattr(app.state, "rate_limiter", AllowAllRateLimiter(), raising=False)
+
+    async def cancelled_stream(*args, **kwargs):
+        raise GenerationCancelled(reason)
+        yield
+
+    monkeypatch.setattr(app.state.llm_manager, "stream_response", cancelled_stream)
+    with client.websocket_connect("/api/v1/chat/stream/ws") as websocket:
+        websocket.send_json({"type": "auth", "token": make_token()})
+        websocket.receive_json()
+        websocket.send_json({"role": "user", "content": "Hello"})
+        assert websocket.receive_json() == {"type": "error", "detail": detail}
+
+def test_websocket_rejects_bad_token(client, monkeypatch):
+    """Test connections with an invalid token are closed."""
+    monkeypatch.setattr(app.state, "rate_limiter", AllowAllRateLimiter(), raising=False)
+    with client.websocket_connect("/api/v1/chat/stream/ws") as websocket:
+        websocket.send_json({"type": "auth", "token": "not-a-token"})
+        message = websocket.receive()
+        assert message["type"] == "websocket.close"
+        assert message["code"] == 1008
+
+def test_sse_stream(client, monkeypatch):
+    """Test the SSE endpoint emits content events followed by done."""
+    monkeypatch.setattr(app.state, "rate_limiter", AllowAllRateLimiter(), raising=False)
+    token = make_token()
+
+    with client.stream(
+        "POST",
+        "/api/v1/chat/stream",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"role": "user", "content": "Hello"}
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    assert body.count("data: ") == 4
+    assert body.rstrip().endswith('data: {"finish_reason": "stop"}')
+    assert "event: done" in body
@@ -0,0 +1,106 @@
+"""Tests for database-backed user storage."""
+import asyncio
+import pytest
+import pytest_asyncio
+from backend import auth
+from backend.user_store import CachedUserRepository, InMemoryUserRepository, SQLUserRepository, UserRepository
+
+pytest.importorskip("aiosqlite")
+
+def make_user(username, role="user"):
+    return {
+        "username": username,
+        "email": f"{username}@example.com",
+        "full_name": None,
+        "disabled": False,
+        "role": role,
+        "hashed_password": "hash"
+    }
+
+@pytest_asyncio.fixture
+async def sql_repository(tmp_path):
+    """A repository on a fresh SQLite database."""
+    repository = SQLUserRepository(f"sqlite:///{tmp_path / 'users.db'}")
+    await repository.create_schema()
+    yield repository
+    await repository.close()
+
+@pytest.mark.asyncio
+async def test_sql_repository_stores_users(sql_repository):
+    """Test users are added once, read back, updated and listed page by page."""
+    for username in ["carol", "alice", "dave", "bob", "erin"]:
+        assert await sql_repository.add(make_user(username))
+    assert not await sql_repository.add(make_user("alice", role="admin"))
+
+    assert await sql_repository.get("alice") == make_user("alice")
+    assert await sql_repository.get("nobody") is None
+
+    assert await sql_repository.update("bob", disabled=True, role="moderator")
+    assert not await sql_repository.update("nobody", disabled=True)
+    bob = await sql_repository.get("bob")
+    assert bob["disabled"] and bob["role"] == "moderator"
+
+    pages, after = [], None
+    while True:
+        page = await sql_repository.list(after=after, limit=2)
+        if not page:
+            break
+        pages.append([user["username"] for user in page])
+        after = page[-1]["username"]
+    assert pages == [["alice", "bob"], ["carol", "dave"], ["erin"]]
+
+@pytest.mark.asyncio
+async def test_in_memory_repository_pages_like_sql():
+    """Test the dict-backed repository uses the same keyset pagination."""
+    repository = InMemoryUserRepository({})
+    for username in ["carol", "alice", "bob"]:
+        await repository.add(make_user(username))
+    assert [user["username"] for user in await repository.list(after="alice", limit=5)] == ["bob", "carol"]
+    assert [user["username"] for user in await repository.list(after="b", limit=1)] == ["bob"]
+
+def test_incomplete_repository_cannot_be_created():
+    """Test a repository missing part of the interface fails when it is created."""
+    class ReadOnlyRepository(UserRepository):
+        async def get(self, username):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyRepository()
+
+@pytest.mark.asyncio
+async def test_cache_reads_through_and_invalidates_on_update(sql_repository):
+    """Test repeated lookups are served from memory until the user changes or the entry expires."""
+    cache = CachedUserRepository(sql_repository, ttl_seconds=60)
+    await cache.add(make_user("alice"))
+
+    for _ in range(3):
+        assert (await cache.get("alice"))["role"] == "user"
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
+
+    await cache.update("alice", role="admin")
+    assert (await cache.get("alice"))["role"] == "admin"
+
+    # Changes made elsewhere, e.g. by another replica, show once the entry expires
+    short = CachedUserRepository(sql_repository, ttl_seconds=0.05)
+    assert (await short.get("alice"))["role"] == "admin"
+    await sql_repository.update("alice", role="moderator")
+    assert (await short.get("alice"))["role"] == "admin"
+    await asyncio.sleep(0.06)
+    assert (await short.get("alice"))["role"] == "moderator"
+
+@pytest.mark.asyncio
+async def test_authentication_uses_the_configured_repository(sql_repository):
+    """Test users registered in the database can log in and be looked up by token."""
+    previous = auth.get_user_repository()
+    auth.set_user_repository(CachedUserRepository(sql_repository))
+    try:
+        user = auth.UserInDB(**{**make_user("alice"), "hashed_password": await auth.hash_password("secret")})
+        assert await auth.create_user(user)
+        assert await auth.authenticate_user("alice", "secret") is not None
+        assert await auth.authenticate_user("admin", "admin") is None
+
+        token = auth.create_access_token({"sub": "alice", "role": "user"})
+        assert (await auth.get_current_user(token)).username == "alice"
+        assert [user.username for user in await auth.get_users()] == ["alice"]
+    finally:
+        auth.set_user_repository(previous)
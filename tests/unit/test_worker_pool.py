@@ -0,0 +1,93 @@
+"""Tests for the multi-process model worker pool."""
+import asyncio
+import time
+import pytest
+from backend.config import LLMConfig
+from backend.llm_manager import ChatMessage, LLMManager
+from backend.worker_pool import ModelWorkerPool, plan_core_slices
+from tests.conftest import build_tiny_model, build_tiny_tokenizer
+
+CONFIG = LLMConfig(temperature=0.0, max_length=16)
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    """Save the tiny model where worker processes can load it."""
+    path = tmp_path_factory.mktemp("tiny-model")
+    tokenizer = build_tiny_tokenizer()
+    tokenizer.save_pretrained(path)
+    build_tiny_model(tokenizer).save_pretrained(path)
+    return str(path)
+
+@pytest.fixture(scope="module")
+def worker_pool(model_path):
+    """Two single-threaded workers with fast health checks."""
+    pool = ModelWorkerPool(
+        model_path,
+        config=CONFIG,
+        num_workers=2,
+        threads_per_worker=1,
+        warm_up=False,
+        health_interval=0.2
+    )
+    pool.wait_ready(timeout=120)
+    yield pool
+    pool.shutdown()
+
+def test_core_slices():
+    """Test cores are split into disjoint slices, wrapping when oversubscribed."""
+    assert plan_core_slices(4, cores=range(8)) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert plan_core_slices(2, threads_per_worker=3, cores=range(8)) == [[0, 1, 2], [3, 4, 5]]
+    assert plan_core_slices(3, threads_per_worker=2, cores=range(4)) == [[0, 1], [2, 3], [0, 1]]
+    assert plan_core_slices(4, cores=range(2)) == [[0], [1], [0], [1]]
+
+@pytest.mark.asyncio
+async def test_requests_are_spread_over_workers(worker_pool, model_path):
+    """Test workers generate what an in-process manager would, sharing the load."""
+    expected = LLMManager(model_name=model_path, config=CONFIG).generate_batch(["hello there"])[0]
+    before = [worker["requests"] for worker in worker_pool.stats()["workers"]]
+
+    replies = await asyncio.gather(*(
+        worker_pool.generate([{"role": "user", "content": "hello there"}]) for _ in range(4)
+    ))
+    assert replies == [expected] * 4
+    chunks = [chunk async for chunk in worker_pool.stream([{"role": "user", "content": "hello there"}])]
+    assert "".join(chunks) == expected
+
+    after = [worker["requests"] for worker in worker_pool.stats()["workers"]]
+    assert all(count - previous >= 2 for count, previous in zip(after, before))
+
+@pytest.mark.asyncio
+async def test_manager_uses_workers(worker_pool, model_path):
+    """Test an LLMManager delegates generation, including history, to the workers."""
+    local = LLMManager(model_name=model_path, config=CONFIG)
+    manager = LLMManager(backend=worker_pool, config=CONFIG, load=False)
+    manager.load()
+
+    messages = []
+    for content in ["first", "second"]:
+        messages.append({"role": "user", "content": content})
+        expected = await local.complete(messages)
+        reply = await manager.chat(ChatMessage(role="user", content=content), user_id="alice", conversation_id="c")
+        assert reply.content == expected
+        messages.append({"role": "assistant", "content": reply.content})
+    assert manager.inference_stats()["backend"]["backend"] == "workers"
+    # Each worker holds its own copy of the weights
+    assert manager.memory_footprint() == 2 * local.memory_footprint()
+    await local.close()
+
+@pytest.mark.asyncio
+async def test_crashed_worker_is_restarted(worker_pool):
+    """Test a killed worker is restarted and serves requests again."""
+    worker = worker_pool._workers[0]
+    worker.process.kill()
+
+    deadline = time.monotonic() + 120
+    while worker.restarts == 0 or worker.state != "ready":
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.1)
+
+    assert worker_pool.stats()["restarts"] == 1
+    replies = await asyncio.gather(*(
+        worker_pool.generate([{"role": "user", "content": "hi"}]) for _ in range(4)
+    ))
+    assert len(set(replies)) == 1